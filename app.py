@@ -1,58 +1,127 @@
-from flask import Flask, render_template, jsonify, Response, request
-import sqlite3
+from flask import Flask, render_template, jsonify, Response, request, abort, stream_with_context
+import csv
 import datetime
+import json
+import os
+import threading
+import time
 import camera
+import camera_registry
+import camera_server
+import database
+import events
+import metrics
+import users
+
+KEEPALIVE_SECONDS = 15
 
 app = Flask(__name__)
-video_camera = None
-
-def get_camera():
-    global video_camera
-    if video_camera is None:
-        video_camera = camera.VideoCamera()
-    return video_camera
-
-def get_logs():
-    conn = sqlite3.connect("attendance.db")
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    # Check if table exists to avoid errors if run before init
-    try:
-        cursor.execute("SELECT name, date, time_in, time_out FROM daily_attendance ORDER BY date DESC, time_in DESC LIMIT 50")
-        logs = [dict(row) for row in cursor.fetchall()]
-    except sqlite3.OperationalError:
-        logs = []
-    conn.close()
-    return logs
+registry = None
+registry_lock = threading.Lock()
+
+def get_registry():
+    # Cameras come from cameras.json (one process each); without it, device 0.
+    # With CAMERA_SERVER=host:port they are owned by a separate camera_server.py
+    # instead, so this app can run in several worker processes.
+    global registry
+    with registry_lock:
+        if registry is None:
+            address = os.environ.get("CAMERA_SERVER")
+            if address:
+                registry = camera_server.RemoteRegistry(address)
+            else:
+                registry = camera_registry.CameraRegistry()
+            metrics.gauge("stream_clients", lambda: sum(cam.broadcast.viewers for cam in registry.cameras.values()))
+        return registry
+
+@app.teardown_appcontext
+def close_db(error=None):
+    # The threaded server runs each request on a new thread; don't leave its connection to the GC
+    database.close_connection()
+
+def get_camera(camera_id=None):
+    cam = get_registry().get(camera_id)
+    if cam is None:
+        abort(404, f"Unknown camera: {camera_id}")
+    return cam
+
+def get_logs(limit=database.PAGE_SIZE, before=None):
+    # Returns [] if the table doesn't exist yet (run before init)
+    return database.get_attendance_logs(limit, before)
+
+def page_args():
+    limit = request.args.get('limit', database.PAGE_SIZE, type=int)
+    before = request.args.get('before')
+    if before and database.parse_cursor(before) is None:
+        abort(400, f"Invalid cursor: {before}")
+    return max(1, min(limit, 500)), before
 
 @app.route('/')
 def index():
-    users = database.get_all_users()
-    return render_template('index.html', users=users)
+    return render_template('index.html', users=users.get_directory().all(), cameras=get_registry().ids())
 
 @app.route('/user/<int:user_id>')
 def user_dashboard(user_id):
-    users = database.get_all_users()
-    name = users.get(user_id, "Unknown")
-    logs = database.get_user_attendance(user_id)
-    return render_template('user_dashboard.html', user_id=user_id, name=name, logs=logs)
+    name = users.get_directory().get(user_id, "Unknown")
+    limit, before = page_args()
+    logs = database.get_user_attendance(user_id, limit, before)
+    next_cursor = logs[-1]["cursor"] if len(logs) == limit else None
+    return render_template('user_dashboard.html', user_id=user_id, name=name, logs=logs,
+                           total=database.count_user_sessions(user_id), next_cursor=next_cursor)
 
 @app.route('/api/logs')
 def api_logs():
-    logs = get_logs()
+    # Keyset pagination: pass the last row's "cursor" as ?before= for older rows
+    limit, before = page_args()
+    logs = get_logs(limit, before)
     return jsonify(logs)
 
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_attendance():
+    get_registry()  # Under a camera server, events arrive through the registry client
+    # Subscribe before taking the snapshot so nothing falls in between
+    sub = events.attendance_events.subscribe()
+    try:
+        yield sse("snapshot", get_logs())
+        while True:
+            event = sub.get(timeout=KEEPALIVE_SECONDS)
+            if sub.overflowed:
+                # Fell behind; start over from a fresh snapshot
+                sub.overflowed = False
+                while sub.get(timeout=0) is not None:
+                    pass
+                yield sse("snapshot", get_logs())
+            elif event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield sse("attendance", event)
+    finally:
+        events.attendance_events.unsubscribe(sub)
+
+@app.route('/api/stream')
+def api_stream():
+    # Server-Sent Events: a snapshot on connect, then only new time-in/time-out rows
+    return Response(stream_with_context(stream_attendance()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/control', methods=['POST'])
-def control():
+@app.route('/api/control/<camera_id>', methods=['POST'])
+def control(camera_id=None):
     data = request.json
     action = data.get('action')
-    cam = get_camera()
+    cam = get_camera(camera_id or data.get('camera'))
     
     if action == 'register':
         user_id = data.get('id')
         name = data.get('name')
         if not user_id or not name:
             return jsonify({"status": "error", "message": "Missing ID or Name"}), 400
+        # Samples go to one shared store, so only one camera registers at a time
+        busy = get_registry().registering(exclude=cam.camera_id)
+        if busy:
+            return jsonify({"status": "error", "message": f"Camera {busy} is already registering"}), 409
         cam.start_registration(user_id, name)
         return jsonify({"status": "success", "message": "Registration started"})
         
@@ -68,20 +137,140 @@ def control():
         
     return jsonify({"status": "error", "message": "Invalid action"}), 400
 
-def gen(camera):
-    while True:
-        frame = camera.get_frame()
-        if frame:
+REPORT_COLUMNS = {
+    "daily": ["date", "user_id", "name", "sessions", "hours", "total_seconds", "first_in", "last_out"],
+    "monthly": ["month", "user_id", "name", "days", "sessions", "hours", "total_seconds"],
+}
+
+class Echo:
+    # csv.writer target that hands each formatted line straight back
+    def write(self, line):
+        return line
+
+def report_arg(name, fmt, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.datetime.strptime(value, fmt).date()
+    except ValueError:
+        abort(400, f"Invalid {name}: {value}")
+
+def stream_report(kind, rows):
+    # Rows come straight off the database cursor, so memory stays flat for any range
+    columns = REPORT_COLUMNS[kind]
+
+    def with_hours():
+        for row in rows:
+            row["hours"] = round(row["total_seconds"] / 3600, 2)
+            yield row
+
+    if request.args.get('format') == 'csv':
+        def generate():
+            writer = csv.writer(Echo())
+            yield writer.writerow(columns)
+            for row in with_hours():
+                yield writer.writerow([row[c] for c in columns])
+        return Response(stream_with_context(generate()), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={kind}_report.csv'})
+
+    def generate():
+        yield "["
+        for i, row in enumerate(with_hours()):
+            yield ("," if i else "") + json.dumps({c: row[c] for c in columns})
+        yield "]"
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+@app.route('/api/reports/daily')
+def daily_report():
+    # Hours per user and day from daily_summary: ?start=2024-01-01&end=2024-01-31&user_id=7&format=csv
+    today = datetime.date.today()
+    start = report_arg('start', "%Y-%m-%d", today.replace(day=1))
+    end = report_arg('end', "%Y-%m-%d", today)
+    user_id = request.args.get('user_id', type=int)
+    return stream_report("daily", database.get_daily_summary(start.isoformat(), end.isoformat(), user_id))
+
+@app.route('/api/reports/monthly')
+def monthly_report():
+    # Hours and days present per user and month: ?start=2024-01&end=2024-12&user_id=7&format=csv
+    today = datetime.date.today()
+    start = report_arg('start', "%Y-%m", today.replace(month=1, day=1))
+    end = report_arg('end', "%Y-%m", today)
+    user_id = request.args.get('user_id', type=int)
+    return stream_report("monthly", database.get_monthly_summary(start.strftime("%Y-%m"), end.strftime("%Y-%m"), user_id))
+
+@app.route('/api/cameras')
+def cameras():
+    return jsonify([get_camera(camera_id).get_stats() for camera_id in get_registry().ids()])
+
+@app.route('/api/stats')
+@app.route('/api/stats/<camera_id>')
+def camera_stats(camera_id=None):
+    # Frames processed, frames skipped by the motion gate, connected viewers
+    return jsonify(get_camera(camera_id).get_stats())
+
+@app.route('/api/training')
+def training_status():
+    # One model is shared by every camera
+    return jsonify(get_registry().training_status())
+
+def gen(camera, fps=None, width=None, quality=camera.JPEG_QUALITY):
+    # Every client shares the camera's producer thread; we only wait for new frames.
+    # A client that is slow to read always gets the newest frame, never a backlog.
+    interval = 1.0 / fps if fps else 0
+    seq = 0
+    next_time = 0
+    camera.broadcast.add_viewer()
+    try:
+        while True:
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            new_seq, frame = camera.wait_frame(seq)
+            if frame is None or new_seq == seq:
+                continue
+            if seq:
+                metrics.inc("stream_dropped_frames", new_seq - seq - 1)  # Frames this client never saw
+            seq = new_seq
+            jpeg = camera.encode_frame(seq, frame, width, quality)
+            next_time = time.monotonic() + interval
             yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n\r\n')
+                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n\r\n')
+    finally:
+        camera.broadcast.remove_viewer()
+
+def stream_args():
+    # Optional per-client limits: /video_feed?fps=5&width=480&quality=60
+    fps = request.args.get('fps', type=float)
+    width = request.args.get('width', type=int)
+    quality = request.args.get('quality', camera.JPEG_QUALITY, type=int)
+    fps = min(max(fps, 0.1), 60) if fps else None
+    width = max(width, 16) if width else None
+    quality = min(max(quality, 10), 100)
+    return fps, width, quality
 
 @app.route('/video_feed')
-def video_feed():
-    return Response(gen(get_camera()),
+@app.route('/video_feed/<camera_id>')
+def video_feed(camera_id=None):
+    fps, width, quality = stream_args()
+    return Response(gen(get_camera(camera_id), fps, width, quality),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/metrics')
+def prometheus_metrics():
+    # Stage timings etc. from this process, every camera process and, if used, the camera server
+    reg = get_registry()
+    sources = [({}, metrics.snapshot())]
+    if isinstance(reg, camera_server.RemoteRegistry):
+        sources.append(({"process": "camera_server"}, reg.get_metrics()))
+    for camera_id in reg.ids():
+        try:
+            sources.append(({"camera": camera_id}, reg.get(camera_id).get_metrics()))
+        except Exception as e:
+            print(f"[WARN] No metrics from camera {camera_id}: {e}")
+    return Response(metrics.render(sources), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     # Initialize DB
-    import database
     database.init_db()
     app.run(debug=True, port=5000)
@@ -0,0 +1,209 @@
+import atexit
+import bisect
+import datetime
+import queue
+import threading
+import time
+import database
+import events
+import metrics
+
+COOLDOWN_SECONDS = 60  # Minimum time between two transitions of the same user
+MAX_BATCH = 100        # Events written per transaction
+WRITE_RETRIES = 5      # Attempts at writing a batch before giving up on it
+RETRY_SECONDS = 0.5    # Wait before the first retry, doubled after each one
+
+def merge_transitions(known, sightings, cooldown=COOLDOWN_SECONDS):
+    """Place historical sightings among the transitions a day already has.
+
+    known and sightings are lists of (datetime, camera_id). Known transitions
+    (the time-ins and time-outs already stored) are all kept. A sighting is
+    added as a transition unless it falls within cooldown of a kept one,
+    before or after it, in which case it is the same presence. Returns
+    (every transition in time order, the sightings that were not added).
+    """
+    transitions = sorted(known, key=lambda t: t[0])
+    times = [t[0] for t in transitions]
+    dropped = []
+    for sighting in sorted(sightings, key=lambda t: t[0]):
+        i = bisect.bisect(times, sighting[0])
+        near = [times[j] for j in (i - 1, i) if 0 <= j < len(times)]
+        if any(abs((sighting[0] - t).total_seconds()) < cooldown for t in near):
+            dropped.append(sighting)
+            continue
+        times.insert(i, sighting[0])
+        transitions.insert(i, sighting)
+    return transitions, dropped
+
+def pair_sessions(transitions):
+    """(time_in, time_out) pairs from transitions in time order; the last
+    session is open (time_out None) if their number is odd."""
+    return [(transitions[i], transitions[i + 1] if i + 1 < len(transitions) else None)
+            for i in range(0, len(transitions), 2)]
+
+class AttendanceRecorder:
+    """Decides time-in/time-out transitions in memory and writes them behind.
+
+    Follows the same rules as database.mark_attendance(): the first sighting
+    of the day checks a user in, later sightings toggle between out and in,
+    and nothing changes within COOLDOWN_SECONDS of the last transition. Only
+    real transitions are queued, and a single writer thread flushes them to
+    SQLite in batched transactions. Every committed row is then published
+    on events.attendance_events.
+    """
+    def __init__(self, cooldown=COOLDOWN_SECONDS):
+        self.cooldown = cooldown
+        self.lock = threading.RLock()
+        self.state = {}  # user_id -> [date, checked_in, last_updated]
+        self.queue = queue.Queue()
+        self.archived_on = None  # Closed months are archived by the writer once a day
+        self.stale = False  # A batch was dropped; reload the state once the queue is empty
+        self.load_state()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def load_state(self, date_str=None):
+        """Rebuild the in-memory state from one day's rows (today by default) in daily_attendance."""
+        date_str = date_str or datetime.datetime.now().strftime("%Y-%m-%d")
+        state = {}
+        for user_id, (time_out, last_updated) in database.get_latest_sessions(date_str).items():
+            state[user_id] = [date_str, time_out is None, database.parse_timestamp(last_updated)]
+        with self.lock:
+            self.state = state
+
+    def transition(self, user_id, name, camera_id=None, now=None):
+        """Apply one sighting at time now to the in-memory state and return the
+        resulting event for database.write_attendance_events(), or None during
+        the cooldown. Nothing is queued; mark() does that."""
+        now = now or datetime.datetime.now()
+        date_str = now.strftime("%Y-%m-%d")
+        time_str = now.strftime("%H:%M:%S")
+
+        with self.lock:
+            current = self.state.get(user_id)
+            if current is None or current[0] != date_str:
+                kind = "in"
+            else:
+                _, checked_in, last_updated = current
+                if last_updated is not None and (now - last_updated).total_seconds() < self.cooldown:
+                    return None # Too soon to toggle
+                kind = "out" if checked_in else "in"
+            self.state[user_id] = [date_str, kind == "in", now]
+        return (kind, user_id, name, date_str, time_str, now, camera_id)
+
+    def mark(self, user_id, name, camera_id=None):
+        """Same contract as database.mark_attendance(): returns "Time In: ..." /
+        "Time Out: ..." for a transition, or None during the cooldown.
+        camera_id records which camera saw the transition."""
+        with self.lock:  # Queue in the same order as the state changes
+            event = self.transition(user_id, name, camera_id)
+            if event is None:
+                return None
+            self.queue.put(event)
+        if event[0] == "in":
+            return f"Time In: {event[4]}"
+        return f"Time Out: {event[4]}"
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def flush(self):
+        """Block until every queued event has been written."""
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join(timeout=10)
+
+    def _run(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                self.queue.task_done()
+                return
+            batch = [event]
+            stop = False
+            while len(batch) < MAX_BATCH:
+                try:
+                    event = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if event is None:
+                    stop = True
+                    break
+                batch.append(event)
+            for row in self._write(batch):
+                events.attendance_events.publish(row)
+            if self.stale:
+                self._reload_if_drained()
+            for _ in range(len(batch) + stop):
+                self.queue.task_done()
+            if stop:
+                return
+            if self.archived_on != datetime.date.today():
+                self.archived_on = datetime.date.today()
+                try:
+                    database.archive_closed_months()
+                except Exception as e:
+                    print(f"[ERROR] Archiving closed months failed: {e}; retrying tomorrow")
+
+    def _write(self, batch):
+        """Write one batch, retrying with backoff (the database may be locked
+        by another process). A batch that keeps failing is logged event by
+        event, and the in-memory state is reloaded to match the database
+        once no more events are queued (see _reload_if_drained)."""
+        delay = RETRY_SECONDS
+        for attempt in range(1, WRITE_RETRIES + 1):
+            t = metrics.clock()
+            try:
+                rows = database.write_attendance_events(batch)
+                metrics.lap("db_write", t)
+                return rows
+            except Exception as e:
+                error = e
+                if attempt == WRITE_RETRIES:
+                    break
+                print(f"[WARN] Writing {len(batch)} attendance events failed (attempt {attempt} of {WRITE_RETRIES}): "
+                      f"{e}; retrying in {delay:.1f}s")
+                time.sleep(delay)
+                delay *= 2
+        print(f"[ERROR] Giving up on {len(batch)} attendance events after {WRITE_RETRIES} attempts: {error}")
+        for event in batch:
+            print(f"[ERROR] Unwritten attendance event: {event!r}")
+        self.stale = True
+        return []
+
+    def _reload_if_drained(self):
+        """Reload the state after a dropped batch, but only while nothing is
+        queued: queued events already changed the state and are not in the
+        database yet. mark() queues under the same lock, so none can slip in."""
+        with self.lock:
+            if not self.queue.empty():
+                return
+            try:
+                self.load_state()
+            except Exception as e:
+                print(f"[ERROR] Reloading attendance state failed: {e}")
+                return
+            self.stale = False
+
+recorder = None
+recorder_lock = threading.Lock()
+
+def get_recorder():
+    """Process-wide recorder shared by the camera thread and the web app."""
+    global recorder
+    with recorder_lock:
+        if recorder is None:
+            recorder = AttendanceRecorder()
+            metrics.gauge("attendance_queue_depth", recorder.pending)
+        return recorder
+
+def shutdown():
+    global recorder
+    with recorder_lock:
+        if recorder is not None:
+            recorder.close()
+            recorder = None
+
+atexit.register(shutdown)
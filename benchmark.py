@@ -0,0 +1,226 @@
+"""Reproducible timings for the detection, recognition, training and database hot paths.
+
+    python benchmark.py [--quick] [--only frames,training,attendance] [--output bench.json]
+                        [--compare baseline.json] [--threshold 0.15] [--data-dir face_data]
+
+Runs headless on CPU only. Frames come from frame_sources.SyntheticSource,
+which pastes face crops from face_data/ onto a background, so no camera is
+needed and every run sees the same input. With --compare, exits with status 1 if any
+timing got worse than the baseline by more than --threshold (a fraction).
+"""
+import cv2
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import attendance
+import camera
+import database
+import frame_sources
+import sample_store
+import trainer
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+FACE_COUNTS = [0, 1, 3]
+USER_COUNTS = [10, 100, 1000, 5000]
+SAMPLES_PER_USER = 5
+FRAMES = 100          # Timed frames per resolution / face count
+WARMUP_FRAMES = 10
+PREDICT_REPEATS = 200
+ATTENDANCE_MARKS = 2000
+THRESHOLD = 0.15      # Allowed slowdown vs a baseline before --compare fails
+SEED = frame_sources.SEED
+
+# Which direction is better for each kind of result value
+LOWER_IS_BETTER = ("_ms", "_s")
+HIGHER_IS_BETTER = ("fps", "per_sec")
+
+def synthetic_users(crops, users, samples_per_user=SAMPLES_PER_USER, seed=SEED):
+    """(faces, labels) for many distinct users made by perturbing real crops."""
+    rng = np.random.default_rng(seed)
+    base = np.stack([sample_store.normalize(c) for c in crops]).astype(np.int16)
+    faces = np.empty((users * samples_per_user, sample_store.SAMPLE_SIZE, sample_store.SAMPLE_SIZE), np.uint8)
+    labels = np.repeat(np.arange(1, users + 1, dtype=np.int32), samples_per_user)
+    for user in range(users):
+        # Every user gets their own base crop, brightness and noise pattern
+        face = base[rng.integers(len(base))]
+        offset = rng.integers(-25, 25)
+        pattern = rng.normal(0, 12, face.shape)
+        for s in range(samples_per_user):
+            jitter = rng.normal(0, 4, face.shape)
+            faces[user * samples_per_user + s] = np.clip(face + offset + pattern + jitter, 0, 255)
+    return faces, labels
+
+def summarize(times):
+    times = np.asarray(times) * 1000
+    return {"mean_ms": float(times.mean()), "p50_ms": float(np.percentile(times, 50)),
+            "p95_ms": float(np.percentile(times, 95)), "max_ms": float(times.max())}
+
+def bench_frames(crops, quick=False):
+    """Latency of one capture -> detect/track -> recognize -> encode cycle (what get_frame() serves)."""
+    recognizer = trainer.create_recognizer()
+    faces, labels = synthetic_users(crops, 10)
+    recognizer.train(list(faces), labels)
+    results = {}
+    resolutions = RESOLUTIONS[:1] if quick else RESOLUTIONS
+    frames = FRAMES // 4 if quick else FRAMES
+    for width, height in resolutions:
+        usable = frame_sources.detectable_crops(crops, width, height)
+        for count in FACE_COUNTS:
+            source = frame_sources.SyntheticSource(usable, width, height, count)
+            cam = camera.VideoCamera(source=source, start=False, on_attendance=lambda user_id, name: None)
+            cam.swap_recognizer(recognizer, 0)
+            cam.mode = "recognize"
+            detected = 0
+            times = []
+            for i in range(WARMUP_FRAMES + frames):
+                start = time.perf_counter()
+                frame = cam.process_frame()
+                cam.broadcast.publish(frame)
+                cam.get_frame()
+                if i >= WARMUP_FRAMES:
+                    times.append(time.perf_counter() - start)
+                    detected += len(cam.results)
+            cam.release()
+            result = summarize(times)
+            result["fps"] = len(times) / sum(times)
+            result["faces_found_per_frame"] = detected / len(times)
+            results[f"frames/{width}x{height}/{count}faces"] = result
+            print(f"[BENCH] {width}x{height} {count} faces: {result['fps']:.1f} fps, "
+                  f"p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, "
+                  f"{result['faces_found_per_frame']:.2f} faces found/frame")
+    return results
+
+def bench_training(crops, quick=False):
+    """Training time and predict latency as the number of enrolled users grows."""
+    results = {}
+    queries = [sample_store.normalize(c) for c in crops[:5]]
+    for users in (USER_COUNTS[:3] if quick else USER_COUNTS):
+        faces, labels = synthetic_users(crops, users)
+        recognizer = trainer.create_recognizer()
+        start = time.perf_counter()
+        recognizer.train(list(faces), labels)
+        train_s = time.perf_counter() - start
+        del faces
+        result = {"train_s": train_s}
+        for batch in (1, 5):
+            times = []
+            for _ in range(PREDICT_REPEATS // (4 if quick else 1)):
+                start = time.perf_counter()
+                trainer.predict_faces(recognizer, queries[:batch])
+                times.append(time.perf_counter() - start)
+            result[f"predict_{batch}face_p50_ms"] = summarize(times)["p50_ms"]
+            result[f"predict_{batch}face_p95_ms"] = summarize(times)["p95_ms"]
+        results[f"training/{users}users"] = result
+        print(f"[BENCH] {users} users x {SAMPLES_PER_USER} samples: train {train_s:.2f} s, "
+              f"predict p50 {result['predict_1face_p50_ms']:.2f} ms (1 face), "
+              f"{result['predict_5face_p50_ms']:.2f} ms (5 faces)")
+    return results
+
+def bench_attendance(quick=False):
+    """Throughput of the synchronous mark_attendance() and of the write-behind recorder."""
+    results = {}
+    marks = ATTENDANCE_MARKS // 4 if quick else ATTENDANCE_MARKS
+    old_db = database.DB_NAME
+    tmp_dir = tempfile.mkdtemp(prefix="face_bench_")
+    try:
+        database.DB_NAME = os.path.join(tmp_dir, "sync.db")
+        database.init_db()
+        start = time.perf_counter()
+        for user_id in range(marks):
+            database.mark_attendance(user_id, f"user{user_id}")
+        elapsed = time.perf_counter() - start
+        results["attendance/mark_attendance"] = {"marks_per_sec": marks / elapsed}
+
+        database.DB_NAME = os.path.join(tmp_dir, "recorder.db")
+        database.init_db()
+        recorder = attendance.AttendanceRecorder()
+        start = time.perf_counter()
+        for user_id in range(marks):
+            recorder.mark(user_id, f"user{user_id}")
+        queued = time.perf_counter() - start
+        recorder.flush()
+        elapsed = time.perf_counter() - start
+        recorder.close()
+        results["attendance/recorder"] = {"marks_per_sec": marks / elapsed, "mark_call_per_sec": marks / queued}
+        database.close_connection()
+    finally:
+        database.DB_NAME = old_db
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    for name, result in results.items():
+        print(f"[BENCH] {name}: {result['marks_per_sec']:.0f} marks/sec")
+    return results
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Return a list of regressions of results against a baseline run."""
+    regressions = []
+    for name, values in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        for key, value in values.items():
+            before = old.get(key)
+            if not before or key == "faces_found_per_frame":
+                continue
+            if key.endswith(LOWER_IS_BETTER):
+                change = value / before - 1
+            elif key.endswith(HIGHER_IS_BETTER):
+                change = before / value - 1
+            else:
+                continue
+            if change > threshold:
+                regressions.append(f"{name} {key}: {before:.3f} -> {value:.3f} ({change:+.0%})")
+    return regressions
+
+def run(suites, data_dir=sample_store.DATA_DIR, quick=False):
+    cv2.setRNGSeed(SEED)
+    crops = frame_sources.load_crops(data_dir)
+    if not crops:
+        raise SystemExit(f"[ERROR] No face samples found in {data_dir}")
+    results = {}
+    if "frames" in suites:
+        results.update(bench_frames(crops, quick))
+    if "training" in suites:
+        results.update(bench_training(crops, quick))
+    if "attendance" in suites:
+        results.update(bench_attendance(quick))
+    meta = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "cpus": os.cpu_count(),
+        "backend": trainer.RECOGNIZER_BACKEND,
+        "quick": quick,
+    }
+    return {"meta": meta, "results": results}
+
+if __name__ == "__main__":
+    def option(name, default=None):
+        return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else default
+
+    suites = option("--only", "frames,training,attendance").split(",")
+    report = run(suites, option("--data-dir", sample_store.DATA_DIR), "--quick" in sys.argv)
+    output = option("--output")
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Results written to {output}")
+    baseline_file = option("--compare")
+    if baseline_file:
+        with open(baseline_file, 'r') as f:
+            baseline = json.load(f)
+        threshold = float(option("--threshold", THRESHOLD))
+        regressions = compare(report["results"], baseline, threshold)
+        if regressions:
+            print(f"[FAIL] {len(regressions)} regressions over {threshold:.0%}:")
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print(f"[OK] No regressions over {threshold:.0%} against {baseline_file}")
@@ -1,137 +1,388 @@
 import cv2
 import os
-import numpy as np
-import database
-import json
+import attendance
+import trainer
+import sample_store
+import sample_capture
+import detectors
+import tracker
+import motion
+import frame_sources
+import metrics
+import users
+import threading
+import time
 
-class VideoCamera:
+JPEG_QUALITY = 95  # OpenCV's default
+REOPEN_SECONDS = 2  # Wait between reconnect attempts for network streams
+
+def parse_source(source):
+    """Device index (0, "1"), RTSP/HTTP URL, video file path, image directory or
+    synthetic spec (see frame_sources)."""
+    if isinstance(source, str) and source.strip().isdigit():
+        return int(source)
+    return source
+
+def open_source(source):
+    if hasattr(source, "read"):
+        return source  # Already a capture-like object, e.g. frame_sources.SyntheticSource
+    video = frame_sources.open_source(source)
+    if video is not None:
+        return video
+    video = cv2.VideoCapture(source)
+    if isinstance(source, int) and not video.isOpened() and os.name == "nt":
+        video = cv2.VideoCapture(source, cv2.CAP_DSHOW)  # Helps some Windows setups
+    return video
+
+class FrameBroadcast:
+    """Holds the latest processed frame and wakes every waiting consumer when it changes.
+
+    Frames are published raw and only JPEG-encoded when a consumer asks for
+    them; each (width, quality) variant is encoded once per frame and shared
+    by every client that requested it, so with no viewers nothing is encoded.
+    """
     def __init__(self):
-        self.video = cv2.VideoCapture(0)
+        self.cond = threading.Condition()
+        self.frame = None
+        self.seq = 0
+        self.viewers = 0
+        self.encoded = {}  # (seq, width, quality) -> JPEG bytes
+        self.encode_lock = threading.Lock()
+
+    def publish(self, frame):
+        with self.cond:
+            self.frame = frame
+            self.seq += 1
+            self.cond.notify_all()
+        with self.encode_lock:
+            self.encoded = {k: v for k, v in self.encoded.items() if k[0] >= self.seq - 1}
+
+    def wait(self, last_seq, timeout=1.0):
+        # Returns (seq, frame) once a frame newer than last_seq is published,
+        # or the current one if the timeout expires first.
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq != last_seq, timeout)
+            return self.seq, self.frame
+
+    def encode(self, seq, frame, width=None, quality=JPEG_QUALITY):
+        key = (seq, width, quality)
+        with self.encode_lock:
+            jpeg = self.encoded.get(key)
+        if jpeg is not None:
+            return jpeg
+        if width and width < frame.shape[1]:
+            height = int(frame.shape[0] * width / frame.shape[1])
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        t = metrics.clock()
+        ret, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+        jpeg = jpeg.tobytes()
+        metrics.lap("imencode", t)
+        with self.encode_lock:
+            self.encoded[key] = jpeg
+        return jpeg
+
+    def add_viewer(self):
+        with self.cond:
+            self.viewers += 1
+
+    def remove_viewer(self):
+        with self.cond:
+            self.viewers -= 1
+
+class VideoCamera:
+    def __init__(self, source=0, camera_id="default", detect_interval=tracker.DETECT_INTERVAL,
+                 detect_scale=tracker.DETECT_SCALE, motion_gate=True, motion_threshold=motion.MOTION_THRESHOLD,
+                 motion_min_area=motion.MOTION_MIN_AREA, motion_roi=None, loop=True,
+                 background_trainer=None, on_attendance=None, detector=None, start=True):
+        self.camera_id = camera_id
+        self.source = parse_source(source)
+        self.video = open_source(self.source)
+        # Video files and frame sources are played back at their own frame rate (and looped), like a live camera
+        self.is_file = (isinstance(self.source, str) and os.path.isfile(self.source)) or \
+            isinstance(self.video, frame_sources.FrameSource)
+        self.loop = loop
+        fps = self.video.get(cv2.CAP_PROP_FPS) if self.is_file else 0
+        self.frame_interval = 1.0 / fps if fps and fps > 0 else 0
+        self.last_open = time.monotonic()
         self.mode = "idle"  # idle, register, recognize
-        self.face_detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        self.recognizer = cv2.face.LBPHFaceRecognizer_create()
+        # detector.json, or a backend name / parameter dict for this camera
+        self.face_detector = detectors.create_detector(detector)
+        # Detect every detect_interval frames on a downscaled copy, track in between
+        self.tracker = tracker.FaceTracker(self.face_detector, detect_interval, detect_scale)
+        # Skip detection entirely while the scene (or motion_roi, as x/y/w/h fractions) is static
+        self.motion = motion.MotionGate(motion_threshold, motion_min_area, motion_roi) if motion_gate else None
+        self.frames = 0
+        self.fps = 0.0
+        metrics.gauge("fps", lambda: self.fps)
+        metrics.gauge("motion_skipped_frames", lambda: self.motion.skipped if self.motion is not None else 0)
+        self.results = []  # Faces in the latest frame: [{"track", "box", "user_id", "name", "confirmed"}]
+        self.recognizer = trainer.create_recognizer()
         
         self.data_dir = "face_data"
-        self.model_file = "trainer.yml"
-        self.names_file = "names.json"
+        self.model_file = trainer.MODEL_FILE
+        self.users = users.get_directory()
         
-        if not os.path.exists(self.data_dir):
-            os.makedirs(self.data_dir)
+        self.store = sample_store.SampleStore(self.data_dir)
             
+        self.model_version = 0
+        self.predict_failed = False  # Set while predictions fail, so the error is printed once
         self.load_resources()
         
         # Registration state
         self.reg_id = None
         self.reg_name = None
         self.reg_count = 0
-        self.reg_max = 60
+        self.reg_max = trainer.SAMPLE_BUDGET  # Training keeps at most this many per user anyway
+        self.resume_mode = "idle"
+        self.collector = None  # sample_capture.SampleCollector while registering
+
+        # Training runs in a worker process; the finished model is swapped in live.
+        # Under a CameraRegistry all cameras share the registry's trainer instead.
+        self.trainer = background_trainer or trainer.BackgroundTrainer(self.data_dir, self.model_file,
+                                                                       on_model_ready=self.swap_recognizer)
+        self.on_attendance = on_attendance or self.mark_attendance
+
+        # Single producer: capture and process once, fan out to every viewer
+        self.lock = threading.Lock()
+        self.broadcast = FrameBroadcast()
+        # start=False leaves the capture thread off so callers can drive process_frame() themselves
+        self.running = start
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        if start:
+            self.thread.start()
 
     def __del__(self):
+        self.release()
+
+    def release(self):
+        self.running = False
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
         self.video.release()
 
+    def _run(self):
+        next_time = 0
+        fps_start, fps_frames = time.monotonic(), 0
+        while self.running:
+            if self.frame_interval:
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_time = max(next_time + self.frame_interval, time.monotonic())
+            try:
+                frame = self.process_frame()
+            except Exception as e:
+                print(f"Frame processing error: {e}")
+                frame = None
+            if frame is None:
+                metrics.inc("dropped_frames")
+                time.sleep(0.05)  # Camera not ready, avoid spinning
+                continue
+            self.broadcast.publish(frame)
+            fps_frames += 1
+            elapsed = time.monotonic() - fps_start
+            if elapsed >= 1.0:
+                self.fps = fps_frames / elapsed
+                fps_start, fps_frames = time.monotonic(), 0
+
+    def wait_frame(self, last_seq, timeout=1.0):
+        """Block until a frame newer than last_seq exists; returns (seq, raw frame)."""
+        return self.broadcast.wait(last_seq, timeout)
+
+    def encode_frame(self, seq, frame, width=None, quality=JPEG_QUALITY):
+        return self.broadcast.encode(seq, frame, width, quality)
+
+    def get_frame(self):
+        seq, frame = self.broadcast.seq, self.broadcast.frame
+        if frame is None:
+            return None
+        return self.encode_frame(seq, frame)
+
     def load_resources(self):
-        self.names = {}
-        if os.path.exists(self.names_file):
-            with open(self.names_file, 'r') as f:
-                self.names = {int(k):v for k,v in json.load(f).items()}
-        
         if os.path.exists(self.model_file):
             self.recognizer.read(self.model_file)
 
+    def reload_model(self, version):
+        """Load a model that was trained elsewhere (e.g. for another camera)."""
+        recognizer = trainer.create_recognizer()
+        recognizer.read(self.model_file)
+        self.swap_recognizer(recognizer, version)
+
+    def mark_attendance(self, user_id, name):
+        return attendance.get_recorder().mark(user_id, name, self.camera_id)
+
+    def swap_recognizer(self, recognizer, version):
+        # A single reference assignment; the frame loop picks it up on its next frame
+        self.recognizer = recognizer
+        self.model_version = version
+        print(f"Model v{version} loaded.")
+
     def start_registration(self, user_id, name):
-        self.reg_id = int(user_id)
-        self.reg_name = name
-        self.reg_count = 0
-        self.mode = "register"
+        with self.lock:
+            self.reg_id = int(user_id)
+            self.reg_name = name
+            self.reg_count = 0
+            if self.mode != "register":
+                self.resume_mode = self.mode
+            self.mode = "register"
+            # Re-registering replaces the user's old samples
+            trainer.remove_user_samples(self.reg_id, self.data_dir)
+            if self.collector is not None:
+                self.collector.close()
+            self.collector = sample_capture.SampleCollector(self.store, self.reg_id, self.reg_max)
         
-        # Save name mapping immediately
-        self.names[self.reg_id] = name
-        with open(self.names_file, 'w') as f:
-            json.dump(self.names, f)
-        database.add_user(self.reg_id, name)
+        # Save the name immediately; every process's directory picks it up
+        self.users.add(self.reg_id, name)
 
     def start_recognition(self):
-        self.load_resources() # Reload in case of updates
-        if not os.path.exists(self.model_file):
-            print("Model not found")
-            return False
-        self.mode = "recognize"
-        return True
+        with self.lock:
+            if self.recognizer.empty():
+                print("Model not found")
+                return False
+            self.mode = "recognize"
+            return True
 
     def stop_mode(self):
-        self.mode = "idle"
+        with self.lock:
+            self.mode = "idle"
+            self.tracker.reset()
+            if self.collector is not None:
+                self.collector.close()
+                self.collector = None
 
-    def train_model(self):
-        print("Training model...")
-        path = self.data_dir
-        imagePaths = [os.path.join(path,f) for f in os.listdir(path) if f.endswith('.jpg')]     
-        faceSamples=[]
-        ids = []
+    def get_stats(self):
+        return {
+            "camera_id": self.camera_id,
+            "mode": self.mode,
+            "frames": self.frames,
+            "motion_skipped": self.motion.skipped if self.motion is not None else 0,
+            "viewers": self.broadcast.viewers,
+            "model_version": self.model_version,
+        }
 
-        for imagePath in imagePaths:
-            try:
-                PIL_img = cv2.imread(imagePath, cv2.IMREAD_GRAYSCALE)
-                id = int(os.path.split(imagePath)[-1].split(".")[1])
-                faceSamples.append(PIL_img)
-                ids.append(id)
-            except:
-                continue
-        
-        if ids:
-            self.recognizer.train(faceSamples, np.array(ids))
-            self.recognizer.write(self.model_file)
-            print("Training complete.")
+    def train_model(self):
+        print("Training model in background...")
+        self.trainer.submit(self.reg_id)
 
-    def get_frame(self):
+    def read(self):
         success, image = self.video.read()
-        if not success:
+        if success:
+            return image
+        if self.is_file and self.loop:
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, image = self.video.read()
+            return image if success else None
+        if isinstance(self.source, str) and not self.is_file and time.monotonic() - self.last_open > REOPEN_SECONDS:
+            # Network stream dropped; reconnect
+            self.last_open = time.monotonic()
+            self.video.release()
+            self.video = open_source(self.source)
+        return None
+
+    def process_frame(self):
+        t = metrics.clock()
+        image = self.read()
+        if image is None:
             return None
+        metrics.lap("capture", t)
+        metrics.inc("frames")
+
+        with self.lock:
+            return self._process(image)
 
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        gray = cv2.equalizeHist(gray)
-        faces = self.face_detector.detectMultiScale(gray, 1.3, 5)
+    def _process(self, image):
+        self.frames += 1
+        moving = self.motion.check(image) if self.motion is not None else True
+        # Keep going while registering or following faces, even if they hold still
+        active = self.mode == "register" or bool(self.tracker.tracks)
+        if self.mode == "idle" or not (moving or active):
+            tracked = []
+        else:
+            t = metrics.clock()
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            t = metrics.lap("cvtcolor", t)
+            gray = cv2.equalizeHist(gray)
+            metrics.lap("equalize", t)
+            # Registration always detects so every saved sample is a fresh detection
+            tracked = self.tracker.update(gray, detect=self.mode == "register")
+            metrics.observe("faces_per_frame", len(tracked), metrics.FACE_BUCKETS)
+        faces = [box for _, box in tracked]
+        results = []
 
         if self.mode == "register":
             for (x, y, w, h) in faces:
                 cv2.rectangle(image, (x, y), (x+w, y+h), (255, 0, 0), 2)
-                self.reg_count += 1
-                
-                cv2.imwrite(f"{self.data_dir}/User.{self.reg_id}.{self.reg_count}.jpg", gray[y:y+h,x:x+w])
-                cv2.putText(image, f"Capturing: {self.reg_count}/{self.reg_max}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            
-            if self.reg_count >= self.reg_max:
-                self.mode = "idle"
+            # Writer threads filter and save the crop; sharp, distinct single-face crops count
+            self.collector.offer(gray, faces)
+            self.reg_count = self.collector.saved
+            cv2.putText(image, f"Capturing: {self.reg_count}/{self.reg_max}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            hint = self.collector.hint()
+            if hint:
+                cv2.putText(image, hint, (10, image.shape[0] - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+
+            if self.collector.done():
+                if self.collector.stalled():
+                    print(f"[INFO] Registration of {self.reg_name} ended with {self.collector.saved}/{self.reg_max} samples: "
+                          f"no new distinct face for {sample_capture.STALL_SECONDS}s")
+                # Go back to what we were doing; recognition keeps using the old model meanwhile
+                self.mode = self.resume_mode
+                self.collector.close()
+                self.collector = None
                 self.train_model()
-                cv2.putText(image, "Training Complete!", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
 
         elif self.mode == "recognize":
-            for (x, y, w, h) in faces:
-                try:
-                    id, confidence = self.recognizer.predict(gray[y:y+h,x:x+w])
-                    
-                    # Lower threshold for stricter matching (0 is perfect, 100 is bad)
-                    # 50 is a good balance. If still false positive, lower to 40.
-                    if confidence < 50: 
-                        name = self.names.get(id, "Unknown")
-                        conf_text = f"{round(100 - confidence)}%"
-                        color = (0, 255, 0) # Green for match
-                        
-                        if name != "Unknown":
-                            if database.mark_attendance(id, name):
-                                print(f"Marked: {name}")
-                    else:
-                        name = "Unknown"
-                        conf_text = f"Low: {round(confidence)}"
-                        color = (0, 0, 255) # Red for unknown
-
-                    cv2.rectangle(image, (x, y), (x+w, y+h), color, 2)
-                    cv2.putText(image, str(name), (x+5,y-5), cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
-                    cv2.putText(image, str(conf_text), (x+5,y+h-5), cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,0), 1)
-                except:
-                    pass
+            recognizer = self.recognizer
+            # Only predict for tracks that are still voting or due a re-check,
+            # and match all of them in one batch
+            pending = [(track, box) for track, box in tracked if track.needs_predict()]
+            crops = [sample_store.normalize(gray[y:y+h,x:x+w]) for _, (x, y, w, h) in pending]
+            try:
+                predictions = trainer.predict_faces(recognizer, crops)
+                self.predict_failed = False
+            except (cv2.error, ValueError) as e:
+                # An empty or unusable model (OpenCV / LBPHIndex); anything else is a bug and propagates
+                if not self.predict_failed:
+                    print(f"[ERROR] Recognition failed on camera {self.camera_id}: {e}")
+                self.predict_failed = True
+                predictions = []
+            for (track, _), (id, confidence) in zip(pending, predictions):
+                # Lower threshold for stricter matching (0 is perfect, 100 is bad)
+                # 50 is a good balance. If still false positive, lower to 40.
+                track.add_vote(id if confidence < 50 else None, confidence)
+
+            for track, (x, y, w, h) in tracked:
+                if not track.confirmed:
+                    name = "..."
+                    conf_text = ""
+                    color = (0, 255, 255) # Yellow while identifying
+                elif track.label is not None:
+                    name = self.users.get(track.label, "Unknown")
+                    conf_text = f"{round(100 - track.confidence)}%"
+                    color = (0, 255, 0) # Green for match
+
+                    if name != "Unknown" and not track.attended:
+                        track.attended = True  # Once per track
+                        if self.on_attendance(track.label, name):
+                            print(f"Marked: {name}")
+                else:
+                    name = "Unknown"
+                    conf_text = f"Low: {round(track.confidence)}"
+                    color = (0, 0, 255) # Red for unknown
+
+                results.append({"track": track.id, "box": [x, y, w, h], "confirmed": track.confirmed,
+                                "user_id": track.label if track.confirmed else None, "name": name})
+                cv2.rectangle(image, (x, y), (x+w, y+h), color, 2)
+                cv2.putText(image, str(name), (x+5,y-5), cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
+                cv2.putText(image, str(conf_text), (x+5,y+h-5), cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,0), 1)
 
         else: # Idle
             cv2.putText(image, "System Ready", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
 
-        ret, jpeg = cv2.imencode('.jpg', image)
-        return jpeg.tobytes()
+        status = self.trainer.get_status()
+        if status["state"] == "running":
+            cv2.putText(image, f"Training: {round(status['progress'] * 100)}%", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+        elif status["state"] == "done" and time.time() - status["finished_at"] < 5:
+            cv2.putText(image, "Training Complete!", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+        self.results = results
+        return image
@@ -0,0 +1,273 @@
+import atexit
+import json
+import multiprocessing
+import os
+import queue
+import re
+import threading
+import attendance
+import camera
+import frame_shm
+import metrics
+import trainer
+
+CONFIG_FILE = os.environ.get("CAMERA_CONFIG", "cameras.json")
+DEFAULT_CAMERAS = [{"id": "default", "source": 0}]
+CAMERA_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")  # Camera IDs appear in URLs
+
+def load_config(path=CONFIG_FILE):
+    """Read the camera list from a JSON file shaped like
+
+        {"cameras": [{"id": "entrance", "source": 0},
+                     {"id": "lobby", "source": "rtsp://10.0.0.5/stream1", "detect_interval": 3},
+                     {"id": "demo", "source": "videos/demo.mp4"}]}
+
+    Any other keys of an entry are passed to camera.VideoCamera. Without a
+    config file the server runs the single default camera (device 0).
+    """
+    if not os.path.exists(path):
+        return [dict(c) for c in DEFAULT_CAMERAS]
+    with open(path, 'r') as f:
+        data = json.load(f)
+    cameras = data.get("cameras", []) if isinstance(data, dict) else data
+    if not cameras:
+        raise ValueError(f"{path} does not list any cameras")
+    seen = set()
+    for entry in cameras:
+        camera_id = str(entry.get("id", ""))
+        if not CAMERA_ID_PATTERN.match(camera_id):
+            raise ValueError(f"Invalid camera id {camera_id!r} in {path}")
+        if camera_id in seen:
+            raise ValueError(f"Duplicate camera id {camera_id!r} in {path}")
+        if "source" not in entry:
+            raise ValueError(f"Camera {camera_id!r} in {path} has no source")
+        seen.add(camera_id)
+        entry["id"] = camera_id
+    return cameras
+
+class TrainerClient:
+    """Stands in for trainer.BackgroundTrainer inside a camera process.
+
+    Jobs are forwarded to the registry, which trains once for all cameras
+    and pushes its status back so the frame overlay keeps working.
+    """
+    def __init__(self, camera_id, events):
+        self.camera_id = camera_id
+        self.events = events
+        self.status = {"state": "idle", "stage": None, "progress": 0.0, "user_id": None,
+                       "version": 0, "pending": 0, "finished_at": None, "message": ""}
+
+    def submit(self, user_id=None):
+        self.events.put(("train", self.camera_id, user_id))
+
+    def get_status(self):
+        return self.status
+
+    def set_status(self, status):
+        self.status = status
+
+def _publish_frames(cam, writer):
+    # Copy every frame's results into shared memory; encode the JPEG only while someone reads
+    seq = 0
+    while cam.running:
+        new_seq, frame = cam.wait_frame(seq)
+        if frame is None or new_seq == seq:
+            continue
+        seq = new_seq
+        jpeg = cam.encode_frame(seq, frame) if writer.wanted() else b""
+        writer.write(jpeg, cam.results)
+
+def _camera_worker(camera_id, options, control, shm_name, events):
+    # Entry point of a camera process: owns the capture device and the whole
+    # detection/recognition pipeline, publishes frames to shared memory and
+    # answers control calls over a pipe.
+    shm = frame_shm.attach(shm_name, child=True)
+    client = TrainerClient(camera_id, events)
+    on_attendance = lambda user_id, name: events.put(("attendance", camera_id, user_id, name))
+    cam = camera.VideoCamera(camera_id=camera_id, background_trainer=client,
+                             on_attendance=on_attendance, **options)
+    publisher = threading.Thread(target=_publish_frames, args=(cam, frame_shm.FrameWriter(shm)), daemon=True)
+    publisher.start()
+    commands = {
+        "start_registration": cam.start_registration,
+        "start_recognition": cam.start_recognition,
+        "stop_mode": cam.stop_mode,
+        "get_stats": cam.get_stats,
+        "reload_model": cam.reload_model,
+        "set_training_status": client.set_status,
+        "get_metrics": metrics.snapshot,
+    }
+    try:
+        while True:
+            try:
+                method, args = control.recv()
+            except (EOFError, OSError):
+                break  # Web process went away
+            if method == "close":
+                control.send((True, None))
+                break
+            try:
+                control.send((True, commands[method](*args)))
+            except Exception as e:
+                control.send((False, f"{type(e).__name__}: {e}"))
+    finally:
+        cam.release()
+        publisher.join(timeout=2)
+        shm.close()
+
+class CameraProcess:
+    """Web-process handle for one camera process, with the VideoCamera methods the app uses."""
+    def __init__(self, ctx, config, events):
+        options = dict(config)
+        self.camera_id = options.pop("id")
+        self.source = options.get("source")
+        # Frames go through shared memory, so any process can serve them (see camera_server.py)
+        self.shm = frame_shm.create(f"facecam_{os.getpid()}_{self.camera_id}")
+        self.broadcast = frame_shm.SharedBroadcast(self.shm)
+        self.control, child_control = ctx.Pipe()
+        self.lock = threading.Lock()
+        self.process = ctx.Process(target=_camera_worker, name=f"camera-{self.camera_id}",
+                                   args=(self.camera_id, options, child_control, self.shm.name, events))
+        self.process.start()
+        child_control.close()
+
+    def call(self, method, *args):
+        with self.lock:
+            self.control.send((method, args))
+            ok, result = self.control.recv()
+        if not ok:
+            raise RuntimeError(f"Camera {self.camera_id}: {result}")
+        return result
+
+    def start_registration(self, user_id, name):
+        return self.call("start_registration", user_id, name)
+
+    def start_recognition(self):
+        return self.call("start_recognition")
+
+    def stop_mode(self):
+        return self.call("stop_mode")
+
+    def get_stats(self):
+        if not self.process.is_alive():
+            return {"camera_id": self.camera_id, "mode": "offline", "exitcode": self.process.exitcode}
+        stats = self.call("get_stats")
+        stats["viewers"] = self.broadcast.viewers  # Viewers connect to this process, not the camera's
+        return stats
+
+    def get_metrics(self):
+        return self.call("get_metrics")
+
+    def wait_frame(self, last_seq, timeout=1.0):
+        return self.broadcast.wait(last_seq, timeout)
+
+    def encode_frame(self, seq, frame, width=None, quality=camera.JPEG_QUALITY):
+        return self.broadcast.encode(seq, frame, width, quality)
+
+    def get_frame(self):
+        self.broadcast.reader.touch()
+        return self.broadcast.reader.read()[1]
+
+    def close(self, timeout=5):
+        if self.process.is_alive():
+            try:
+                self.call("close")
+            except (EOFError, OSError, RuntimeError):
+                pass
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.control.close()
+        self.shm.close()
+        self.shm.unlink()
+
+class CameraRegistry:
+    """Runs every configured camera in its own process.
+
+    Processes are started with "spawn" so they never inherit the web
+    server's threads or database connections. Attendance sightings come back
+    over one event queue and are marked here by the shared recorder (so the
+    cooldown spans all cameras), and registrations from any camera train one
+    shared model that is then reloaded by every camera.
+    """
+    def __init__(self, config_file=CONFIG_FILE):
+        trainer.upgrade_model()  # Before any camera process loads the model
+        ctx = multiprocessing.get_context("spawn")
+        self.events = ctx.Queue()
+        self.trainer = trainer.BackgroundTrainer(trainer.DATA_DIR, trainer.MODEL_FILE,
+                                                 on_model_ready=self._model_ready)
+        self.cameras = {}
+        for config in load_config(config_file):
+            cam = CameraProcess(ctx, config, self.events)
+            self.cameras[cam.camera_id] = cam
+            print(f"[INFO] Camera {cam.camera_id} started (source: {cam.source})")
+        self.default_id = next(iter(self.cameras))
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def get(self, camera_id=None):
+        """Camera handle by ID (the first configured camera if None), or None if unknown."""
+        return self.cameras.get(camera_id or self.default_id)
+
+    def ids(self):
+        return list(self.cameras)
+
+    def segments(self):
+        """[(camera_id, shared memory name)] for readers in other processes."""
+        return [(camera_id, cam.shm.name) for camera_id, cam in self.cameras.items()]
+
+    def training_status(self):
+        return self.trainer.get_status()
+
+    def registering(self, exclude=None):
+        """ID of another camera that is capturing samples, if any."""
+        for camera_id, cam in self.cameras.items():
+            if camera_id != exclude and cam.process.is_alive() and cam.get_stats()["mode"] == "register":
+                return camera_id
+        return None
+
+    def _model_ready(self, recognizer, version):
+        for cam in self.cameras.values():
+            try:
+                cam.call("reload_model", version)
+            except Exception as e:
+                print(f"[WARN] Camera {cam.camera_id} could not reload the model: {e}")
+
+    def _push_training_status(self, status):
+        for cam in self.cameras.values():
+            try:
+                cam.call("set_training_status", status)
+            except Exception:
+                pass
+
+    def _run(self):
+        last_status = None
+        while self.running:
+            try:
+                event = self.events.get(timeout=0.5)
+            except queue.Empty:
+                event = None
+            except (EOFError, OSError):
+                return
+            if event is not None:
+                kind, camera_id = event[0], event[1]
+                if kind == "attendance":
+                    user_id, name = event[2], event[3]
+                    if attendance.get_recorder().mark(user_id, name, camera_id):
+                        print(f"Marked: {name} ({camera_id})")
+                elif kind == "train":
+                    print(f"Training model in background for camera {camera_id}...")
+                    self.trainer.submit(event[2])
+            status = self.trainer.get_status()
+            if status != last_status:
+                last_status = status
+                self._push_training_status(status)
+
+    def close(self):
+        if not self.running:
+            return
+        self.running = False
+        for cam in self.cameras.values():
+            cam.close()
@@ -0,0 +1,262 @@
+"""Standalone camera owner for running the web app in several worker processes.
+
+    python camera_server.py [--listen 127.0.0.1:6000]
+    CAMERA_SERVER=127.0.0.1:6000 <WSGI server with N workers> app:app
+
+The server runs the CameraRegistry (capture, recognition, training and
+attendance). Web workers read frames and recognition results straight from
+its shared-memory segments and send control calls and receive attendance
+events over one local authenticated connection.
+
+Messages on that connection are pickled, so its key must stay secret: set
+CAMERA_SERVER_KEY in both processes (required when listening on anything
+but a loopback address), or let a server on loopback generate one into
+KEY_FILE, readable only by its user, where the web workers pick it up.
+"""
+import ipaddress
+import os
+import secrets
+import signal
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener, AuthenticationError
+import camera
+import camera_registry
+import database
+import events
+import frame_shm
+import metrics
+
+ADDRESS = "127.0.0.1:6000"
+KEY_FILE = "camera_server.key"
+KEEPALIVE_SECONDS = 15
+RECONNECT_SECONDS = 2
+CAMERA_METHODS = {"start_registration", "start_recognition", "stop_mode", "get_stats", "get_metrics"}
+
+def parse_address(value):
+    host, _, port = value.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def load_authkey(create=False, key_file=KEY_FILE):
+    """The connection key: CAMERA_SERVER_KEY if set, else the one in key_file.
+
+    With create=True (the server) a missing key file is generated with a
+    random key, readable by the current user only.
+    """
+    key = os.environ.get("CAMERA_SERVER_KEY")
+    if key:
+        return key.encode()
+    if create and not os.path.exists(key_file):
+        fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+        print(f"[INFO] Generated a camera server key in {key_file}")
+    try:
+        with open(key_file, 'r') as f:
+            return f.read().strip().encode()
+    except FileNotFoundError:
+        raise RuntimeError(f"No camera server key: set CAMERA_SERVER_KEY or start camera_server.py first (it writes {key_file})")
+
+class CameraServer:
+    def __init__(self, registry, address=ADDRESS, authkey=None):
+        self.registry = registry
+        self.address = parse_address(address)
+        if authkey is None:
+            if not is_loopback(self.address[0]) and not os.environ.get("CAMERA_SERVER_KEY"):
+                raise RuntimeError(f"Set CAMERA_SERVER_KEY to listen on {self.address[0]}; "
+                                   f"only loopback addresses may use a generated key")
+            authkey = load_authkey(create=True)
+        self.authkey = authkey
+
+    def serve_forever(self):
+        with Listener(self.address, authkey=self.authkey) as listener:
+            print(f"[INFO] Camera server listening on {self.address[0]}:{self.address[1]}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except AuthenticationError:
+                    print("[WARN] Rejected a connection with the wrong key")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _dispatch(self, request):
+        kind = request[0]
+        if kind == "cameras":
+            return self.registry.segments()
+        if kind == "training":
+            return self.registry.training_status()
+        if kind == "metrics":
+            return metrics.snapshot()
+        if kind == "registering":
+            return self.registry.registering(exclude=request[1])
+        if kind == "call":
+            _, camera_id, method, args = request
+            cam = self.registry.get(camera_id)
+            if cam is None:
+                raise KeyError(f"Unknown camera: {camera_id}")
+            if method not in CAMERA_METHODS:
+                raise ValueError(f"Unknown method: {method}")
+            return getattr(cam, method)(*args)
+        raise ValueError(f"Unknown request: {kind}")
+
+    def _handle(self, conn):
+        try:
+            while True:
+                request = conn.recv()
+                if request[0] == "subscribe":
+                    return self._stream_events(conn)
+                try:
+                    conn.send((True, self._dispatch(request)))
+                except Exception as e:
+                    conn.send((False, f"{type(e).__name__}: {e}"))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def _stream_events(self, conn):
+        sub = events.attendance_events.subscribe()
+        try:
+            while True:
+                event = sub.get(timeout=KEEPALIVE_SECONDS)
+                if sub.overflowed:
+                    sub.overflowed = False
+                    while sub.get(timeout=0) is not None:
+                        pass
+                    conn.send(("resync",))
+                elif event is None:
+                    conn.send(("keepalive",))  # Notices dead web workers
+                else:
+                    conn.send(("attendance", event))
+        finally:
+            events.attendance_events.unsubscribe(sub)
+
+class RemoteCamera:
+    """A camera served by a camera server; same methods as CameraProcess."""
+    def __init__(self, registry, camera_id, shm_name):
+        self.registry = registry
+        self.camera_id = camera_id
+        self.shm = frame_shm.attach(shm_name)
+        self.broadcast = frame_shm.SharedBroadcast(self.shm)
+
+    def call(self, method, *args):
+        return self.registry.request("call", self.camera_id, method, args)
+
+    def start_registration(self, user_id, name):
+        return self.call("start_registration", user_id, name)
+
+    def start_recognition(self):
+        return self.call("start_recognition")
+
+    def stop_mode(self):
+        return self.call("stop_mode")
+
+    def get_stats(self):
+        stats = self.call("get_stats")
+        stats["viewers"] = self.broadcast.viewers  # This worker's viewers
+        return stats
+
+    def get_metrics(self):
+        return self.call("get_metrics")
+
+    def wait_frame(self, last_seq, timeout=1.0):
+        return self.broadcast.wait(last_seq, timeout)
+
+    def encode_frame(self, seq, frame, width=None, quality=camera.JPEG_QUALITY):
+        return self.broadcast.encode(seq, frame, width, quality)
+
+    def get_frame(self):
+        self.broadcast.reader.touch()
+        return self.broadcast.reader.read()[1]
+
+class RemoteRegistry:
+    """Client side of a CameraServer with the CameraRegistry methods the app uses.
+
+    Attendance events from the server are republished on this process's
+    events.attendance_events, so /api/stream works unchanged.
+    """
+    def __init__(self, address=ADDRESS, authkey=None):
+        self.address = parse_address(address)
+        self.authkey = authkey or load_authkey()
+        self.lock = threading.Lock()
+        self.conn = None
+        self.cameras = {camera_id: RemoteCamera(self, camera_id, shm_name)
+                        for camera_id, shm_name in self.request("cameras")}
+        self.default_id = next(iter(self.cameras))
+        self.thread = threading.Thread(target=self._receive_events, daemon=True)
+        self.thread.start()
+
+    def request(self, *request):
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.conn is None:
+                        self.conn = Client(self.address, authkey=self.authkey)
+                    self.conn.send(request)
+                    ok, result = self.conn.recv()
+                    break
+                except (EOFError, OSError):
+                    self.conn = None  # Server restarted; reconnect once
+                    if attempt:
+                        raise
+        if not ok:
+            raise RuntimeError(result)
+        return result
+
+    def get(self, camera_id=None):
+        return self.cameras.get(camera_id or self.default_id)
+
+    def ids(self):
+        return list(self.cameras)
+
+    def registering(self, exclude=None):
+        return self.request("registering", exclude)
+
+    def training_status(self):
+        return self.request("training")
+
+    def get_metrics(self):
+        """Metrics of the camera server process itself (training, attendance queue)."""
+        return self.request("metrics")
+
+    def _receive_events(self):
+        while True:
+            try:
+                with Client(self.address, authkey=self.authkey) as conn:
+                    conn.send(("subscribe",))
+                    events.attendance_events.invalidate()  # Anything missed while disconnected
+                    while True:
+                        message = conn.recv()
+                        if message[0] == "attendance":
+                            events.attendance_events.publish(message[1])
+                        elif message[0] == "resync":
+                            events.attendance_events.invalidate()
+            except (EOFError, OSError):
+                time.sleep(RECONNECT_SECONDS)
+
+if __name__ == "__main__":
+    address = ADDRESS
+    if "--listen" in sys.argv:
+        address = sys.argv[sys.argv.index("--listen") + 1]
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))  # Close cameras and segments
+    host = parse_address(address)[0]
+    if not is_loopback(host) and not os.environ.get("CAMERA_SERVER_KEY"):
+        print(f"[ERROR] Set CAMERA_SERVER_KEY to listen on {host}: connections to it are not limited to this machine.")
+        sys.exit(1)
+    database.init_db()
+    registry = camera_registry.CameraRegistry()
+    try:
+        CameraServer(registry, address).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        registry.close()
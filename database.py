@@ -1,12 +1,190 @@
 import sqlite3
+import os
+import sys
 import datetime
+import heapq
+import pathlib
+import stat
+import threading
+from collections import OrderedDict
 
-DB_NAME = "attendance.db"
+DB_NAME = os.environ.get("FACE_DB", "attendance.db")
+PAGE_SIZE = 50
+# Months of attendance kept in DB_NAME (the current one and the one before);
+# older months are moved to read-only files, one per month (see archive_month)
+HOT_MONTHS = 2
+MAX_ATTACHED = 8  # Archives attached to one connection at a time (SQLite allows 10)
+VACUUM_FREE_FRACTION = 0.25  # Vacuum after archiving once this much of the main file is free pages
 
+# One connection per thread, reused by every query the thread makes. Long-lived
+# threads (the camera thread, the attendance writer) keep theirs open; the web
+# app's request threads are short-lived, so app.py closes theirs at the end of
+# each request with close_connection().
+_local = threading.local()
 
+def get_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.db_name != DB_NAME:
+        conn = sqlite3.connect(DB_NAME, timeout=10, uri=True)  # uri: archives are attached read-only
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous = NORMAL")  # Safe with WAL, far fewer fsyncs
+        _local.conn = conn
+        _local.db_name = DB_NAME
+        _local.attached = OrderedDict()  # schema name -> archived_at of the attached file
+    return conn
+
+def close_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+# Rebuilds daily_summary rows from the closed sessions in daily_attendance
+SUMMARY_BACKFILL = """
+    INSERT OR REPLACE INTO daily_summary (date, user_id, name, sessions, total_seconds, first_in, last_out)
+    SELECT date, user_id, MAX(name), COUNT(*),
+           SUM(MAX(0, strftime('%s', time_out) - strftime('%s', time_in))), MIN(time_in), MAX(time_out)
+    FROM daily_attendance WHERE time_out IS NOT NULL {where} GROUP BY date, user_id
+"""
+# Rebuilds monthly_summary rows from daily_summary
+MONTHLY_BACKFILL = """
+    INSERT OR REPLACE INTO monthly_summary (month, user_id, name, days, sessions, total_seconds)
+    SELECT substr(date, 1, 7), user_id, MAX(name), COUNT(*), SUM(sessions), SUM(total_seconds)
+    FROM daily_summary {where} GROUP BY substr(date, 1, 7), user_id
+"""
+
+# Tables of a monthly archive file
+ARCHIVE_SCHEMA = [
+    """CREATE TABLE daily_attendance (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER,
+        name TEXT,
+        date TEXT,
+        time_in TEXT,
+        time_out TEXT,
+        last_updated TIMESTAMP,
+        camera_in TEXT,
+        camera_out TEXT
+    )""",
+    """CREATE TABLE daily_summary (
+        date TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        name TEXT,
+        sessions INTEGER NOT NULL,
+        total_seconds INTEGER NOT NULL,
+        first_in TEXT,
+        last_out TEXT,
+        PRIMARY KEY (date, user_id)
+    ) WITHOUT ROWID""",
+]
+ARCHIVE_INDEXES = [
+    "CREATE INDEX idx_daily_user_date ON daily_attendance (user_id, date, time_in)",
+    "CREATE INDEX idx_daily_date_time ON daily_attendance (date, time_in)",
+]
+ATTENDANCE_COLUMNS = "id, user_id, name, date, time_in, time_out, last_updated, camera_in, camera_out"
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Each entry is a list of statements, run in one transaction together with
+# its user_version bump; PRAGMAs (journal_mode cannot change inside a
+# transaction) run after it commits.
+MIGRATIONS = [
+    # 1: indexes for per-user history, today's sessions and the global log feed, plus WAL
+    [
+        "CREATE INDEX IF NOT EXISTS idx_daily_user_date ON daily_attendance (user_id, date, time_in)",
+        "CREATE INDEX IF NOT EXISTS idx_daily_date_time ON daily_attendance (date, time_in)",
+        "PRAGMA journal_mode = WAL",
+    ],
+    # 2: which camera recorded each time-in and time-out
+    [
+        "ALTER TABLE daily_attendance ADD COLUMN camera_in TEXT",
+        "ALTER TABLE daily_attendance ADD COLUMN camera_out TEXT",
+    ],
+    # 3: small key/value table; users_version is bumped with every change to users (see users.py)
+    [
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('users_version', 1)",
+    ],
+    # 4: per user and day (and month) totals of closed sessions, kept up to date as sessions close
+    [
+        """CREATE TABLE IF NOT EXISTS daily_summary (
+            date TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            name TEXT,
+            sessions INTEGER NOT NULL,
+            total_seconds INTEGER NOT NULL,
+            first_in TEXT,
+            last_out TEXT,
+            PRIMARY KEY (date, user_id)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_summary_user_date ON daily_summary (user_id, date)",
+        SUMMARY_BACKFILL.format(where=""),
+        """CREATE TABLE IF NOT EXISTS monthly_summary (
+            month TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            name TEXT,
+            days INTEGER NOT NULL,
+            sessions INTEGER NOT NULL,
+            total_seconds INTEGER NOT NULL,
+            PRIMARY KEY (month, user_id)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_monthly_user_month ON monthly_summary (user_id, month)",
+        MONTHLY_BACKFILL.format(where=""),
+    ],
+    # 5: catalog of monthly archive files and how many sessions each user has in them;
+    # the legacy attendance table (one row per sighting) becomes one session per user and day
+    [
+        """CREATE TABLE IF NOT EXISTS archives (
+            month TEXT PRIMARY KEY,
+            sessions INTEGER NOT NULL,
+            archived_at TEXT NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS archive_counts (
+            month TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            sessions INTEGER NOT NULL,
+            PRIMARY KEY (user_id, month)
+        ) WITHOUT ROWID""",
+        # Older databases have it; create it empty elsewhere so the statements below run everywhere
+        """CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            name TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            date TEXT
+        )""",
+        """INSERT INTO daily_attendance (user_id, name, date, time_in, time_out, last_updated)
+           SELECT user_id, MAX(name), date, MIN(time(timestamp)),
+                  CASE WHEN COUNT(*) > 1 THEN MAX(time(timestamp)) END, MAX(timestamp)
+           FROM attendance a
+           WHERE NOT EXISTS (SELECT 1 FROM daily_attendance d WHERE d.user_id = a.user_id AND d.date = a.date)
+           GROUP BY user_id, date""",
+        SUMMARY_BACKFILL.format(where="AND (user_id, date) IN (SELECT user_id, date FROM attendance)"),
+        MONTHLY_BACKFILL.format(where="WHERE (user_id, substr(date, 1, 7)) IN (SELECT user_id, substr(date, 1, 7) FROM attendance)"),
+        "DROP TABLE attendance",
+    ],
+]
+
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        # Explicit BEGIN: sqlite3 only opens a transaction by itself before DML, not DDL
+        conn.execute("BEGIN")
+        try:
+            for sql in statements:
+                if not sql.startswith("PRAGMA"):
+                    conn.execute(sql)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        for sql in statements:
+            if sql.startswith("PRAGMA"):
+                conn.execute(sql)
+        print(f"Database migrated to schema version {number}.")
 
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Table for Users
@@ -32,33 +210,54 @@ def init_db():
         )
     ''')
     
-    # Keep old table for backward compatibility if needed, or we can ignore it.
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS attendance (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            name TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            date TEXT
-        )
-    ''')
-    
     conn.commit()
-    conn.close()
+    migrate(conn)
 
 def add_user(user_id, name):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    conn = get_connection()
     try:
-        cursor.execute("INSERT OR REPLACE INTO users (id, name) VALUES (?, ?)", (user_id, name))
-        conn.commit()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO users (id, name) VALUES (?, ?)", (user_id, name))
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'users_version'")
     except Exception as e:
         print(f"Error adding user: {e}")
-    finally:
-        conn.close()
+
+def import_users(users):
+    """Add users from {id: name} that the table does not have yet (a one-time
+    import of names.json). Returns how many were added."""
+    conn = get_connection()
+    with conn:
+        added = 0
+        for user_id, name in users.items():
+            added += conn.execute("INSERT OR IGNORE INTO users (id, name) VALUES (?, ?)", (user_id, name)).rowcount
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('names_imported', 1)")
+        if added:
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'users_version'")
+    return added
+
+def get_meta(key, default=0):
+    try:
+        row = get_connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    except sqlite3.OperationalError:
+        return default  # Database not migrated yet
+    return row[0] if row else default
+
+def users_version():
+    return get_meta("users_version")
+
+def parse_timestamp(value, default=None):
+    # Parse last_updated to check cooldown (e.g. 1 minute)
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S.%f")
+    except (TypeError, ValueError):
+        # Fallback formats if milliseconds are missing
+        try:
+            return datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+        except (TypeError, ValueError):
+            return default # Should not happen usually
 
 def mark_attendance(user_id, name):
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     
     now = datetime.datetime.now()
@@ -77,29 +276,18 @@ def mark_attendance(user_id, name):
                        (user_id, name, date_str, time_str, now))
         conn.commit()
         status_message = f"Time In: {time_str}"
-        conn.close()
         return status_message
     else:
         # Record exists. Check if we should mark Time OUT.
         # record structure: id, user_id, name, date, time_in, time_out, last_updated
         # indices: 0, 1, 2, 3, 4, 5, 6
         
-        last_updated_str = record[6]
-        # Parse last_updated to check cooldown (e.g. 1 minute)
-        try:
-            last_updated = datetime.datetime.strptime(last_updated_str, "%Y-%m-%d %H:%M:%S.%f")
-        except ValueError:
-             # Fallback formats if milliseconds are missing
-            try:
-                last_updated = datetime.datetime.strptime(last_updated_str, "%Y-%m-%d %H:%M:%S")
-            except:
-                last_updated = now # Should not happen usually
+        last_updated = parse_timestamp(record[6], now)
 
         diff = (now - last_updated).total_seconds()
         
 
         if diff < 60: # 1 Minute Cooldown
-            conn.close()
             return None # Too soon to toggle
             
         # If cooldown passed:
@@ -116,51 +304,436 @@ def mark_attendance(user_id, name):
             # Still checked in, so Check Out
             cursor.execute("UPDATE daily_attendance SET time_out = ?, last_updated = ? WHERE id = ?", 
                            (time_str, now, record[0]))
+            close_session(cursor, user_id, name, date_str, record[4], time_str)
             conn.commit()
             status_message = f"Time Out: {time_str}"
             
-        conn.close()
         return status_message
 
-def get_attendance_logs():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT name, date, time_in, time_out FROM daily_attendance ORDER BY date DESC, time_in DESC LIMIT 50")
-    logs = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return logs
+def get_latest_sessions(date_str):
+    """Return the latest session of every user on a date as
+    {user_id: (time_out, last_updated)}."""
+    sql = """
+        SELECT user_id, time_out, last_updated FROM {schema}.daily_attendance
+        WHERE id IN (SELECT MAX(id) FROM {schema}.daily_attendance WHERE date = ? GROUP BY user_id)
+    """
+    conn = get_connection()
+    try:
+        latest = {}
+        for month in archived_months(date_str[:7], date_str[:7]):
+            latest.update((row[0], (row[1], row[2])) for row in conn.execute(sql.format(schema=attach_archive(month)), (date_str,)))
+        # Rows still in the main database are newer (ids only grow)
+        latest.update((row[0], (row[1], row[2])) for row in conn.execute(sql.format(schema="main"), (date_str,)))
+        return latest
+    except sqlite3.OperationalError:
+        return {}
 
-def get_user_attendance(user_id):
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+def session_seconds(time_in, time_out):
+    start = datetime.datetime.strptime(time_in, "%H:%M:%S")
+    end = datetime.datetime.strptime(time_out, "%H:%M:%S")
+    return max(0, int((end - start).total_seconds()))
+
+def close_session(cursor, user_id, name, date_str, time_in, time_out):
+    """Add a session that just closed to its user's daily_summary and
+    monthly_summary rows, in the caller's transaction."""
+    seconds = session_seconds(time_in, time_out)
+    cursor.execute("""
+        INSERT INTO daily_summary (date, user_id, name, sessions, total_seconds, first_in, last_out)
+        VALUES (?, ?, ?, 1, ?, ?, ?)
+        ON CONFLICT (date, user_id) DO UPDATE SET
+            name = excluded.name,
+            sessions = sessions + 1,
+            total_seconds = total_seconds + excluded.total_seconds,
+            first_in = MIN(first_in, excluded.first_in),
+            last_out = MAX(last_out, excluded.last_out)
+    """, (date_str, user_id, name, seconds, time_in, time_out))
+    sessions = cursor.execute("SELECT sessions FROM daily_summary WHERE date = ? AND user_id = ?",
+                              (date_str, user_id)).fetchone()[0]
     cursor.execute("""
-        SELECT date, time_in, time_out 
-        FROM daily_attendance 
-        WHERE user_id = ? 
-        ORDER BY date DESC, time_in DESC
-    """, (user_id,))
-    logs = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+        INSERT INTO monthly_summary (month, user_id, name, days, sessions, total_seconds)
+        VALUES (?, ?, ?, 1, 1, ?)
+        ON CONFLICT (month, user_id) DO UPDATE SET
+            name = excluded.name,
+            days = days + ?,
+            sessions = sessions + 1,
+            total_seconds = total_seconds + excluded.total_seconds
+    """, (date_str[:7], user_id, name, seconds, int(sessions == 1)))
+
+def rebuild_summary(cursor, user_id, date_str):
+    """Recount a user's day from daily_attendance and apply the difference to
+    the month, whose other days may already be archived."""
+    day = "SELECT sessions, total_seconds FROM daily_summary WHERE date = ? AND user_id = ?"
+    old = cursor.execute(day, (date_str, user_id)).fetchone() or (0, 0)
+    cursor.execute("DELETE FROM daily_summary WHERE date = ? AND user_id = ?", (date_str, user_id))
+    cursor.execute(SUMMARY_BACKFILL.format(where="AND user_id = ? AND date = ?"), (user_id, date_str))
+    new = cursor.execute(day, (date_str, user_id)).fetchone() or (0, 0)
+    name = cursor.execute("SELECT MAX(name) FROM daily_attendance WHERE user_id = ? AND date = ?", (user_id, date_str)).fetchone()[0]
+    cursor.execute("""
+        INSERT INTO monthly_summary (month, user_id, name, days, sessions, total_seconds)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (month, user_id) DO UPDATE SET
+            days = days + excluded.days,
+            sessions = sessions + excluded.sessions,
+            total_seconds = total_seconds + excluded.total_seconds
+    """, (date_str[:7], user_id, name, int(new[0] > 0) - int(old[0] > 0), new[0] - old[0], new[1] - old[1]))
+    cursor.execute("DELETE FROM monthly_summary WHERE month = ? AND user_id = ? AND days <= 0", (date_str[:7], user_id))
+
+def write_attendance_events(events):
+    """Apply queued attendance transitions in one transaction.
+
+    Each event is ("in", user_id, name, date, time, now, camera_id) or
+    ("out", user_id, name, date, time, now, camera_id); "out" closes the
+    user's latest session of that date (and is reported and skipped if that
+    date has no session in the main database). Returns the affected rows as log
+    dicts (with their "cursor" and the event's "camera_id"), in event order.
+    """
+    conn = get_connection()
+    rows = []
+    with conn:
+        cursor = conn.cursor()
+        for kind, user_id, name, date_str, time_str, now, camera_id in events:
+            if kind == "in":
+                cursor.execute("INSERT INTO daily_attendance (user_id, name, date, time_in, last_updated, camera_in) VALUES (?, ?, ?, ?, ?, ?)",
+                               (user_id, name, date_str, time_str, now, camera_id))
+                row_id = cursor.lastrowid
+            else:
+                latest = cursor.execute("SELECT id, time_in, time_out FROM daily_attendance WHERE user_id = ? AND date = ? ORDER BY id DESC LIMIT 1",
+                                        (user_id, date_str)).fetchone()
+                if latest is None:
+                    # Nothing to close here: the session is in a (read-only) monthly archive, or was never recorded
+                    where = f"it is archived in {archive_path(date_str[:7])}" if archived_months(date_str[:7], date_str[:7], user_id) \
+                        else "there is no session to close"
+                    print(f"[WARN] Time-out of {name} (ID {user_id}) on {date_str} at {time_str} not recorded: {where}.")
+                    continue
+                row_id = latest[0]
+                cursor.execute("UPDATE daily_attendance SET time_out = ?, last_updated = ?, camera_out = ? WHERE id = ?",
+                               (time_str, now, camera_id, row_id))
+                if latest[2] is None:
+                    close_session(cursor, user_id, name, date_str, latest[1], time_str)
+                else:
+                    rebuild_summary(cursor, user_id, date_str)  # Session was already closed; recount the day
+            row = cursor.execute("SELECT id, user_id, name, date, time_in, time_out, camera_in, camera_out FROM daily_attendance WHERE id = ?",
+                                 (row_id,)).fetchone()
+            log = dict(row)
+            log["cursor"] = make_cursor(row)
+            log["camera_id"] = camera_id
+            del log["id"]
+            rows.append(log)
+    return rows
+
+def get_day_sessions(user_id, date_str):
+    """A user's sessions on a date, oldest first, as dicts with time_in,
+    time_out, camera_in, camera_out and archived (True for rows in a
+    monthly archive, which can no longer be changed)."""
+    sql = ("SELECT time_in, time_out, camera_in, camera_out FROM {schema}.daily_attendance "
+           "WHERE user_id = ? AND date = ? ORDER BY time_in, id")
+    conn = get_connection()
+    sessions = []
+    for month in archived_months(date_str[:7], date_str[:7], user_id):
+        sessions += [dict(row, archived=True) for row in conn.execute(sql.format(schema=attach_archive(month)), (user_id, date_str))]
+    sessions += [dict(row, archived=False) for row in conn.execute(sql.format(schema="main"), (user_id, date_str))]
+    return sessions
+
+def replace_day_sessions(user_id, name, date_str, sessions):
+    """Replace a user's sessions on a date in the main database, in one
+    transaction, and recount the day. sessions are (time_in, time_out,
+    camera_in, camera_out, last_updated) in time order; time_out may be None
+    for the last one. Rows get new ids in that order, so the latest session
+    of the day is still the one with the highest id."""
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM daily_attendance WHERE user_id = ? AND date = ?", (user_id, date_str))
+        cursor.executemany("INSERT INTO daily_attendance (user_id, name, date, time_in, time_out, last_updated, camera_in, camera_out) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           [(user_id, name, date_str, time_in, time_out, last_updated, camera_in, camera_out)
+                            for time_in, time_out, camera_in, camera_out, last_updated in sessions])
+        rebuild_summary(cursor, user_id, date_str)
+
+def make_cursor(row):
+    # Opaque keyset cursor: the sort key of a row plus its id as a tie-breaker
+    return f"{row['date']}|{row['time_in']}|{row['id']}"
+
+def parse_cursor(cursor):
+    """(date, time, id) of a cursor from make_cursor(), or None if it is not one."""
+    try:
+        date_str, time_str, row_id = cursor.split("|")
+        datetime.date.fromisoformat(date_str)
+        return date_str, time_str, int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+def row_key(row):
+    return (row["date"], row["time_in"] or "", row["id"])
+
+def _page(where, params, limit, before, columns, user_id=None):
+    """Newest-first page of daily_attendance rows, continuing after a cursor.
+
+    Reads the main database and then the archived months newest first (only
+    those where user_id has sessions, if given), stopping as soon as they
+    have filled a page: every row of an older archive sorts after those.
+    Raises ValueError for a cursor that make_cursor() did not produce.
+    """
+    key = parse_cursor(before) if before else None
+    if before and key is None:
+        raise ValueError(f"Invalid cursor: {before}")
+    if key:
+        where = where + ["(date, time_in, id) < (?, ?, ?)"]
+        params = list(params) + list(key)
+    sql = f"SELECT id, {columns} FROM {{schema}}.daily_attendance"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY date DESC, time_in DESC, id DESC LIMIT ?"
+    conn = get_connection()
+    try:
+        rows = conn.execute(sql.format(schema="main"), list(params) + [limit]).fetchall()
+        archived = []
+        for month in reversed(archived_months(None, key[0][:7] if key else None, user_id)):
+            archived += conn.execute(sql.format(schema=attach_archive(month)),
+                                     list(params) + [limit - len(archived)]).fetchall()
+            if len(archived) >= limit:
+                break
+    except sqlite3.OperationalError:
+        return []
+    rows = sorted(rows + archived, key=row_key, reverse=True)[:limit]
+    logs = []
+    for row in rows:
+        log = dict(row)
+        log["cursor"] = make_cursor(row)
+        del log["id"]
+        logs.append(log)
     return logs
 
+def get_attendance_logs(limit=PAGE_SIZE, before=None):
+    """Latest sessions of all users. Pass the last row's "cursor" as before
+    to fetch the next (older) page."""
+    return _page([], [], limit, before, "name, date, time_in, time_out, camera_in, camera_out")
+
+def get_user_attendance(user_id, limit=PAGE_SIZE, before=None):
+    return _page(["user_id = ?"], [user_id], limit, before, "date, time_in, time_out, camera_in, camera_out", user_id)
+
+def count_user_sessions(user_id):
+    conn = get_connection()
+    row = conn.execute("SELECT COUNT(*) FROM daily_attendance WHERE user_id = ?", (user_id,)).fetchone()
+    archived = conn.execute("SELECT SUM(sessions) FROM archive_counts WHERE user_id = ?", (user_id,)).fetchone()
+    return row[0] + (archived[0] or 0)
+
+def get_daily_summary(start, end, user_id=None):
+    """Yield {date, user_id, name, sessions, total_seconds, first_in, last_out}
+    for every user-day from start to end (inclusive ISO dates) with a closed
+    session, ordered by date. Rows are read one at a time."""
+    sql = "SELECT date, user_id, name, sessions, total_seconds, first_in, last_out FROM {schema}.daily_summary WHERE date BETWEEN ? AND ?"
+    params = [start, end]
+    if user_id is not None:
+        sql += " AND user_id = ?"
+        params.append(user_id)
+    sql += " ORDER BY date, user_id"
+    conn = get_connection()
+
+    def archived():
+        # One archive at a time, so each statement is done before the next file is attached
+        for month in archived_months(start[:7], end[:7], user_id):
+            yield from conn.execute(sql.format(schema=attach_archive(month)), params)
+
+    # SQLite cannot detach an archive while any statement on the connection
+    # is still running, so the main database is read through its own
+    recent = sqlite3.connect(DB_NAME, timeout=10, uri=True)
+    recent.row_factory = sqlite3.Row
+    try:
+        yield from _merge_days(heapq.merge(recent.execute(sql.format(schema="main"), params), archived(),
+                                           key=lambda r: (r["date"], r["user_id"])))
+    finally:
+        recent.close()
+
+def _merge_days(rows):
+    # Combine consecutive rows of the same user-day
+    last = None
+    for row in rows:
+        row = dict(row)
+        if last is not None and (last["date"], last["user_id"]) == (row["date"], row["user_id"]):
+            # Sessions of an archived day recorded late (e.g. by batch mode) and not archived yet
+            last["sessions"] += row["sessions"]
+            last["total_seconds"] += row["total_seconds"]
+            last["first_in"] = min(last["first_in"], row["first_in"])
+            last["last_out"] = max(last["last_out"], row["last_out"])
+            continue
+        if last is not None:
+            yield last
+        last = row
+    if last is not None:
+        yield last
+
+def get_monthly_summary(start, end, user_id=None):
+    """Yield {month, user_id, name, days, sessions, total_seconds} per user
+    and month for months start to end ("YYYY-MM", inclusive)."""
+    sql = "SELECT month, user_id, name, days, sessions, total_seconds FROM monthly_summary WHERE month BETWEEN ? AND ?"
+    params = [start, end]
+    if user_id is not None:
+        sql += " AND user_id = ?"
+        params.append(user_id)
+    for row in get_connection().execute(sql + " ORDER BY month, user_id", params):
+        yield dict(row)
+
+# Monthly archives
+
+def archive_dir():
+    return os.path.splitext(DB_NAME)[0] + "_archive"
+
+def archive_path(month):
+    return os.path.join(archive_dir(), f"{month}.db")
+
+def month_range(month):
+    # Dates are ISO strings, so a month is one range of the date indexes
+    return month + "-01", month + "-31"
+
+def archived_months(first=None, last=None, user_id=None):
+    """Archived months from first to last ("YYYY-MM", inclusive, None for
+    open-ended) in ascending order; only those where user_id has sessions, if given."""
+    sql = "SELECT month FROM archives WHERE month BETWEEN ? AND ?"
+    params = [first or "", last or "9999-99"]
+    if user_id is not None:
+        sql = "SELECT month FROM archive_counts WHERE user_id = ? AND month BETWEEN ? AND ?"
+        params.insert(0, user_id)
+    try:
+        return [row[0] for row in get_connection().execute(sql + " ORDER BY month", params)]
+    except sqlite3.OperationalError:
+        return []  # Database not migrated yet
+
+def attach_archive(month):
+    """Attach a month's archive read-only to this thread's connection (if it
+    is not already) and return its schema name. The least recently used
+    archive is detached once MAX_ATTACHED are attached."""
+    conn = get_connection()
+    attached = _local.attached
+    schema = "m" + month.replace("-", "_")
+    archived_at = conn.execute("SELECT archived_at FROM archives WHERE month = ?", (month,)).fetchone()[0]
+    if attached.get(schema) == archived_at:
+        attached.move_to_end(schema)
+        return schema
+    if schema in attached:
+        del attached[schema]  # Rewritten since it was attached
+        conn.execute(f"DETACH DATABASE {schema}")
+    while len(attached) >= MAX_ATTACHED:
+        old, _ = attached.popitem(last=False)
+        conn.execute(f"DETACH DATABASE {old}")
+    uri = pathlib.Path(os.path.abspath(archive_path(month))).as_uri() + "?mode=ro"
+    conn.execute(f"ATTACH DATABASE ? AS {schema}", (uri,))
+    attached[schema] = archived_at
+    return schema
+
+def _detach_all(conn):
+    for schema in list(_local.attached):
+        conn.execute(f"DETACH DATABASE {schema}")
+    _local.attached.clear()
+
+def archive_month(month):
+    """Move one month's sessions and daily totals out of the main database
+    into archive_path(month), a compact file that is only read from then on.
+
+    Sessions of the month that are already archived (e.g. a recording
+    processed later by batch mode) are merged into the existing file. The
+    file is replaced before the rows leave the main database, so a crash in
+    between leaves the rows in both; the next run merges them again by id.
+    Returns the number of sessions moved.
+    """
+    conn = get_connection()
+    first, last = month_range(month)
+    _detach_all(conn)  # Cannot detach inside the transaction below, nor replace an attached file on Windows
+    os.makedirs(archive_dir(), exist_ok=True)
+    path = archive_path(month)
+    tmp_file = path + ".tmp"
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+    conn.execute("BEGIN IMMEDIATE")  # Keep writers (and other archivers) out until the rows are moved
+    try:
+        rows = conn.execute(f"SELECT {ATTENDANCE_COLUMNS} FROM daily_attendance WHERE date BETWEEN ? AND ? ORDER BY id",
+                            (first, last)).fetchall()
+        if not rows:
+            conn.rollback()
+            return 0
+        out = sqlite3.connect(tmp_file)
+        try:
+            for sql in ARCHIVE_SCHEMA:
+                out.execute(sql)
+            if os.path.exists(path):
+                out.execute("ATTACH DATABASE ? AS old", (path,))
+                out.execute(f"INSERT INTO daily_attendance SELECT {ATTENDANCE_COLUMNS} FROM old.daily_attendance")
+                out.commit()
+                out.execute("DETACH DATABASE old")
+            out.executemany(f"INSERT OR IGNORE INTO daily_attendance ({ATTENDANCE_COLUMNS}) VALUES ({', '.join('?' * 9)})",
+                            [tuple(row) for row in rows])
+            out.execute(SUMMARY_BACKFILL.format(where=""))
+            for sql in ARCHIVE_INDEXES:
+                out.execute(sql)
+            out.commit()
+            counts = out.execute("SELECT user_id, COUNT(*) FROM daily_attendance GROUP BY user_id").fetchall()
+            monthly = out.execute("SELECT user_id, MAX(name), COUNT(*), SUM(sessions), SUM(total_seconds) "
+                                  "FROM daily_summary GROUP BY user_id").fetchall()
+            out.execute("VACUUM")
+        finally:
+            out.close()
+        os.chmod(tmp_file, stat.S_IREAD)
+        if os.path.exists(path):
+            os.chmod(path, stat.S_IREAD | stat.S_IWRITE)  # Windows refuses to replace read-only files
+        os.replace(tmp_file, path)
+
+        conn.execute("DELETE FROM daily_attendance WHERE date BETWEEN ? AND ?", (first, last))
+        conn.execute("DELETE FROM daily_summary WHERE date BETWEEN ? AND ?", (first, last))
+        # The archive's totals are exact, so they also correct any late sessions counted twice
+        conn.executemany("INSERT OR REPLACE INTO monthly_summary (month, user_id, name, days, sessions, total_seconds) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", [(month,) + tuple(row) for row in monthly])
+        conn.execute("DELETE FROM archive_counts WHERE month = ?", (month,))
+        conn.executemany("INSERT INTO archive_counts (month, user_id, sessions) VALUES (?, ?, ?)",
+                         [(month,) + tuple(row) for row in counts])
+        conn.execute("INSERT OR REPLACE INTO archives (month, sessions, archived_at) VALUES (?, ?, ?)",
+                     (month, sum(row[1] for row in counts), datetime.datetime.now().isoformat(timespec="microseconds")))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return len(rows)
+
+def archive_closed_months(today=None, hot_months=HOT_MONTHS):
+    """Archive every month before the last hot_months (see archive_month)
+    and vacuum the main database if that freed much of it. Returns
+    {month: sessions moved}."""
+    today = today or datetime.date.today()
+    year, month = today.year, today.month - (hot_months - 1)
+    while month < 1:
+        year, month = year - 1, month + 12
+    cutoff = f"{year:04d}-{month:02d}-01"
+    conn = get_connection()
+    months = [row[0] for row in conn.execute(
+        "SELECT DISTINCT substr(date, 1, 7) FROM daily_attendance WHERE date < ? ORDER BY 1", (cutoff,))]
+    moved = {}
+    for month in months:
+        moved[month] = archive_month(month)
+        print(f"[INFO] Archived {moved[month]} sessions of {month} to {archive_path(month)}.")
+    if moved:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free > VACUUM_FREE_FRACTION * conn.execute("PRAGMA page_count").fetchone()[0]:
+            try:
+                conn.execute("VACUUM")
+            except sqlite3.OperationalError as e:
+                print(f"[WARN] Could not vacuum {DB_NAME}: {e}")
+    return moved
+
 def get_all_users():
     """Return a dict of all users in the DB as {id: name}.
-    This is used as a fallback when names.json is missing.
+    Read through users.get_directory(), which caches it.
     """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    conn = get_connection()
     try:
-        cursor.execute("SELECT id, name FROM users")
-        rows = cursor.fetchall()
+        rows = conn.execute("SELECT id, name FROM users").fetchall()
         return {row[0]: row[1] for row in rows}
     except Exception as e:
         print(f"Error fetching users: {e}")
         return {}
-    finally:
-        conn.close()
 
 if __name__ == "__main__":
     init_db()
-    print("Database initialized.")
+    if "--archive" in sys.argv:
+        moved = archive_closed_months()
+        print(f"[INFO] {sum(moved.values())} sessions archived from {len(moved)} months.")
+    else:
+        print("Database initialized.")
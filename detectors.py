@@ -0,0 +1,272 @@
+"""Face detector backends shared by the web app, the desktop app and batch mode.
+
+    python detectors.py --list
+    python detectors.py --calibrate [--frames DIR] [--recall 0.95] [--output detector.json]
+
+Backends: "haar" (OpenCV's default frontal face cascade), "haar_alt2",
+"lbp" (OpenCV's LBP frontal face cascade, several times faster than Haar)
+and "dnn" (OpenCV's ResNet-10 SSD face model run with cv2.dnn). The LBP
+cascade and the DNN model are not part of the opencv-python wheels; put
+their files in models/ to enable them (see MODEL_FILES).
+
+The backend and its parameters come from detector.json, which --calibrate
+writes after timing every available backend on labelled frames on this
+machine. Face sizes are fractions of the shorter side of the image, so one
+setting works at any resolution and detect_scale.
+"""
+import cv2
+import itertools
+import json
+import os
+import sys
+import time
+import tracker
+
+CONFIG_FILE = os.environ.get("DETECTOR_CONFIG", "detector.json")
+MODELS_DIR = "models"
+LABELS_FILE = "labels.json"  # {"image.jpg": [[x, y, w, h], ...]} in a directory of calibration frames
+
+DEFAULTS = {
+    "backend": "haar",
+    "scale_factor": 1.3,   # Cascades: step between detection scales
+    "min_neighbors": 5,    # Cascades: overlapping hits needed to keep a face
+    "confidence": 0.6,     # DNN: minimum face score
+    "min_size": 0.1,       # Smallest face, as a fraction of the image's shorter side
+    "max_size": 0,         # Largest face, likewise; 0 for no limit
+}
+
+MODEL_FILES = {
+    "haar": ["haarcascade_frontalface_default.xml"],
+    "haar_alt2": ["haarcascade_frontalface_alt2.xml"],
+    "lbp": ["lbpcascade_frontalface_improved.xml"],
+    "dnn": ["deploy.prototxt", "res10_300x300_ssd_iter_140000.caffemodel"],
+}
+DNN_SIZE = (300, 300)
+DNN_MEAN = (104.0, 177.0, 123.0)
+
+# Calibration
+TARGET_RECALL = 0.95
+MATCH_IOU = 0.3        # Overlap a detection needs with a labelled face to count as found
+CALIBRATION_REPEATS = 5  # Timing runs for the shortlist; every combination is screened with one
+SHORTLIST = 5
+SYNTHETIC_FRAMES = [(640, 480, 1), (640, 480, 3), (1280, 720, 2), (1920, 1080, 4)]
+SYNTHETIC_FRAMES_EACH = 5
+GRID = {
+    "cascade": {"scale_factor": [1.1, 1.2, 1.3], "min_neighbors": [3, 4, 5, 6],
+                "min_size": [0.05, 0.1, 0.15], "max_size": [0, 0.8]},
+    "dnn": {"confidence": [0.4, 0.6, 0.8], "min_size": [0.05, 0.1, 0.15], "max_size": [0]},
+}
+
+def model_path(name):
+    """Where a model file is found: models/, then OpenCV's data directories, else None."""
+    haar_dir = cv2.data.haarcascades
+    for directory in (MODELS_DIR, haar_dir, os.path.join(haar_dir, os.pardir, "lbpcascades")):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return os.path.normpath(path)
+    return None
+
+def available_backends():
+    return [name for name, files in MODEL_FILES.items() if all(model_path(f) for f in files)]
+
+def size_limits(shape, min_size, max_size):
+    side = min(shape[:2])
+    smallest = max(1, int(side * min_size))
+    largest = int(side * max_size) if max_size else 0
+    return smallest, largest
+
+class CascadeDetector:
+    def __init__(self, path, scale_factor=DEFAULTS["scale_factor"], min_neighbors=DEFAULTS["min_neighbors"],
+                 min_size=DEFAULTS["min_size"], max_size=DEFAULTS["max_size"]):
+        self.cascade = cv2.CascadeClassifier(path)
+        if self.cascade.empty():
+            raise ValueError(f"Could not load cascade {path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def detect(self, gray):
+        """(x, y, w, h) boxes of the faces in a grayscale image."""
+        smallest, largest = size_limits(gray.shape, self.min_size, self.max_size)
+        kwargs = {"minSize": (smallest, smallest)}
+        if largest:
+            kwargs["maxSize"] = (largest, largest)
+        return [tuple(int(v) for v in box) for box in
+                self.cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors, **kwargs)]
+
+class DnnDetector:
+    def __init__(self, config_path, weights_path, confidence=DEFAULTS["confidence"],
+                 min_size=DEFAULTS["min_size"], max_size=DEFAULTS["max_size"]):
+        self.net = cv2.dnn.readNet(weights_path, config_path)
+        self.confidence = confidence
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def detect(self, gray):
+        height, width = gray.shape[:2]
+        image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR) if gray.ndim == 2 else gray
+        self.net.setInput(cv2.dnn.blobFromImage(cv2.resize(image, DNN_SIZE), 1.0, DNN_SIZE, DNN_MEAN))
+        found = self.net.forward().reshape(-1, 7)  # [image, class, score, x0, y0, x1, y1], corners in 0..1
+        smallest, largest = size_limits(gray.shape, self.min_size, self.max_size)
+        boxes = []
+        for score, x0, y0, x1, y1 in found[:, 2:7]:
+            if score < self.confidence:
+                continue
+            x0, y0 = max(0, int(x0 * width)), max(0, int(y0 * height))
+            x1, y1 = min(width, int(x1 * width)), min(height, int(y1 * height))
+            size = min(x1 - x0, y1 - y0)
+            if size >= smallest and (not largest or size <= largest):
+                boxes.append((x0, y0, x1 - x0, y1 - y0))
+        return boxes
+
+def load_config(path=None):
+    """DEFAULTS updated with the settings saved in path (CONFIG_FILE)."""
+    params = dict(DEFAULTS)
+    path = path or CONFIG_FILE
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            params.update({k: v for k, v in json.load(f).items() if k in DEFAULTS})
+    return params
+
+def create_detector(overrides=None):
+    """The configured detector. overrides is a backend name or a dict of
+    parameters (e.g. the "detector" key of a camera in cameras.json).
+    Falls back to Haar if the backend's model files are missing."""
+    params = load_config()
+    if isinstance(overrides, str):
+        overrides = {"backend": overrides}
+    params.update(overrides or {})
+    backend = params["backend"]
+    if backend not in MODEL_FILES:
+        raise ValueError(f"Unknown detector backend {backend!r}; choose from {', '.join(MODEL_FILES)}")
+    paths = [model_path(f) for f in MODEL_FILES[backend]]
+    if not all(paths):
+        print(f"[WARN] Detector '{backend}' needs {', '.join(MODEL_FILES[backend])} in {MODELS_DIR}/; using 'haar'")
+        backend = "haar"
+        paths = [model_path(f) for f in MODEL_FILES[backend]]
+    if backend == "dnn":
+        return DnnDetector(*paths, params["confidence"], params["min_size"], params["max_size"])
+    return CascadeDetector(paths[0], params["scale_factor"], params["min_neighbors"],
+                           params["min_size"], params["max_size"])
+
+# Calibration
+
+def labelled_frames(directory):
+    """[(gray, boxes)] from a directory of images and its labels.json."""
+    with open(os.path.join(directory, LABELS_FILE), 'r') as f:
+        labels = json.load(f)
+    frames = []
+    for name, boxes in sorted(labels.items()):
+        image = cv2.imread(os.path.join(directory, name))
+        if image is None:
+            print(f"[WARN] Could not read {name}")
+            continue
+        frames.append((cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), [tuple(b) for b in boxes]))
+    return frames
+
+def synthetic_frames():
+    """[(gray, boxes)] made from the face samples in face_data/ (see frame_sources)."""
+    import frame_sources  # Imports this module
+    crops = frame_sources.load_crops()
+    if not crops:
+        raise SystemExit("[ERROR] No face samples to build calibration frames from; pass --frames DIR")
+    frames = []
+    for width, height, faces in SYNTHETIC_FRAMES:
+        source = frame_sources.SyntheticSource(crops, width, height, faces)
+        for i in range(SYNTHETIC_FRAMES_EACH):
+            source.index = i * 10  # Different crops and positions in every frame
+            _, image = source.read()
+            frames.append((cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), source.face_boxes))
+    return frames
+
+def prepare(frames, detect_scale):
+    """Equalize and downscale frames (and their boxes) the way the tracker does."""
+    prepared = []
+    for gray, boxes in frames:
+        small = cv2.equalizeHist(gray)
+        if detect_scale != 1.0:
+            small = cv2.resize(small, None, fx=detect_scale, fy=detect_scale, interpolation=cv2.INTER_AREA)
+        prepared.append((small, [tuple(int(v * detect_scale) for v in box) for box in boxes]))
+    return prepared
+
+def score(detector, frames, repeats=1):
+    """Recall, precision and mean detect time over labelled frames."""
+    found = expected = detected = 0
+    best_time = None
+    for repeat in range(repeats):
+        start = time.perf_counter()
+        results = [detector.detect(gray) for gray, _ in frames]
+        elapsed = time.perf_counter() - start
+        best_time = elapsed if best_time is None else min(best_time, elapsed)
+    for (_, truth), boxes in zip(frames, results):
+        expected += len(truth)
+        detected += len(boxes)
+        unmatched = list(boxes)
+        for box in truth:
+            match = max(unmatched, key=lambda b: tracker.iou(b, box), default=None)
+            if match is not None and tracker.iou(match, box) >= MATCH_IOU:
+                unmatched.remove(match)
+                found += 1
+    return {"recall": found / expected if expected else 1.0,
+            "precision": found / detected if detected else 1.0,
+            "ms": 1000.0 * best_time / len(frames)}
+
+def candidates(backend):
+    grid = GRID["dnn" if backend == "dnn" else "cascade"]
+    for values in itertools.product(*grid.values()):
+        yield dict(zip(grid, values), backend=backend)
+
+def calibrate(frames, target_recall=TARGET_RECALL, backends=None):
+    """Try every backend and parameter combination on frames and return
+    (best params, all results). The best is the fastest that reaches
+    target_recall (fewest false detections on ties), or else the one with
+    the highest recall."""
+    results = []
+    for backend in backends or available_backends():
+        for params in candidates(backend):
+            results.append((params, score(create_detector(params), frames)))
+        best = max((r for p, r in results if p["backend"] == backend), key=lambda r: (r["recall"], -r["ms"]))
+        print(f"[INFO] {backend}: best recall {best['recall']:.0%} at {best['ms']:.1f} ms/frame")
+    reaching = [(p, r) for p, r in results if r["recall"] >= target_recall]
+    if reaching:
+        # One run is enough to rank, not to pick between close timings
+        reaching.sort(key=lambda pr: pr[1]["ms"])
+        reaching = [(p, score(create_detector(p), frames, CALIBRATION_REPEATS)) for p, _ in reaching[:SHORTLIST]]
+        best = min(reaching, key=lambda pr: (round(pr[1]["ms"], 1), -pr[1]["precision"]))
+    else:
+        print(f"[WARN] No setting reached {target_recall:.0%} recall; using the one with the highest recall")
+        best = max(results, key=lambda pr: (pr[1]["recall"], pr[1]["precision"], -pr[1]["ms"]))
+    return best, results
+
+def save_config(params, path=None):
+    path = path or CONFIG_FILE
+    tmp_file = path + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump({k: params[k] for k in DEFAULTS if k in params}, f, indent=2)
+    os.replace(tmp_file, path)
+
+if __name__ == "__main__":
+    def option(name, default=None):
+        return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else default
+
+    if "--list" in sys.argv:
+        available = available_backends()
+        for backend, files in MODEL_FILES.items():
+            state = "available" if backend in available else f"missing {', '.join(files)}"
+            print(f"{backend:10} {state}")
+        print(f"Current: {load_config()}")
+    elif "--calibrate" in sys.argv:
+        directory = option("--frames")
+        frames = labelled_frames(directory) if directory else synthetic_frames()
+        frames = prepare(frames, float(option("--detect-scale", tracker.DETECT_SCALE)))
+        print(f"[INFO] Calibrating on {len(frames)} frames with {sum(len(b) for _, b in frames)} faces...")
+        target = float(option("--recall", TARGET_RECALL))
+        (params, result), _ = calibrate(frames, target)
+        output = option("--output", CONFIG_FILE)
+        save_config(params, output)
+        print(f"[INFO] Chose {params}: recall {result['recall']:.0%}, precision {result['precision']:.0%}, "
+              f"{result['ms']:.1f} ms/frame. Saved to {output}.")
+    else:
+        print("Usage: python detectors.py --list")
+        print("       python detectors.py --calibrate [--frames DIR] [--recall 0.95] [--detect-scale 0.5] [--output detector.json]")
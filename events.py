@@ -0,0 +1,58 @@
+import queue
+import threading
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+class Subscription:
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False  # Set when events were dropped; the reader should resync
+
+    def get(self, timeout=None):
+        """Return the next event, or None if nothing arrived within timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class EventBus:
+    """In-process publish/subscribe for live updates (e.g. attendance events).
+
+    Publishing never blocks: a subscriber that falls SUBSCRIBER_QUEUE_SIZE
+    events behind is flagged as overflowed instead of slowing the publisher.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+
+    def subscribe(self):
+        sub = Subscription()
+        with self.lock:
+            self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.subscribers.discard(sub)
+
+    def publish(self, event):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for sub in subscribers:
+            try:
+                sub.queue.put_nowait(event)
+            except queue.Full:
+                sub.overflowed = True
+
+    def invalidate(self):
+        """Mark every subscriber as overflowed, e.g. after events were lost upstream."""
+        with self.lock:
+            for sub in self.subscribers:
+                sub.overflowed = True
+
+    def subscriber_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+# Attendance transitions, published after they are committed to the database
+attendance_events = EventBus()
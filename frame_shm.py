@@ -0,0 +1,180 @@
+import json
+import struct
+import threading
+import time
+import cv2
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+import camera
+
+SLOT_BYTES = 4 * 1024 * 1024  # Room for one JPEG plus its recognition results
+READ_TIMEOUT = 2.0            # Frames are only encoded while a reader polled within this many seconds
+MIN_POLL_SECONDS = 0.005      # Shortest wait between checks for a new frame
+MAX_POLL_SECONDS = 0.1        # Longest, reached by backing off while no frame arrives
+READ_RETRIES = 10             # Attempts at copying a frame the writer keeps overtaking
+
+# Layout: header (seq, read_at), then two slots of (slot_seq, jpeg_len, results_len, data).
+# The writer alternates slots, so a reader copying frame N is only disturbed by frame N+2.
+HEADER = struct.Struct("<Qd")
+SLOT_HEADER = struct.Struct("<QII")
+
+def segment_size(slot_bytes=SLOT_BYTES):
+    return HEADER.size + 2 * (SLOT_HEADER.size + slot_bytes)
+
+def create(name, slot_bytes=SLOT_BYTES):
+    """Create (or take over a stale) frame segment. The creator unlinks it."""
+    try:
+        shm = shared_memory.SharedMemory(name, create=True, size=segment_size(slot_bytes))
+    except FileExistsError:
+        stale = shared_memory.SharedMemory(name)
+        stale.close()
+        stale.unlink()
+        shm = shared_memory.SharedMemory(name, create=True, size=segment_size(slot_bytes))
+    shm.buf[:HEADER.size] = bytes(HEADER.size)
+    return shm
+
+def attach(name, child=False):
+    """Open an existing segment. child=True for processes spawned by the
+    creator, which share its resource tracker."""
+    shm = shared_memory.SharedMemory(name)
+    if not child:
+        # Python < 3.13 registers attached segments too and would unlink them
+        # when this process exits; only the creator should do that.
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+    return shm
+
+class FrameWriter:
+    """Publishes the latest JPEG and recognition results of one camera."""
+    def __init__(self, shm):
+        self.shm = shm
+        self.slot_bytes = (shm.size - HEADER.size) // 2 - SLOT_HEADER.size
+        self.seq = HEADER.unpack_from(shm.buf, 0)[0]
+
+    def wanted(self):
+        """True if a reader asked for a frame recently."""
+        read_at = HEADER.unpack_from(self.shm.buf, 0)[1]
+        return time.time() - read_at < READ_TIMEOUT
+
+    def write(self, jpeg, results):
+        results = json.dumps(results).encode()
+        if len(jpeg) + len(results) > self.slot_bytes:
+            print(f"[WARN] Frame of {len(jpeg)} bytes does not fit in shared memory, skipped")
+            return
+        seq = self.seq + 1
+        offset = HEADER.size + (seq % 2) * (SLOT_HEADER.size + self.slot_bytes)
+        data = offset + SLOT_HEADER.size
+        buf = self.shm.buf
+        SLOT_HEADER.pack_into(buf, offset, 0, 0, 0)  # Invalidate while writing
+        buf[data:data + len(jpeg)] = jpeg
+        buf[data + len(jpeg):data + len(jpeg) + len(results)] = results
+        SLOT_HEADER.pack_into(buf, offset, seq, len(jpeg), len(results))
+        struct.pack_into("<Q", buf, 0, seq)
+        self.seq = seq
+
+class FrameReader:
+    def __init__(self, shm):
+        self.shm = shm
+        self.slot_bytes = (shm.size - HEADER.size) // 2 - SLOT_HEADER.size
+
+    def seq(self):
+        return HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    def touch(self):
+        struct.pack_into("<d", self.shm.buf, 8, time.time())
+
+    def read(self):
+        """Return (seq, jpeg or None, results) of the newest complete frame.
+
+        The JPEG is copied out of the segment once (a view would be
+        overwritten by frame seq + 2 while viewers are still sending it);
+        SharedBroadcast shares that copy between every viewer in the process.
+        Gives (seq, None, []) if the writer overtook every one of READ_RETRIES
+        attempts at copying it.
+        """
+        buf = self.shm.buf
+        for _ in range(READ_RETRIES):
+            seq = self.seq()
+            if seq == 0:
+                return 0, None, []
+            offset = HEADER.size + (seq % 2) * (SLOT_HEADER.size + self.slot_bytes)
+            slot_seq, jpeg_len, results_len = SLOT_HEADER.unpack_from(buf, offset)
+            if slot_seq != seq:
+                continue  # Raced with the writer; take the newer frame
+            data = offset + SLOT_HEADER.size
+            jpeg = bytes(buf[data:data + jpeg_len])
+            results = bytes(buf[data + jpeg_len:data + jpeg_len + results_len])
+            if SLOT_HEADER.unpack_from(buf, offset)[0] == seq:
+                return seq, jpeg or None, json.loads(results)
+        return seq, None, []
+
+class SharedBroadcast(camera.FrameBroadcast):
+    """FrameBroadcast interface over a camera's shared-memory segment.
+
+    While anyone waits for frames, one poller thread per process checks the
+    segment and publishes new frames to the waiters as FrameBroadcast does.
+    It checks again about when the next frame is due (from the interval
+    between recent frames), backing off to MAX_POLL_SECONDS while none
+    arrives. Full-size default-quality requests get the camera's JPEG as
+    is; other sizes and qualities are re-encoded from one decoded copy per
+    frame.
+    """
+    def __init__(self, shm):
+        super().__init__()
+        self.reader = FrameReader(shm)
+        self.results = []
+        self.decoded = (None, None)
+        self.waiting = 0
+        self.poller = None
+
+    def wait(self, last_seq, timeout=1.0):
+        with self.cond:
+            self.waiting += 1
+            if self.poller is None:
+                self.poller = threading.Thread(target=self._poll, daemon=True)
+                self.poller.start()
+            self.cond.notify_all()  # Wake an idle poller
+            try:
+                self.cond.wait_for(lambda: self.seq != last_seq, timeout)
+            finally:
+                self.waiting -= 1
+            return self.seq, self.frame
+
+    def _poll(self):
+        interval = MAX_POLL_SECONDS  # Estimated time between frames
+        delay = MIN_POLL_SECONDS
+        last_at = None
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.waiting > 0)  # Idle (and let the writer stop encoding) without viewers
+            self.reader.touch()
+            if self.reader.seq() == self.seq:
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_POLL_SECONDS)
+                continue
+            seq, jpeg, results = self.reader.read()
+            now = time.monotonic()
+            if jpeg is not None:
+                with self.cond:
+                    self.frame, self.seq, self.results = jpeg, seq, results
+                    self.cond.notify_all()
+                if last_at is not None:
+                    interval = 0.8 * interval + 0.2 * (now - last_at)
+                last_at = now
+            # Sleep until shortly before the next frame is due, then back off from there
+            time.sleep(min(max(interval * 0.8, MIN_POLL_SECONDS), MAX_POLL_SECONDS))
+            delay = MIN_POLL_SECONDS
+
+    def encode(self, seq, frame, width=None, quality=camera.JPEG_QUALITY):
+        if not width and quality == camera.JPEG_QUALITY:
+            return frame
+        with self.encode_lock:
+            decoded_seq, image = self.decoded
+        if decoded_seq != seq:
+            image = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+            with self.encode_lock:
+                self.decoded = (seq, image)
+                self.encoded = {k: v for k, v in self.encoded.items() if k[0] >= seq - 1}
+        return super().encode(seq, image, width, quality)
@@ -0,0 +1,164 @@
+"""Capture sources other than cameras and video files, for demos, benchmarks and load tests.
+
+Each source is a cv2.VideoCapture stand-in (read, get, set, isOpened,
+release), so camera.VideoCamera plays it back like a video file: paced at
+the source's frame rate and looped. In cameras.json:
+
+    {"id": "lobby", "source": "recordings/lobby"}        # directory of images
+    {"id": "load1", "source": "synthetic"}               # one face, 640x480
+    {"id": "load2", "source": "synthetic:3:1280x720"}    # three faces, 1280x720
+"""
+import cv2
+import os
+import numpy as np
+import detectors
+import sample_store
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+IMAGE_FPS = 10       # Playback rate of image directories
+SYNTHETIC_FPS = 30
+SYNTHETIC_PREFIX = "synthetic"
+SEED = 1234
+
+def list_images(directory):
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                  if f.lower().endswith(IMAGE_EXTENSIONS))
+
+def load_crops(data_dir=sample_store.DATA_DIR):
+    """Grayscale face crops from the sample store, or legacy User.*.jpg files ([] if none)."""
+    faces, _ = sample_store.SampleStore(data_dir).samples()
+    if len(faces):
+        return [np.asarray(f) for f in faces]
+    crops = [cv2.imread(p, cv2.IMREAD_GRAYSCALE) for p in sample_store.legacy_paths(data_dir)]
+    return [c for c in crops if c is not None]
+
+def pad_face(crop, size, border):
+    face = cv2.resize(crop, (size, size))
+    return cv2.copyMakeBorder(face, border, border, border, border, cv2.BORDER_REPLICATE)
+
+def detectable_crops(crops, width=640, height=480, scale=0.5):
+    """The crops the configured detector finds in a synthetic frame (equalized
+    and downscaled like the tracker does), so frames have known face counts."""
+    detector = detectors.create_detector()
+    found = []
+    for crop in crops:
+        frame = SyntheticSource([crop], width, height, 1).read()[1]
+        gray = cv2.equalizeHist(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        if len(detector.detect(small)):
+            found.append(crop)
+    return found or crops
+
+class FrameSource:
+    """Base for capture stand-ins; subclasses implement read()."""
+    width = 0
+    height = 0
+    fps = 0
+
+    def isOpened(self):
+        return True
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        return 0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.index = int(value)
+            return True
+        return False
+
+    def release(self):
+        pass
+
+class ImageFolderSource(FrameSource):
+    """Plays the images of a directory in name order."""
+    def __init__(self, directory, fps=IMAGE_FPS):
+        self.paths = list_images(directory)
+        self.fps = fps
+        self.index = 0
+        if self.paths:
+            first = cv2.imread(self.paths[0])
+            if first is not None:
+                self.height, self.width = first.shape[:2]
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def read(self):
+        while self.index < len(self.paths):
+            image = cv2.imread(self.paths[self.index])
+            self.index += 1
+            if image is not None:
+                return True, image
+        return False, None
+
+class SyntheticSource(FrameSource):
+    """Composites face crops onto a background.
+
+    Tight crops are padded with replicated edges so the detector sees
+    enough context around them. Faces drift slowly from frame to frame so the
+    motion gate and the tracker behave as they do with a live camera.
+    """
+    def __init__(self, crops, width=640, height=480, faces=1, seed=SEED, fps=SYNTHETIC_FPS):
+        self.crops = crops
+        self.width = width
+        self.height = height
+        self.faces = faces if crops else 0
+        self.fps = fps
+        self.index = 0
+        rng = np.random.default_rng(seed)
+        gradient = np.linspace(60, 140, width, dtype=np.float32)[None, :].repeat(height, 0)
+        noise = rng.normal(0, 6, (height, width)).astype(np.float32)
+        self.background = cv2.cvtColor(np.clip(gradient + noise, 0, 255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+        # One tile per face, side by side; the face takes up ~55% of its tile
+        self.tile = min(width // max(faces, 1), int(height * 0.8))
+        self.face_size = int(self.tile * 0.55)
+        self.border = (self.tile - self.face_size) // 2
+        self.face_boxes = []  # (x, y, w, h) of each face in the last frame read
+
+    def read(self):
+        frame = self.background.copy()
+        self.face_boxes = []
+        drift = int(self.tile * 0.04 * np.sin(self.index / 3.0))
+        for i in range(self.faces):
+            # Each face changes expression/pose every few frames, like a person in front of a camera
+            crop = self.crops[(self.index // 10 + i * 7) % len(self.crops)]
+            face = cv2.cvtColor(pad_face(crop, self.face_size, self.border), cv2.COLOR_GRAY2BGR)
+            x = i * self.tile + abs(drift)
+            y = max(0, (self.height - face.shape[0]) // 2 + drift)
+            h, w = face.shape[:2]
+            h, w = min(h, self.height - y), min(w, self.width - x)
+            frame[y:y+h, x:x+w] = face[:h, :w]
+            fx, fy = x + self.border, y + self.border
+            self.face_boxes.append((fx, fy, min(self.face_size, self.width - fx), min(self.face_size, self.height - fy)))
+        self.index += 1
+        return True, frame
+
+def parse_synthetic(spec):
+    """"synthetic[:faces[:WIDTHxHEIGHT]]" -> (faces, width, height)."""
+    parts = spec.split(":")
+    faces = int(parts[1]) if len(parts) > 1 and parts[1] else 1
+    width, height = 640, 480
+    if len(parts) > 2:
+        width, height = (int(v) for v in parts[2].lower().split("x"))
+    return faces, width, height
+
+def open_source(source, data_dir=sample_store.DATA_DIR):
+    """A FrameSource for an image directory or a synthetic spec, else None."""
+    if not isinstance(source, str):
+        return None
+    if source == SYNTHETIC_PREFIX or source.startswith(SYNTHETIC_PREFIX + ":"):
+        faces, width, height = parse_synthetic(source)
+        crops = load_crops(data_dir)
+        if faces and not crops:
+            print(f"[WARN] No face samples in {data_dir}; synthetic frames will have no faces")
+        return SyntheticSource(detectable_crops(crops, width, height) if faces else crops, width, height, faces)
+    if os.path.isdir(source):
+        return ImageFolderSource(source)
+    return None
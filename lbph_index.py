@@ -0,0 +1,258 @@
+import os
+import struct
+import zlib
+import numpy as np
+import sample_store
+
+GRID_X = 8
+GRID_Y = 8
+PRUNE_USERS = 20    # Only compare against the samples of the N nearest user centroids
+DISTANCE_SCALE = 400.0  # Puts distances on roughly the same scale as LBPH confidences
+BATCH_SIZE = 1024   # Faces converted to histograms per chunk while training
+
+# Model file layout: a 64-byte header, then int32 labels, float32 histograms
+# and float32 per-user centroids, each section starting on a 64-byte
+# boundary. Labels are sorted, so the file can be used in place through a
+# memory map without re-sorting or recomputing anything.
+MAGIC = b"LBPHIDX\0"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIIIQQQI")  # magic, version, grid_x, grid_y, bins, rows, dim, users, crc32
+HEADER_SIZE = 64
+ALIGN = 64
+# Windows cannot replace a model file while another process maps it, so read it into memory there
+MMAP = os.name != "nt"
+
+# Neighbour offsets (dy, dx) of the 3x3 LBP operator, clockwise from top-left
+NEIGHBOURS = [(-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1)]
+
+def _uniform_table():
+    # Map the 58 uniform patterns (at most two 0/1 transitions) to their own bins
+    # and every other pattern to one shared bin, as in the classic LBP-u2 operator.
+    table = np.full(256, -1, dtype=np.int64)
+    next_bin = 0
+    for code in range(256):
+        bits = [(code >> i) & 1 for i in range(8)]
+        transitions = sum(bits[i] != bits[(i + 1) % 8] for i in range(8))
+        if transitions <= 2:
+            table[code] = next_bin
+            next_bin += 1
+    table[table < 0] = next_bin
+    return table, next_bin + 1
+
+UNIFORM_TABLE, NUM_BINS = _uniform_table()
+
+def lbp_histograms(faces, grid_x=GRID_X, grid_y=GRID_Y):
+    """Spatial LBP histograms for a stack of equally sized grayscale faces.
+
+    Returns an N x (grid_x * grid_y * NUM_BINS) float32 matrix. Each cell
+    histogram is normalized and square-rooted and each row has unit length,
+    so a dot product between rows is the mean Bhattacharyya coefficient of
+    their cells and one matrix product compares many faces at once.
+    """
+    faces = np.asarray(faces, dtype=np.int16)
+    if faces.ndim == 2:
+        faces = faces[None]
+    n, h, w = faces.shape
+    center = faces[:, 1:h-1, 1:w-1]
+    codes = np.zeros(center.shape, dtype=np.int64)
+    for bit, (dy, dx) in enumerate(NEIGHBOURS):
+        neighbour = faces[:, 1+dy:h-1+dy, 1+dx:w-1+dx]
+        codes |= (neighbour >= center).astype(np.int64) << bit
+    codes = UNIFORM_TABLE[codes]
+
+    # Crop to a whole number of cells and give every cell its own block of bins
+    ch = (h - 2) // grid_y
+    cw = (w - 2) // grid_x
+    codes = codes[:, :ch * grid_y, :cw * grid_x]
+    codes = codes.reshape(n, grid_y, ch, grid_x, cw).transpose(0, 1, 3, 2, 4)
+    codes = codes.reshape(n, grid_y * grid_x, ch * cw)
+    cells = grid_y * grid_x
+    offsets = (np.arange(n * cells) * NUM_BINS).reshape(n, cells, 1)
+    hist = np.bincount((codes + offsets).ravel(), minlength=n * cells * NUM_BINS)
+    hist = hist.reshape(n, cells * NUM_BINS).astype(np.float32)
+    return np.sqrt(hist / (ch * cw * cells))
+
+def representative_rows(features, count, iterations=10):
+    """Indices of count rows of a histogram matrix that cover it best.
+
+    Clusters the rows with k-means (cosine similarity, farthest-point seeds,
+    so the result is deterministic) and keeps the row closest to each
+    cluster centre, e.g. one sample per pose or lighting condition.
+    """
+    n = len(features)
+    if n <= count:
+        return np.arange(n)
+    seeds = [0]
+    nearest = features @ features[0]
+    for _ in range(count - 1):
+        seeds.append(int(np.argmin(nearest)))
+        nearest = np.maximum(nearest, features @ features[seeds[-1]])
+    centres = features[seeds]
+    for _ in range(iterations):
+        assign = np.argmax(features @ centres.T, axis=1)
+        for c in range(count):
+            members = features[assign == c]
+            if len(members):
+                centre = members.sum(axis=0)
+                centres[c] = centre / np.linalg.norm(centre)
+    sims = features @ centres.T
+    assign = np.argmax(sims, axis=1)
+    picks = []
+    for c in range(count):
+        members = np.flatnonzero(assign == c)
+        if len(members):
+            picks.append(members[np.argmax(sims[members, c])])
+    return np.sort(np.array(picks, dtype=np.int64))
+
+class LBPHIndex:
+    """Drop-in NumPy replacement for cv2.face.LBPHFaceRecognizer.
+
+    Histograms live in one contiguous matrix sorted by label, so every face in
+    a frame is matched with a single matrix product, and per-user centroids
+    let large indexes skip users that are clearly not a match.
+    """
+    def __init__(self, grid_x=GRID_X, grid_y=GRID_Y, prune=PRUNE_USERS):
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.prune = prune
+        self._set(np.empty((0, grid_x * grid_y * NUM_BINS), dtype=np.float32),
+                  np.empty(0, dtype=np.int32))
+
+    def _set(self, features, labels, centroids=None):
+        if len(labels) > 1 and not np.all(labels[:-1] <= labels[1:]):
+            order = np.argsort(labels, kind="stable")
+            features, labels = features[order], labels[order]
+        self.features = np.ascontiguousarray(features)  # No copy for an already sorted memory map
+        self.labels = labels
+        self.user_ids, self.starts, counts = np.unique(self.labels, return_index=True, return_counts=True)
+        self.ends = self.starts + counts
+        if centroids is not None:
+            self.centroids = centroids
+        elif len(self.labels):
+            centroids = np.add.reduceat(self.features, self.starts, axis=0)
+            centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+            self.centroids = centroids
+        else:
+            self.centroids = np.empty((0, self.features.shape[1]), dtype=np.float32)
+
+    def histograms(self, faces):
+        if isinstance(faces, (list, tuple)):
+            faces = np.stack([sample_store.normalize(f) for f in faces]) if faces else np.empty((0, 1, 1), np.uint8)
+        chunks = [lbp_histograms(faces[i:i + BATCH_SIZE], self.grid_x, self.grid_y)
+                  for i in range(0, len(faces), BATCH_SIZE)]
+        if not chunks:
+            return np.empty((0, self.features.shape[1]), dtype=np.float32)
+        return np.concatenate(chunks)
+
+    # cv2.face.LBPHFaceRecognizer compatible API
+
+    def empty(self):
+        return len(self.labels) == 0
+
+    def getLabels(self):
+        return self.labels.reshape(-1, 1)
+
+    def train(self, faces, labels):
+        labels = np.asarray(labels, dtype=np.int32).ravel()
+        self._set(self.histograms(faces), labels)
+
+    def update(self, faces, labels):
+        labels = np.asarray(labels, dtype=np.int32).ravel()
+        self._set(np.concatenate([self.features, self.histograms(faces)]),
+                  np.concatenate([self.labels, labels]))
+
+    def remove(self, label):
+        keep = self.labels != int(label)
+        self._set(self.features[keep], self.labels[keep])
+
+    def predict(self, face):
+        return self.predict_batch([face])[0][0]
+
+    def write(self, path):
+        """Save in the binary model format (see MAGIC); .npz paths get the old format."""
+        if path.endswith(".npz"):
+            with open(path, 'wb') as f:
+                np.savez(f, features=self.features, labels=self.labels,
+                         grid=np.array([self.grid_x, self.grid_y], dtype=np.int32))
+            return
+        sections = [np.ascontiguousarray(self.labels, dtype=np.int32),
+                    np.ascontiguousarray(self.features, dtype=np.float32),
+                    np.ascontiguousarray(self.centroids, dtype=np.float32)]
+        crc = 0
+        for section in sections:
+            crc = zlib.crc32(memoryview(section).cast("B"), crc)
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, self.grid_x, self.grid_y, NUM_BINS, len(self.labels),
+                             self.features.shape[1], len(self.user_ids), crc)
+        # Other processes may have the old file mapped, so never truncate it in place
+        tmp_file = path + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(header.ljust(HEADER_SIZE, b"\0"))
+            for section in sections:
+                section.tofile(f)
+                f.write(b"\0" * (-f.tell() % ALIGN))
+        os.replace(tmp_file, path)
+
+    def read(self, path, verify=False):
+        """Load a model file; binary files are memory-mapped (see MMAP).
+        verify=True also checks the checksum, which reads the whole file."""
+        with open(path, 'rb') as f:
+            head = f.read(HEADER_SIZE)
+        if not head.startswith(MAGIC):
+            with np.load(path) as data:  # trainer.npz from older versions
+                self.grid_x, self.grid_y = (int(v) for v in data["grid"])
+                self._set(data["features"], data["labels"])
+            return
+        magic, version, grid_x, grid_y, bins, rows, dim, users, crc = HEADER.unpack_from(head)
+        if version != FORMAT_VERSION or bins != NUM_BINS:
+            raise ValueError(f"{path}: unsupported model format {version} with {bins} bins")
+        offset = HEADER_SIZE
+        sections = []
+        for dtype, shape in ((np.int32, (rows,)), (np.float32, (rows, dim)), (np.float32, (users, dim))):
+            count = int(np.prod(shape))
+            if MMAP and count:
+                section = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+            else:
+                section = np.fromfile(path, dtype=dtype, count=count, offset=offset).reshape(shape)
+            sections.append(section)
+            offset += count * 4
+            offset += -offset % ALIGN
+        if verify:
+            check = 0
+            for section in sections:
+                check = zlib.crc32(memoryview(np.ascontiguousarray(section)).cast("B"), check)
+            if check != crc:
+                raise ValueError(f"{path}: checksum mismatch, the model file is damaged")
+        labels, features, centroids = sections
+        self.grid_x, self.grid_y = grid_x, grid_y
+        self._set(features, labels, centroids)
+
+    # Batched matching
+
+    def _candidates(self, queries):
+        # Return (features, segment starts, user ids) to compare the queries against
+        if not self.prune or len(self.user_ids) <= self.prune:
+            return self.features, self.starts, self.user_ids
+        sims = queries @ self.centroids.T
+        nearest = np.argpartition(-sims, self.prune - 1, axis=1)[:, :self.prune]
+        users = np.unique(nearest)
+        rows = np.concatenate([np.arange(self.starts[u], self.ends[u]) for u in users])
+        counts = self.ends[users] - self.starts[users]
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        return self.features[rows], starts, self.user_ids[users]
+
+    def predict_batch(self, faces, k=1):
+        """Match all faces at once. Returns, per face, up to k (label, distance)
+        pairs sorted best first. A distance of 0 means identical histograms."""
+        if self.empty():
+            raise ValueError("LBPHIndex is empty, train it first")
+        queries = self.histograms(faces)
+        features, starts, user_ids = self._candidates(queries)
+        sims = queries @ features.T
+        best = np.maximum.reduceat(sims, starts, axis=1)  # Best sample per user
+        k = min(k, len(user_ids))
+        top = np.argpartition(-best, k - 1, axis=1)[:, :k]
+        results = []
+        for i, cols in enumerate(top):
+            cols = cols[np.argsort(-best[i, cols])]
+            results.append([(int(user_ids[c]), float(DISTANCE_SCALE * (1.0 - best[i, c]))) for c in cols])
+        return results
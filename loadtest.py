@@ -0,0 +1,329 @@
+"""Load test for the web app: concurrent MJPEG viewers, log pollers and control calls.
+
+    python loadtest.py --spawn [--source synthetic:1] [--cameras 1] [options]
+    python loadtest.py --url http://127.0.0.1:5000 [options]
+
+    options: [--streams 20] [--pollers 5] [--controls 1] [--duration 30]
+             [--camera ID] [--stream-args "fps=10&width=480"] [--output report.json]
+
+--spawn starts the app on a local port with frame_sources cameras (a
+synthetic face generator by default, or any video file or image directory)
+and a temporary database seeded with attendance history, and stops it
+afterwards. --url targets a server that is already running.
+
+Reports delivered FPS and frame gaps per stream client, latency percentiles
+for /api/logs and /api/control, and server CPU and memory read from /metrics
+(summed over the web process, camera processes and camera server). The
+driver competes with the server for CPU when both run on one machine.
+"""
+import datetime
+import http.client
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import numpy as np
+import attendance
+import database
+
+URL = "http://127.0.0.1:5000"
+STREAMS = 20
+POLLERS = 5
+CONTROLS = 1
+DURATION = 30            # Seconds of load after everyone connected
+POLL_SECONDS = 1.0       # Pause between /api/logs requests of one poller
+CONTROL_SECONDS = 2.0    # Pause between /api/control requests of one client
+MONITOR_SECONDS = 2.0    # How often /metrics is scraped for server CPU and memory
+SPAWN_PORT = 5077
+SPAWN_SOURCE = "synthetic:1"
+STARTUP_TIMEOUT = 60
+SEED_USERS = 50
+SEED_DAYS = 30
+BOUNDARY = b"--frame\r\n"  # Part separator of app.gen()
+
+def percentiles(times):
+    if not times:
+        return {}
+    ms = np.asarray(times) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99)), "max_ms": float(ms.max())}
+
+class Client(threading.Thread):
+    """One simulated browser connection; run() fills in self.report."""
+    def __init__(self, url, path, deadline):
+        super().__init__(daemon=True)
+        parts = urllib.parse.urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.path = path
+        self.deadline = deadline
+        self.report = {"path": path, "errors": 0}
+
+    def connect(self):
+        return http.client.HTTPConnection(self.host, self.port, timeout=10)
+
+class StreamClient(Client):
+    """Reads /video_feed and times the arrival of each JPEG part."""
+    def run(self):
+        start = time.monotonic()
+        arrivals = []
+        received = 0
+        try:
+            conn = self.connect()
+            conn.request("GET", self.path)
+            response = conn.getresponse()
+            tail = b""
+            while time.monotonic() < self.deadline:
+                chunk = response.read1(65536)
+                if not chunk:
+                    break
+                received += len(chunk)
+                now = time.monotonic()
+                arrivals.extend([now] * (tail + chunk).count(BOUNDARY))
+                tail = chunk[-len(BOUNDARY):]
+            conn.close()
+        except (OSError, http.client.HTTPException) as e:
+            self.report["errors"] += 1
+            self.report["error"] = str(e)
+        elapsed = max(time.monotonic() - start, 1e-9)
+        gaps = np.diff(arrivals).tolist() if len(arrivals) > 1 else []
+        self.report.update({
+            "frames": len(arrivals),
+            "fps": (len(arrivals) - 1) / (arrivals[-1] - arrivals[0]) if len(arrivals) > 1 else 0.0,
+            "first_frame_ms": (arrivals[0] - start) * 1000 if arrivals else None,
+            "mbit_per_sec": received * 8 / elapsed / 1e6,
+            "frame_gap": percentiles(gaps),
+        })
+
+class RequestClient(Client):
+    """Repeats a GET (or a POST of each body in turn) and times every response."""
+    def __init__(self, url, path, deadline, pause, bodies=None):
+        super().__init__(url, path, deadline)
+        self.pause = pause
+        self.bodies = bodies
+        self.times = []
+
+    def run(self):
+        conn = self.connect()
+        n = 0
+        while time.monotonic() < self.deadline:
+            start = time.monotonic()
+            try:
+                if self.bodies:
+                    body = json.dumps(self.bodies[n % len(self.bodies)])
+                    conn.request("POST", self.path, body, {"Content-Type": "application/json"})
+                else:
+                    conn.request("GET", self.path)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 500:
+                    self.report["errors"] += 1
+                self.times.append(time.monotonic() - start)
+            except (OSError, http.client.HTTPException):
+                self.report["errors"] += 1
+                conn.close()
+                conn = self.connect()
+            n += 1
+            time.sleep(self.pause)
+        conn.close()
+        self.report.update({"requests": len(self.times), "latency": percentiles(self.times)})
+
+def scrape_usage(url):
+    """(CPU seconds, resident bytes) summed over every server process in /metrics."""
+    parts = urllib.parse.urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+    conn.request("GET", "/metrics")
+    text = conn.getresponse().read().decode()
+    conn.close()
+    cpu = memory = 0.0
+    for line in text.splitlines():
+        name, _, value = line.rpartition(" ")
+        if name.startswith("face_process_cpu_seconds"):
+            cpu += float(value)
+        elif name.startswith("face_process_resident_bytes"):
+            memory += float(value)
+    return cpu, memory
+
+class UsageMonitor(threading.Thread):
+    def __init__(self, url, deadline):
+        super().__init__(daemon=True)
+        self.url = url
+        self.deadline = deadline
+        self.samples = []  # (time, cpu seconds, resident bytes)
+
+    def sample(self):
+        try:
+            self.samples.append((time.monotonic(),) + scrape_usage(self.url))
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            print(f"[WARN] Could not read /metrics: {e}")
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            self.sample()
+            time.sleep(MONITOR_SECONDS)
+        self.sample()
+
+    def report(self):
+        if len(self.samples) < 2:
+            return {}
+        (t0, cpu0, _), (t1, cpu1, _) = self.samples[0], self.samples[-1]
+        memory = [s[2] for s in self.samples]
+        return {"cpu_percent": 100 * (cpu1 - cpu0) / (t1 - t0), "resident_mb": memory[-1] / 2**20,
+                "peak_resident_mb": max(memory) / 2**20}
+
+def seed_database(path, users=SEED_USERS, days=SEED_DAYS):
+    """Fill a fresh database with a morning time-in and evening time-out per user per day."""
+    old_db = database.DB_NAME
+    database.DB_NAME = path
+    try:
+        database.init_db()
+        for user_id in range(1, users + 1):
+            database.add_user(user_id, f"Load User {user_id}")
+        recorder = attendance.AttendanceRecorder()
+        today = datetime.datetime.combine(datetime.date.today(), datetime.time(8))
+        events = []
+        try:
+            for day in range(days, 0, -1):
+                for user_id in range(1, users + 1):
+                    arrival = today - datetime.timedelta(days=day, minutes=user_id)
+                    for now in (arrival, arrival + datetime.timedelta(hours=9)):
+                        events.append(recorder.transition(user_id, f"Load User {user_id}", "seed", now))
+        finally:
+            recorder.close()
+        database.write_attendance_events(events)
+        database.close_connection()
+    finally:
+        database.DB_NAME = old_db
+
+def wait_for_server(url, timeout=STARTUP_TIMEOUT):
+    parts = urllib.parse.urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=5)
+            conn.request("GET", "/api/cameras")
+            cameras = json.loads(conn.getresponse().read())
+            conn.close()
+            if cameras and all(c.get("frames") for c in cameras):
+                return cameras
+        except (OSError, http.client.HTTPException, ValueError):
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"[ERROR] Server at {url} did not come up within {timeout} s")
+
+def spawn_server(port, source, cameras, tmp_dir):
+    """Start the app with its own camera config and database in tmp_dir."""
+    config = os.path.join(tmp_dir, "cameras.json")
+    with open(config, 'w') as f:
+        json.dump({"cameras": [{"id": f"load{i + 1}", "source": source} for i in range(cameras)]}, f)
+    db_file = os.path.join(tmp_dir, "attendance.db")
+    seed_database(db_file)
+    env = dict(os.environ, CAMERA_CONFIG=config, FACE_DB=db_file)
+    print(f"[INFO] Starting server on port {port} with {cameras} camera(s) from {source}")
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port)], env=env)
+
+def serve(port):
+    # Child of --spawn: the Flask server without the debugger or reloader, so it is one process tree
+    import app
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))  # Close cameras and segments
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # One access log line per request drowns the report
+    database.init_db()
+    app.app.run(host="127.0.0.1", port=port, threaded=True)
+
+def run(url, streams=STREAMS, pollers=POLLERS, controls=CONTROLS, duration=DURATION,
+        camera_id=None, stream_args=""):
+    suffix = f"/{camera_id}" if camera_id else ""
+    feed = f"/video_feed{suffix}" + (f"?{stream_args}" if stream_args else "")
+    deadline = time.monotonic() + duration
+    clients = [StreamClient(url, feed, deadline) for _ in range(streams)]
+    clients += [RequestClient(url, "/api/logs", deadline, POLL_SECONDS) for _ in range(pollers)]
+    clients += [RequestClient(url, f"/api/control{suffix}", deadline, CONTROL_SECONDS,
+                              [{"action": "recognize"}, {"action": "stop"}]) for _ in range(controls)]
+    monitor = UsageMonitor(url, deadline)
+    monitor.start()
+    print(f"[INFO] {streams} streams, {pollers} log pollers, {controls} control clients for {duration} s")
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join(timeout=duration + 30)
+    monitor.join(timeout=MONITOR_SECONDS + 10)
+
+    stream_reports = [c.report for c in clients if isinstance(c, StreamClient)]
+    logs = [t for c in clients if isinstance(c, RequestClient) and c.path == "/api/logs" for t in c.times]
+    control = [t for c in clients if isinstance(c, RequestClient) and c.path != "/api/logs" for t in c.times]
+    fps = [r["fps"] for r in stream_reports]
+    first = [r["first_frame_ms"] for r in stream_reports if r["first_frame_ms"] is not None]
+    summary = {
+        "streams": streams, "pollers": pollers, "controls": controls, "duration_s": duration,
+        "stream_fps": {"min": min(fps), "mean": float(np.mean(fps)), "max": max(fps)} if fps else {},
+        "first_frame_ms": {"p50": float(np.percentile(first, 50)), "max": max(first)} if first else {},
+        "logs_latency": percentiles(logs),
+        "control_latency": percentiles(control),
+        "errors": sum(c.report["errors"] for c in clients),
+        "server": monitor.report(),
+    }
+    return {"summary": summary, "clients": [c.report for c in clients]}
+
+def print_report(report):
+    summary = report["summary"]
+    for i, client in enumerate(c for c in report["clients"] if "fps" in c):
+        gap = client["frame_gap"]
+        print(f"  stream {i + 1:>3}: {client['fps']:6.1f} fps, {client['frames']:>5} frames, "
+              f"gap p95 {gap.get('p95_ms', 0):7.1f} ms, {client['mbit_per_sec']:6.2f} Mbit/s"
+              + (f", error: {client['error']}" if "error" in client else ""))
+    if summary["stream_fps"]:
+        fps = summary["stream_fps"]
+        print(f"[RESULT] Stream FPS min/mean/max: {fps['min']:.1f} / {fps['mean']:.1f} / {fps['max']:.1f}")
+    for name in ("logs_latency", "control_latency"):
+        latency = summary[name]
+        if latency:
+            print(f"[RESULT] {name.replace('_', ' ')}: p50 {latency['p50_ms']:.1f} ms, "
+                  f"p95 {latency['p95_ms']:.1f} ms, p99 {latency['p99_ms']:.1f} ms")
+    server = summary["server"]
+    if server:
+        print(f"[RESULT] Server CPU {server['cpu_percent']:.0f}% (of one core), memory {server['resident_mb']:.0f} MB "
+              f"(peak {server['peak_resident_mb']:.0f} MB)")
+    print(f"[RESULT] Errors: {summary['errors']}")
+
+def option(name, default, cast=str):
+    if name in sys.argv:
+        return cast(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+if __name__ == "__main__":
+    if "--serve" in sys.argv:
+        serve(option("--serve", SPAWN_PORT, int))
+        sys.exit(0)
+    url = option("--url", URL)
+    server = tmp_dir = None
+    if "--spawn" in sys.argv:
+        port = option("--port", SPAWN_PORT, int)
+        url = f"http://127.0.0.1:{port}"
+        tmp_dir = tempfile.mkdtemp(prefix="face_load_")
+        server = spawn_server(port, option("--source", SPAWN_SOURCE), option("--cameras", 1, int), tmp_dir)
+    try:
+        cameras = wait_for_server(url)
+        print(f"[INFO] Server up with cameras: {', '.join(c['camera_id'] for c in cameras)}")
+        report = run(url, option("--streams", STREAMS, int), option("--pollers", POLLERS, int),
+                     option("--controls", CONTROLS, int), option("--duration", DURATION, float),
+                     option("--camera", None), option("--stream-args", ""))
+        print_report(report)
+        output = option("--output", None)
+        if output:
+            with open(output, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"[INFO] Report written to {output}")
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
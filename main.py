@@ -5,48 +5,46 @@ except ImportError:
     print("pip install opencv-python opencv-contrib-python")
     exit(1)
 import os
-import numpy as np
+import sys
+import time
+import datetime
+import multiprocessing
 import json
 import database  # Import our database module
+import detectors
+import attendance
+import trainer
+import sample_store
+import sample_capture
+import tracker
+import metrics
+import frame_sources
+import users
 
 # Directory to save face data
 DATA_DIR = "face_data"
-MODEL_FILE = "trainer.yml"
-NAMES_FILE = "names.json"
+MODEL_FILE = trainer.MODEL_FILE
+MATCH_THRESHOLD = 65  # Highest confidence value (distance) accepted as a match
+
+# Batch mode (see batch_recognize)
+BATCH_PROGRESS_FILE = "batch_progress.json"
+BATCH_CHUNK_FRAMES = 250
+# Each chunk also runs the tracker over this many detector intervals of the
+# frames before it (plus a vote window), so people already in view when it
+# starts are recognized as the same presence rather than as new arrivals
+BATCH_LEAD_IN_DETECTS = 3
 
 def create_directory(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
 def load_names():
-    # Try file first
-    if os.path.exists(NAMES_FILE):
-        with open(NAMES_FILE, 'r') as f:
-            try:
-                names = {int(k):v for k,v in json.load(f).items()}
-                print(f"[INFO] Loaded {len(names)} users from {NAMES_FILE}.")
-                return names
-            except Exception:
-                pass
-    # Fallback to DB if file missing or invalid
-    try:
-        users = database.get_all_users()
-        if users:
-            print(f"[INFO] Loaded {len(users)} users from database as fallback.")
-            return users
-    except Exception as e:
-        print(f"[WARN] Could not load users from DB: {e}")
-    return {}
+    names = users.get_directory().all()
+    print(f"[INFO] Loaded {len(names)} users.")
+    return names
 
 def save_name(id, name):
-    names = load_names()
-    names[id] = name
-    # Ensure JSON keys are strings for compatibility
-    serializable = {str(k): v for k, v in names.items()}
-    with open(NAMES_FILE, 'w') as f:
-        json.dump(serializable, f)
-    # Also save to DB
-    database.add_user(id, name)
+    users.get_directory().add(id, name)
 
 def register_face(face_id, name):
     # Try opening camera. On Windows, CAP_DSHOW can help in some setups.
@@ -58,13 +56,17 @@ def register_face(face_id, name):
         return
     # ensure data dir exists
     create_directory(DATA_DIR)
-    detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    store = sample_store.SampleStore(DATA_DIR)
+    # Re-registering replaces the user's old samples
+    store.remove_user(face_id)
+    detector = detectors.create_detector()
     
     print(f"\n[INFO] Initializing face capture for user {name} (ID: {face_id}).")
     print("[INFO] Please look at the camera. Move your face slightly (left, right, up, down) to capture angles.")
     
-    count = 0
-    max_samples = 60
+    max_samples = trainer.SAMPLE_BUDGET  # Training keeps at most this many per user anyway
+    # Sharp, distinct single-face crops are saved by background writers
+    collector = sample_capture.SampleCollector(store, face_id, max_samples)
     
     while True:
         ret, img = cam.read()
@@ -75,81 +77,69 @@ def register_face(face_id, name):
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         gray = cv2.equalizeHist(gray)
 
-        faces = detector.detectMultiScale(gray, 1.3, 5)
+        faces = detector.detect(gray)
 
         for (x, y, w, h) in faces:
             cv2.rectangle(img, (x, y), (x + w, y + h), (255, 0, 0), 2)
-            count += 1
-            # Save face ROI only
-            face_roi = gray[y:y+h, x:x+w]
-            cv2.imwrite(os.path.join(DATA_DIR, f"User.{face_id}.{count}.jpg"), face_roi)
+        collector.offer(gray, faces)
 
         # Always show the latest frame and capture count (even when no faces detected)
-        cv2.putText(img, f"Captured: {count}/{max_samples}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        cv2.putText(img, f"Captured: {collector.saved}/{max_samples}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        hint = collector.hint()
+        if hint:
+            cv2.putText(img, hint, (10, img.shape[0] - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
         cv2.imshow('Registering Face', img)
 
         # Use waitKey(1) for better responsiveness
         k = cv2.waitKey(1) & 0xff
         if k == 27:  # Press 'ESC' to stop
             break
-        elif count >= max_samples:
+        elif collector.done():
             break
 
-    print("\n[INFO] Capture complete.")
+    if collector.stalled():
+        print(f"\n[INFO] No new distinct face for {sample_capture.STALL_SECONDS}s, finishing with what was captured.")
+    collector.close(wait=True)
+    print(f"\n[INFO] Capture complete: {collector.saved} samples saved, rejected {collector.rejected}.")
     cam.release()
     cv2.destroyAllWindows()
-    train_model()
+    trainer.upgrade_model(MODEL_FILE)
+    trainer.enroll_user(face_id, data_dir=DATA_DIR, model_file=MODEL_FILE)
 
 def train_model():
-    print("\n[INFO] Training faces. Please wait...")
-    path = DATA_DIR
-    # Ensure data directory exists before training
-    create_directory(path)
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    
-    imagePaths = [os.path.join(path, f) for f in os.listdir(path) if f.endswith('.jpg')]
-    imagePaths.sort()
-    faceSamples = []
-    ids = []
-
-    if not imagePaths:
-        print("[ERROR] No training data found!")
-        return
+    # Full rebuild from every sample in DATA_DIR
+    create_directory(DATA_DIR)
+    trainer.train_full(DATA_DIR, MODEL_FILE)
 
-    for imagePath in imagePaths:
-        img = cv2.imread(imagePath, cv2.IMREAD_GRAYSCALE)
-        if img is None:
-            print(f"[WARN] Skipping unreadable image: {imagePath}")
-            continue
-        try:
-            id = int(os.path.split(imagePath)[-1].split(".")[1])
-            faceSamples.append(img)
-            ids.append(id)
-        except Exception:
-            print(f"[WARN] Could not parse id from filename: {imagePath}")
-            continue
+def create_tracker(detector, detect_interval=tracker.DETECT_INTERVAL):
+    # Sparse detection on a downscaled frame, template tracking in between
+    return tracker.FaceTracker(detector, detect_interval, tracker.DETECT_SCALE)
 
-    if not ids:
-        print("[ERROR] No valid training images found after scanning files.")
-        return
+def identify(face_tracker, recognizer, gray):
+    """Track the faces in an equalized grayscale frame and vote on who they are.
 
-    try:
-        recognizer.train(faceSamples, np.array(ids))
-    except Exception as e:
-        print(f"[ERROR] Training failed: {e}")
-        return
-    recognizer.write(MODEL_FILE)
-    print(f"\n[INFO] Success! {len(np.unique(ids))} faces trained.")
+    Shared by the live loop and the batch workers. Returns the tracker's
+    [(track, box)] list; a track's identity is usable once it is confirmed.
+    """
+    tracked = face_tracker.update(gray)
+    # Predict only for tracks still voting or due a re-check, in one batch
+    pending = [(track, box) for track, box in tracked if track.needs_predict()]
+    crops = [sample_store.normalize(gray[y:y+h,x:x+w]) for _, (x,y,w,h) in pending]
+    predictions = trainer.predict_faces(recognizer, crops)
+    for (track, _), (id, confidence) in zip(pending, predictions):
+        track.add_vote(id if confidence < MATCH_THRESHOLD else None, confidence)
+    return tracked
 
 def recognize_faces(names_dict):
     # Create recognizer and check availability (opencv-contrib required)
     try:
-        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer = trainer.create_recognizer()
     except Exception as e:
         print("[ERROR] OpenCV face recognizer not available. Install 'opencv-contrib-python'.")
         print(f"Details: {e}")
         return
 
+    trainer.upgrade_model(MODEL_FILE)
     if not os.path.exists(MODEL_FILE):
         print("[ERROR] Model not found! Please register a face first.")
         return
@@ -159,7 +149,7 @@ def recognize_faces(names_dict):
     except Exception as e:
         print(f"[ERROR] Failed to load model '{MODEL_FILE}': {e}")
         return
-    faceCascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml");
+    faceDetector = detectors.create_detector()
 
     font = cv2.FONT_HERSHEY_SIMPLEX
     # Try opening camera. On Windows, CAP_DSHOW can help in some setups.
@@ -170,41 +160,47 @@ def recognize_faces(names_dict):
         print("[ERROR] Unable to open camera for recognition. Check connection and permissions.")
         return
     
+    faceTracker = create_tracker(faceDetector)
+
     print("\n[INFO] Starting Recognition. Press 'ESC' to exit.")
 
     while True:
+        t = metrics.clock()
         ret, img = cam.read()
         if not ret:
             break
+        t = metrics.lap("capture", t)
+        metrics.inc("frames")
             
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        t = metrics.lap("cvtcolor", t)
         gray = cv2.equalizeHist(gray)
+        metrics.lap("equalize", t)
         
-        faces = faceCascade.detectMultiScale( 
-            gray,
-            scaleFactor = 1.2,
-            minNeighbors = 5,
-            minSize = (int(0.1*cam.get(3)), int(0.1*cam.get(4))),
-        )
-
-        for(x,y,w,h) in faces:
+        tracked = identify(faceTracker, recognizer, gray)
+        metrics.observe("faces_per_frame", len(tracked), metrics.FACE_BUCKETS)
+
+        for track, (x,y,w,h) in tracked:
             cv2.rectangle(img, (x,y), (x+w,y+h), (0,255,0), 2)
-            id, confidence = recognizer.predict(gray[y:y+h,x:x+w])
 
-            if (confidence < 65):
-                name = names_dict.get(id, "Unknown")
-                match_txt = f"{round(100 - confidence)}%"
+            if not track.confirmed:
+                name = "..."
+                match_txt = ""
+            elif track.label is not None:
+                name = names_dict.get(track.label, "Unknown")
+                match_txt = f"{round(100 - track.confidence)}%"
                 
-                # Mark attendance in DB
-                if name != "Unknown":
-                    status = database.mark_attendance(id, name)
+                # Mark attendance in DB, once per track
+                if name != "Unknown" and not track.attended:
+                    track.attended = True
+                    status = attendance.get_recorder().mark(track.label, name)
                     if status:
                         print(f"[ATTENDANCE] {status} for {name}")
                         # Visual feedback on screen
                         cv2.putText(img, status, (x, y-30), font, 0.7, (0, 255, 0), 2)
             else:
                 name = "Unknown"
-                match_txt = f"Low: {round(confidence)}"
+                match_txt = f"Low: {round(track.confidence)}"
             
             cv2.putText(img, str(name), (x+5,y-5), font, 1, (255,255,255), 2)
             cv2.putText(img, str(match_txt), (x+5,y+h-5), font, 1, (255,255,0), 1)  
@@ -219,6 +215,269 @@ def recognize_faces(names_dict):
 
     cam.release()
     cv2.destroyAllWindows()
+    # Make sure queued attendance is on disk before returning to the menu
+    attendance.get_recorder().flush()
+    if metrics.ENABLED:
+        print("[INFO] Time per stage:")
+        print(metrics.summary())
+
+def batch_interval(kind):
+    # Images may be far apart in time, so detect on every one of them
+    return 1 if kind == "images" else tracker.DETECT_INTERVAL
+
+def lead_in_frames(kind):
+    return BATCH_LEAD_IN_DETECTS * batch_interval(kind) + tracker.VOTE_WINDOW
+
+def plan_input(path, chunk_frames=BATCH_CHUNK_FRAMES, step=1, start=None, fps=None):
+    """Split a video file or image directory into chunks of frames.
+
+    Video frames are timestamped from start (default: the file's modification
+    time minus its duration, i.e. when recording began) plus frame / fps.
+    Images use start + index / fps if start is given, else their own
+    modification times. Every chunk but the first starts lead_in (processed)
+    frames early; see _process_chunk().
+    """
+    chunks = []
+    if os.path.isdir(path):
+        images = frame_sources.list_images(path)
+        if start is not None:
+            times = [start.timestamp() + i / (fps or 1.0) for i in range(len(images))]
+        else:
+            times = [os.path.getmtime(p) for p in images]
+        frames = list(zip(images, times))[::step]
+        for i in range(0, len(frames), chunk_frames):
+            lead_in = min(i, lead_in_frames("images"))
+            chunks.append({"kind": "images", "frames": frames[i - lead_in:i + chunk_frames], "lead_in": lead_in})
+    else:
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise ValueError(f"Cannot open {path}")
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        rate = fps or cap.get(cv2.CAP_PROP_FPS) or 25.0
+        cap.release()
+        base = start.timestamp() if start is not None else os.path.getmtime(path) - total / rate
+        for first in range(0, total, chunk_frames):
+            chunks.append({"kind": "video", "path": path, "first": first, "last": min(first + chunk_frames, total),
+                           "step": step, "base": base, "rate": rate,
+                           "lead_in": min(first, lead_in_frames("video") * step)})
+    for index, chunk in enumerate(chunks):
+        chunk["index"] = index
+    return chunks
+
+_batch_worker = {}
+
+def _init_batch_worker(model_file):
+    # One OpenCV thread per worker process; the pool provides the parallelism
+    cv2.setNumThreads(1)
+    recognizer = trainer.create_recognizer()
+    recognizer.read(model_file)
+    _batch_worker["recognizer"] = recognizer
+    _batch_worker["detector"] = detectors.create_detector()
+
+def _chunk_frames(chunk):
+    # Yield (timestamp, image, lead_in) for every frame of a chunk, lead-in included
+    lead_in = chunk.get("lead_in", 0)
+    if chunk["kind"] == "images":
+        for i, (path, timestamp) in enumerate(chunk["frames"]):
+            img = cv2.imread(path)
+            if img is not None:
+                yield timestamp, img, i < lead_in
+        return
+    cap = cv2.VideoCapture(chunk["path"])
+    cap.set(cv2.CAP_PROP_POS_FRAMES, chunk["first"] - lead_in)
+    try:
+        for n in range(chunk["first"] - lead_in, chunk["last"]):
+            if n % chunk["step"]:
+                if not cap.grab():  # Skip without decoding
+                    break
+                continue
+            ret, img = cap.read()
+            if not ret:
+                break
+            yield chunk["base"] + n / chunk["rate"], img, n < chunk["first"]
+    finally:
+        cap.release()
+
+def _process_chunk(job):
+    """Runs in a pool worker: the same detect -> predict path as recognize_faces().
+
+    Tracks do not carry over from the previous chunk, so the chunk's lead-in
+    rebuilds them: a face tracked from the first couple of detector passes
+    of the lead-in and confirmed before the chunk proper was in view before
+    it, and was counted by the previous chunk, so it gets no sighting (as in
+    the live loop, where its track would simply have continued). A face
+    that arrives later in the lead-in is reported; the previous chunk saw
+    the same arrival within a few frames, and merge_sightings() counts the
+    two as one.
+    """
+    path, chunk = job
+    recognizer = _batch_worker["recognizer"]
+    interval = batch_interval(chunk["kind"])
+    faceTracker = create_tracker(_batch_worker["detector"], interval)
+    frames = 0
+    sightings = []
+    born = {}  # Track id -> index of the frame it was first seen in
+    for index, (timestamp, img, lead_in) in enumerate(_chunk_frames(chunk)):
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = cv2.equalizeHist(gray)
+        for track, _ in identify(faceTracker, recognizer, gray):
+            born.setdefault(track.id, index)
+            # Like the live loop: one sighting per track once its identity is confirmed
+            if track.confirmed and track.label is not None and not track.attended:
+                track.attended = True
+                if not (lead_in and born[track.id] < 2 * interval):
+                    sightings.append((timestamp, track.label))
+        if not lead_in:
+            frames += 1
+    return path, chunk["index"], frames, sightings
+
+def load_batch_progress(progress_file):
+    if os.path.exists(progress_file):
+        with open(progress_file, 'r') as f:
+            return json.load(f)
+    return {}
+
+def save_batch_progress(progress, progress_file):
+    tmp_file = progress_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(progress, f)
+    os.replace(tmp_file, progress_file)
+
+def merge_sightings(sightings, names, cooldown=attendance.COOLDOWN_SECONDS):
+    """Add (timestamp, user_id, camera_id) sightings to daily_attendance.
+
+    Each user's day is merged with the sessions already stored for it
+    (attendance.merge_transitions), so sightings before, between or after
+    live sessions all land in time order, and its sessions are rewritten.
+    Sightings that cannot be placed are reported. Returns the number of
+    transitions added.
+    """
+    days = {}
+    for timestamp, user_id, camera_id in sightings:
+        if user_id not in names:
+            print(f"[WARN] Skipped a sighting of unknown user {user_id} at {datetime.datetime.fromtimestamp(timestamp)}.")
+            continue
+        when = datetime.datetime.fromtimestamp(timestamp)
+        days.setdefault((user_id, when.strftime("%Y-%m-%d")), []).append((when, camera_id))
+    added = repeated = 0
+    for (user_id, date_str), seen in sorted(days.items()):
+        stored = database.get_day_sessions(user_id, date_str)
+        if any(row["archived"] for row in stored):
+            print(f"[WARN] Skipped {len(seen)} sightings of user {user_id} on {date_str}: "
+                  f"that day's sessions are already archived.")
+            continue
+        day = datetime.date.fromisoformat(date_str)
+        def at(time_str):
+            return datetime.datetime.combine(day, datetime.time.fromisoformat(time_str))
+        known = []
+        for row in stored:
+            known.append((at(row["time_in"]), row["camera_in"]))
+            if row["time_out"]:
+                known.append((at(row["time_out"]), row["camera_out"]))
+        transitions, dropped = attendance.merge_transitions(known, seen, cooldown)
+        repeated += len(dropped)
+        if len(transitions) == len(known):
+            continue
+        sessions = []
+        for start, end in attendance.pair_sessions(transitions):
+            sessions.append((start[0].strftime("%H:%M:%S"), end[0].strftime("%H:%M:%S") if end else None,
+                             start[1], end[1] if end else None, (end or start)[0]))
+        database.replace_day_sessions(user_id, names[user_id], date_str, sessions)
+        added += len(transitions) - len(known)
+    if repeated:
+        print(f"[INFO] {repeated} sightings were within {cooldown}s of another time-in/out and counted as the same presence.")
+    return added
+
+def batch_recognize(inputs, workers=None, chunk_frames=BATCH_CHUNK_FRAMES, step=1, start=None, fps=None,
+                    camera_id=None, progress_file=BATCH_PROGRESS_FILE):
+    """Recognize faces in recorded videos / image directories and add the
+    resulting attendance to daily_attendance.
+
+    Inputs are split into chunks processed by a pool of worker processes.
+    Finished chunks are saved to progress_file, so rerunning the same command
+    after an interruption only processes what is left, and an input is never
+    merged into the database twice.
+    """
+    names = load_names()
+    trainer.upgrade_model(MODEL_FILE)
+    if not os.path.exists(MODEL_FILE):
+        print("[ERROR] Model not found! Please register a face first.")
+        return
+    progress = load_batch_progress(progress_file)
+    jobs = []
+    for path in inputs:
+        key = os.path.abspath(path)
+        chunks = plan_input(path, chunk_frames, step, start, fps)
+        settings = [chunk_frames, step, start.isoformat() if start else None, fps]
+        entry = progress.get(key)
+        if entry is None or entry["settings"] != settings:
+            entry = {"settings": settings, "chunks": len(chunks), "done": {}, "frames": 0,
+                     "camera_id": camera_id or os.path.basename(os.path.normpath(path)), "merged": False}
+            progress[key] = entry
+        if entry["merged"]:
+            print(f"[INFO] {path} was already processed, skipping.")
+            continue
+        todo = [(key, c) for c in chunks if str(c["index"]) not in entry["done"]]
+        if len(todo) < len(chunks):
+            print(f"[INFO] Resuming {path}: {len(chunks) - len(todo)}/{len(chunks)} chunks already done.")
+        jobs.extend(todo)
+
+    workers = workers or os.cpu_count() or 1
+    print(f"[INFO] Processing {len(jobs)} chunks with {workers} worker processes...")
+    frames = 0
+    started = time.time()
+    if jobs:
+        with multiprocessing.Pool(workers, initializer=_init_batch_worker, initargs=(MODEL_FILE,)) as pool:
+            for key, index, count, sightings in pool.imap_unordered(_process_chunk, jobs):
+                entry = progress[key]
+                entry["done"][str(index)] = sightings
+                entry["frames"] += count
+                save_batch_progress(progress, progress_file)
+                frames += count
+                elapsed = time.time() - started
+                print(f"[INFO] {os.path.basename(key)}: {len(entry['done'])}/{entry['chunks']} chunks, "
+                      f"{frames / elapsed if elapsed else 0:.1f} frames/sec")
+    elapsed = time.time() - started
+    if frames:
+        print(f"[INFO] Processed {frames} frames in {elapsed:.1f}s ({frames / elapsed:.1f} frames/sec).")
+
+    # Merge every finished input of this run in one pass, in timestamp order
+    ready = [os.path.abspath(p) for p in inputs]
+    ready = [k for k in ready if not progress[k]["merged"] and len(progress[k]["done"]) == progress[k]["chunks"]]
+    sightings = [(timestamp, user_id, progress[k]["camera_id"])
+                 for k in ready for chunk in progress[k]["done"].values() for timestamp, user_id in chunk]
+    added = merge_sightings(sightings, names)
+    for k in ready:
+        progress[k]["merged"] = True
+    save_batch_progress(progress, progress_file)
+    print(f"[INFO] {len(sightings)} sightings -> {added} new time-ins/outs.")
+    database.archive_closed_months()  # Recordings of archived months go into their archives
+
+def batch_main(argv):
+    # python main.py --batch <video or image dir>... [--workers N] [--chunk FRAMES] [--step N]
+    #                [--start "YYYY-MM-DD HH:MM:SS"] [--fps FPS] [--camera ID]
+    options = {"--workers": None, "--chunk": None, "--step": None, "--start": None, "--fps": None, "--camera": None}
+    inputs = []
+    args = iter(argv)
+    for arg in args:
+        if arg in options:
+            options[arg] = next(args, None)
+        elif arg != "--batch":
+            inputs.append(arg)
+    if not inputs:
+        print("Usage: python main.py --batch <video or image dir>... [--workers N] [--chunk FRAMES] [--step N] "
+              "[--start \"YYYY-MM-DD HH:MM:SS\"] [--fps FPS] [--camera ID]")
+        return
+    database.init_db()
+    batch_recognize(
+        inputs,
+        workers = int(options["--workers"]) if options["--workers"] else None,
+        chunk_frames = int(options["--chunk"]) if options["--chunk"] else BATCH_CHUNK_FRAMES,
+        step = int(options["--step"]) if options["--step"] else 1,
+        start = datetime.datetime.fromisoformat(options["--start"]) if options["--start"] else None,
+        fps = float(options["--fps"]) if options["--fps"] else None,
+        camera_id = options["--camera"],
+    )
 
 def main():
     create_directory(DATA_DIR)
@@ -229,7 +488,8 @@ def main():
         print("\n--- Face Recognition System (With Dashboard) ---")
         print("1. Register New Face")
         print("2. Start Recognition")
-        print("3. Exit")
+        print("3. Rebuild Model")
+        print("4. Exit")
         choice = input("Enter choice: ")
         
         if choice == '1':
@@ -247,9 +507,14 @@ def main():
             else:
                 recognize_faces(names)
         elif choice == '3':
+            train_model()
+        elif choice == '4':
             break
         else:
             print("Invalid choice")
 
 if __name__ == "__main__":
-    main()
+    if "--batch" in sys.argv:
+        batch_main(sys.argv[1:])
+    else:
+        main()
@@ -0,0 +1,149 @@
+import bisect
+import os
+import sys
+import time
+
+# Set FACE_METRICS=0 to turn instrumentation off; clock() and lap() then cost one call each
+ENABLED = os.environ.get("FACE_METRICS", "1") != "0"
+
+PREFIX = "face"
+STAGE_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+FACE_BUCKETS = [0, 1, 2, 3, 5, 10]
+TRAINING_BUCKETS = [1, 5, 10, 30, 60, 120, 300, 600]
+ROLLING_WINDOW = 1024  # Recent observations kept per histogram for quantiles
+QUANTILES = [0.5, 0.9, 0.99]
+
+# Pipeline stages timed with lap(), in pipeline order
+STAGES = ["capture", "cvtcolor", "equalize", "detect", "predict", "db_write", "imencode"]
+
+class Histogram:
+    """Cumulative buckets for Prometheus plus a ring of recent values for quantiles.
+
+    Updates take no lock; a concurrent observe() can rarely be lost, which is
+    fine for monitoring and keeps the hot path cheap.
+    """
+    def __init__(self, buckets, window=ROLLING_WINDOW):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = [0.0] * window
+        self.window = window
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.recent[self.count % self.window] = value
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        recent = sorted(self.recent[:min(self.count, self.window)])
+        quantiles = {q: recent[min(len(recent) - 1, int(q * len(recent)))] for q in QUANTILES} if recent else {}
+        return {"buckets": list(self.buckets), "counts": list(self.counts), "sum": self.sum,
+                "count": self.count, "quantiles": quantiles}
+
+histograms = {}  # (name, stage or None) -> Histogram
+counters = {}    # name -> value
+gauges = {}      # name -> callable returning a number
+
+def histogram(name, stage=None, buckets=STAGE_BUCKETS):
+    key = (name, stage)
+    hist = histograms.get(key)
+    if hist is None:
+        hist = histograms[key] = Histogram(buckets)
+    return hist
+
+def clock():
+    """Start time for lap(), or 0 when metrics are off."""
+    return time.perf_counter() if ENABLED else 0
+
+def lap(stage, start):
+    """Record the time since start for a pipeline stage and return now,
+    so consecutive stages can be chained: t = lap("cvtcolor", t)."""
+    if not ENABLED:
+        return 0
+    now = time.perf_counter()
+    histogram("stage_seconds", stage).observe(now - start)
+    return now
+
+def observe(name, value, buckets=STAGE_BUCKETS):
+    if ENABLED:
+        histogram(name, None, buckets).observe(value)
+
+def inc(name, amount=1):
+    if ENABLED:
+        counters[name] = counters.get(name, 0) + amount
+
+def gauge(name, fn):
+    gauges[name] = fn
+
+def resident_bytes():
+    """Resident memory of this process (the peak where /proc is not available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource  # Unix only; on Windows the gauge is left out of snapshots
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+# Every process (web, camera, camera server) reports its own usage; loadtest.py sums them
+gauge("process_cpu_seconds", time.process_time)
+gauge("process_resident_bytes", resident_bytes)
+
+def snapshot():
+    """Everything recorded in this process, as plain (picklable) data."""
+    values = {}
+    for name, fn in list(gauges.items()):
+        try:
+            values[name] = float(fn())
+        except Exception:
+            pass
+    return {"histograms": {key: hist.snapshot() for key, hist in list(histograms.items())},
+            "counters": dict(counters), "gauges": values}
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+def render(sources):
+    """Prometheus text format for [(labels, snapshot)] from one or more processes."""
+    families = {}  # metric name -> (type, [lines])
+
+    def add(name, kind, line):
+        families.setdefault(name, (kind, []))[1].append(line)
+
+    for labels, snap in sources:
+        for name, value in snap["counters"].items():
+            add(f"{PREFIX}_{name}_total", "counter", f"{PREFIX}_{name}_total{_labels(labels)} {value}")
+        for name, value in snap["gauges"].items():
+            add(f"{PREFIX}_{name}", "gauge", f"{PREFIX}_{name}{_labels(labels)} {value}")
+        for (name, stage), hist in snap["histograms"].items():
+            base = dict(labels, stage=stage) if stage else dict(labels)
+            metric = f"{PREFIX}_{name}"
+            cumulative = 0
+            for bound, count in zip(hist["buckets"] + ["+Inf"], hist["counts"]):
+                cumulative += count
+                add(metric, "histogram", f"{metric}_bucket{_labels(dict(base, le=bound))} {cumulative}")
+            add(metric, "histogram", f"{metric}_sum{_labels(base)} {hist['sum']}")
+            add(metric, "histogram", f"{metric}_count{_labels(base)} {hist['count']}")
+            for q, value in hist["quantiles"].items():
+                add(f"{metric}_recent", "gauge", f"{metric}_recent{_labels(dict(base, quantile=q))} {value}")
+
+    lines = []
+    for name, (kind, samples) in families.items():
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+def summary():
+    """Short per-stage latency report for console tools."""
+    lines = []
+    for stage in STAGES:
+        hist = histograms.get(("stage_seconds", stage))
+        if hist is None or not hist.count:
+            continue
+        q = hist.snapshot()["quantiles"]
+        lines.append(f"  {stage:<10} n={hist.count:<7} mean={1000 * hist.sum / hist.count:7.2f} ms  "
+                     f"p50={1000 * q[0.5]:7.2f} ms  p99={1000 * q[0.99]:7.2f} ms")
+    return "\n".join(lines)
@@ -0,0 +1,48 @@
+import cv2
+import numpy as np
+
+MOTION_WIDTH = 64       # Frames are compared at this width
+MOTION_THRESHOLD = 15   # Per-pixel gray level change that counts as "changed"
+MOTION_MIN_AREA = 0.01  # Fraction of changed pixels that counts as motion
+
+class MotionGate:
+    """Cheap frame-difference check in front of the detection stage.
+
+    Each frame is shrunk to MOTION_WIDTH pixels wide, optionally cropped to a
+    region of interest given as (x, y, w, h) fractions of the frame, and
+    compared with the previous one. check() returns False when less than
+    min_area of the pixels changed by more than threshold gray levels.
+    """
+    def __init__(self, threshold=MOTION_THRESHOLD, min_area=MOTION_MIN_AREA, roi=None, width=MOTION_WIDTH):
+        self.threshold = threshold
+        self.min_area = min_area
+        self.roi = roi
+        self.width = width
+        self.previous = None
+        self.checked = 0
+        self.skipped = 0
+
+    def _shrink(self, image):
+        h, w = image.shape[:2]
+        if self.roi:
+            rx, ry, rw, rh = self.roi
+            image = image[int(ry * h):int((ry + rh) * h), int(rx * w):int((rx + rw) * w)]
+            h, w = image.shape[:2]
+        height = max(1, int(h * self.width / w))
+        small = cv2.resize(image, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def check(self, image):
+        self.checked += 1
+        small = self._shrink(image)
+        previous, self.previous = self.previous, small
+        if previous is None or previous.shape != small.shape:
+            return True
+        diff = cv2.absdiff(small, previous)
+        changed = np.count_nonzero(diff > self.threshold) / diff.size
+        if changed >= self.min_area:
+            return True
+        self.skipped += 1
+        return False
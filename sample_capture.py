@@ -0,0 +1,126 @@
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+import metrics
+import sample_store
+
+MIN_SHARPNESS = 40       # Variance of the Laplacian of a normalized crop; motion-blurred crops score < 10
+MIN_HASH_DISTANCE = 5    # Bits (of 64) a crop's perceptual hash must differ from every kept crop
+WRITER_THREADS = 2
+QUEUE_SIZE = 8           # Crops waiting for the writers; more are dropped rather than stalling the camera
+STALL_SECONDS = 10       # Registration ends early once this long passes without a new sample...
+MIN_SAMPLES = 5          # ...provided at least this many were kept
+
+HINTS = {
+    "faces": "Only one face in view, please",
+    "blurry": "Hold still",
+    "duplicate": "Move your head slightly",
+}
+
+def sharpness(face):
+    return cv2.Laplacian(face, cv2.CV_64F).var()
+
+def perceptual_hash(face):
+    """64-bit DCT hash: signs of the lowest 8x8 frequencies against their median."""
+    small = cv2.resize(face, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+def hash_distance(a, b):
+    return bin(a ^ b).count("1")
+
+class SampleCollector:
+    """Collects one user's registration samples without blocking the frame loop.
+
+    offer() only checks that exactly one face is in view and queues a copy of
+    the crop. Writer threads then drop blurry crops and near-duplicates of
+    crops already kept, and append the rest to the sample store until
+    target samples are saved, or until no new sample has been kept for
+    STALL_SECONDS once there are MIN_SAMPLES (a face that barely moves soon
+    yields nothing but near-duplicates).
+    """
+    def __init__(self, store, user_id, target, writers=WRITER_THREADS):
+        self.store = store
+        self.user_id = user_id
+        self.target = target
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.hashes = []
+        self.saved = 0
+        self.rejected = {reason: 0 for reason in HINTS}
+        self.last_reject = None
+        self.last_saved_at = time.monotonic()
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(writers)]
+        for thread in self.threads:
+            thread.start()
+
+    def done(self):
+        return self.saved >= self.target or self.stalled()
+
+    def stalled(self):
+        """True if collection ended early because no new sample arrived."""
+        return (MIN_SAMPLES <= self.saved < self.target
+                and time.monotonic() - self.last_saved_at >= STALL_SECONDS)
+
+    def hint(self):
+        """What the person registering should do, if the last crop was rejected."""
+        return HINTS.get(self.last_reject)
+
+    def offer(self, gray, faces):
+        """Queue the face of a frame if it has exactly one; faces are (x, y, w, h) boxes."""
+        if self.done():
+            return
+        if len(faces) != 1:
+            if len(faces):
+                self._reject("faces")  # Samples must never mix two people under one ID
+            return
+        x, y, w, h = faces[0]
+        try:
+            self.queue.put_nowait(gray[y:y+h, x:x+w].copy())
+        except queue.Full:
+            pass  # Writers are busy; the next frame brings another crop
+
+    def _reject(self, reason):
+        self.rejected[reason] += 1
+        self.last_reject = reason
+        metrics.inc(f"registration_rejected_{reason}")
+
+    def _run(self):
+        while True:
+            crop = self.queue.get()
+            if crop is None:
+                return
+            face = sample_store.normalize(crop)
+            if sharpness(face) < MIN_SHARPNESS:
+                self._reject("blurry")
+                continue
+            face_hash = perceptual_hash(face)
+            with self.lock:
+                if self.done():
+                    continue
+                if any(hash_distance(face_hash, h) < MIN_HASH_DISTANCE for h in self.hashes):
+                    self._reject("duplicate")
+                    continue
+                self.hashes.append(face_hash)
+                # Appends happen under the lock, so done() implies every sample is on disk
+                self.store.append(self.user_id, face)
+                self.saved += 1
+                self.last_saved_at = time.monotonic()
+                self.last_reject = None
+            metrics.inc("registration_samples")
+
+    def close(self, wait=False):
+        self.target = self.saved  # Stops offer() and the writers from keeping anything else
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        for _ in self.threads:
+            self.queue.put(None)
+        if wait:
+            for thread in self.threads:
+                thread.join()
@@ -0,0 +1,271 @@
+import cv2
+import os
+import sys
+import json
+import threading
+import numpy as np
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DATA_DIR = "face_data"
+SAMPLE_SIZE = 100  # Crops are normalized to SAMPLE_SIZE x SAMPLE_SIZE at capture time
+
+SAMPLES_FILE = "samples.bin"
+LABELS_FILE = "samples.labels"
+META_FILE = "samples.json"
+LOCK_FILE = "samples.lock"
+REMOVED = -1
+
+def normalize(face):
+    """Resize a grayscale crop to the fixed sample size used for training and prediction."""
+    if face.shape[0] == SAMPLE_SIZE and face.shape[1] == SAMPLE_SIZE:
+        return face
+    return cv2.resize(face, (SAMPLE_SIZE, SAMPLE_SIZE), interpolation=cv2.INTER_AREA)
+
+class StoreLock:
+    """Reentrant lock on a store shared by every thread and process using it.
+
+    Held around every change to the store files and while a reader pairs the
+    labels with the samples, so compact() never swaps the files in between.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+    def __enter__(self):
+        self.lock.acquire()
+        if self.depth == 0:
+            self.file = open(self.path, 'a+b')
+            if fcntl is not None:
+                fcntl.flock(self.file, fcntl.LOCK_EX)
+            else:
+                self.file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass  # LK_LOCK gives up after 10 seconds; keep waiting
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl is None:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+            self.file.close()  # Releases the flock
+            self.file = None
+        self.lock.release()
+
+class SampleStore:
+    """Face samples packed into one fixed-size uint8 array file.
+
+    samples.bin holds the crops back to back, samples.labels holds one int32
+    user ID per slot (REMOVED for pruned slots), so slot i lives at byte
+    offset i * size * size. Appends only ever grow both files, which keeps
+    readers in other processes (e.g. the training worker) consistent;
+    compact() rewrites them under a file lock (samples.lock) that readers
+    take too.
+    """
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self.samples_file = os.path.join(data_dir, SAMPLES_FILE)
+        self.labels_file = os.path.join(data_dir, LABELS_FILE)
+        self.meta_file = os.path.join(data_dir, META_FILE)
+        if not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+        self.lock = StoreLock(os.path.join(data_dir, LOCK_FILE))
+        if os.path.exists(self.meta_file):
+            with open(self.meta_file, 'r') as f:
+                self.size = json.load(f)["size"]
+        else:
+            self.size = SAMPLE_SIZE
+            with open(self.meta_file, 'w') as f:
+                json.dump({"size": self.size}, f)
+
+    def labels(self):
+        with self.lock:
+            if not os.path.exists(self.labels_file):
+                return np.empty(0, dtype=np.int32)
+            return np.fromfile(self.labels_file, dtype=np.int32)
+
+    def index(self):
+        """Return {user_id: array of slot offsets} for every live sample."""
+        labels = self.labels()
+        order = np.argsort(labels, kind="stable")
+        ids, starts = np.unique(labels[order], return_index=True)
+        groups = np.split(order, starts[1:])
+        return {int(i): g for i, g in zip(ids, groups) if i != REMOVED}
+
+    def user_ids(self):
+        return [int(i) for i in np.unique(self.labels()) if i != REMOVED]
+
+    def count(self, user_id=None):
+        labels = self.labels()
+        if user_id is None:
+            return int(np.count_nonzero(labels != REMOVED))
+        return int(np.count_nonzero(labels == int(user_id)))
+
+    def _map(self, n):
+        if n == 0:
+            return np.empty((0, self.size, self.size), dtype=np.uint8)
+        return np.memmap(self.samples_file, dtype=np.uint8, mode='r', shape=(n, self.size, self.size))
+
+    def samples(self, user_id=None):
+        """Return (faces, labels) for all live samples, or only one user's.
+
+        faces is an N x size x size uint8 array read from the memory map.
+        """
+        with self.lock:
+            labels = self.labels()
+            faces = self._map(len(labels))
+        if user_id is None:
+            keep = labels != REMOVED
+        else:
+            keep = labels == int(user_id)
+        if keep.all():
+            return faces, labels
+        return faces[keep], labels[keep]
+
+    def faces_at(self, slots):
+        """Crops stored in the given slots (as returned by index())."""
+        with self.lock:
+            return self._map(len(self.labels()))[slots]
+
+    def append(self, user_id, face):
+        face = np.ascontiguousarray(normalize(face), dtype=np.uint8)
+        with self.lock:
+            # Samples first, label second: a reader never sees a label without its crop
+            with open(self.samples_file, 'ab') as f:
+                f.write(face.tobytes())
+            with open(self.labels_file, 'ab') as f:
+                f.write(np.int32(user_id).tobytes())
+
+    def append_many(self, user_ids, faces):
+        if len(faces) == 0:
+            return
+        faces = np.stack([normalize(f) for f in faces]).astype(np.uint8)
+        with self.lock:
+            with open(self.samples_file, 'ab') as f:
+                f.write(faces.tobytes())
+            with open(self.labels_file, 'ab') as f:
+                f.write(np.asarray(user_ids, dtype=np.int32).tobytes())
+
+    def remove_user(self, user_id):
+        """Mark every sample of a user as removed. Space is reclaimed by compact()."""
+        with self.lock:
+            if not os.path.exists(self.labels_file):
+                return 0
+            labels = np.memmap(self.labels_file, dtype=np.int32, mode='r+')
+            hits = labels == int(user_id)
+            removed = int(np.count_nonzero(hits))
+            if removed:
+                labels[hits] = REMOVED
+                labels.flush()
+            del labels
+            return removed
+
+    def remove_slots(self, slots):
+        """Mark individual samples as removed. Space is reclaimed by compact()."""
+        if not len(slots):
+            return 0
+        with self.lock:
+            labels = np.memmap(self.labels_file, dtype=np.int32, mode='r+')
+            labels[np.asarray(slots)] = REMOVED
+            labels.flush()
+            del labels
+            return len(slots)
+
+    def compact(self):
+        """Rewrite both files without removed slots."""
+        with self.lock:
+            faces, labels = self.samples()
+            tmp_samples = self.samples_file + ".tmp"
+            tmp_labels = self.labels_file + ".tmp"
+            np.ascontiguousarray(faces).tofile(tmp_samples)
+            labels.astype(np.int32).tofile(tmp_labels)
+            del faces
+            os.replace(tmp_samples, self.samples_file)
+            os.replace(tmp_labels, self.labels_file)
+            return len(labels)
+
+    def export(self, out_dir, user_id=None):
+        """Write samples back out as User.<id>.<n>.jpg files."""
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        faces, labels = self.samples(user_id)
+        counts = {}
+        for face, label in zip(faces, labels):
+            counts[label] = counts.get(label, 0) + 1
+            cv2.imwrite(os.path.join(out_dir, f"User.{label}.{counts[label]}.jpg"), face)
+        return len(labels)
+
+def legacy_paths(data_dir=DATA_DIR):
+    return sorted(os.path.join(data_dir, f) for f in os.listdir(data_dir)
+                  if f.startswith("User.") and f.endswith('.jpg'))
+
+def legacy_user_id(path):
+    """User ID of a User.<id>.<n>.jpg file, or None if the name has none."""
+    try:
+        return int(os.path.split(path)[-1].split(".")[1])
+    except (IndexError, ValueError):
+        return None
+
+def unimported_paths(store, paths):
+    """The legacy files whose user has no samples in the store."""
+    stored = set(store.user_ids())
+    return [p for p in paths if legacy_user_id(p) not in stored]
+
+def migrate(data_dir=DATA_DIR, delete=False):
+    """Import User.<id>.<n>.jpg files into the packed store.
+
+    Only users without samples in the store are imported, so a user
+    registered since (whose new samples replace the old ones) is left
+    alone and running it again imports nothing twice. With delete=True the
+    imported files are removed; skipped and unreadable ones are kept.
+    """
+    store = SampleStore(data_dir)
+    paths = legacy_paths(data_dir)
+    stored = set(store.user_ids())
+    ids = []
+    faces = []
+    imported = []
+    for path in paths:
+        id = legacy_user_id(path)
+        if id is None:
+            print(f"[WARN] Could not parse id from filename: {path}")
+            continue
+        if id in stored:
+            continue
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            print(f"[WARN] Skipping unreadable image: {path}")
+            continue
+        ids.append(id)
+        faces.append(img)
+        imported.append(path)
+    store.append_many(ids, faces)
+    if delete:
+        for path in imported:
+            os.remove(path)
+    print(f"[INFO] Migrated {len(ids)} samples for {len(set(ids))} users into {store.samples_file}.")
+    if len(imported) < len(paths):
+        print(f"[INFO] Left {len(paths) - len(imported)} files in {data_dir} (already in the store or unreadable).")
+    return len(ids)
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "--migrate":
+        args = [a for a in sys.argv[2:] if not a.startswith("--")]
+        migrate(args[0] if args else DATA_DIR, delete="--delete" in sys.argv)
+    elif len(sys.argv) >= 3 and sys.argv[1] == "--export":
+        print(f"[INFO] Exported {SampleStore().export(sys.argv[2])} samples.")
+    else:
+        print("Usage: python sample_store.py --migrate [face_data] [--delete]")
+        print("       python sample_store.py --export <out_dir>")
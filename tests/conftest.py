@@ -0,0 +1,36 @@
+import datetime
+import glob
+import os
+import sys
+import cv2
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import database
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh, migrated attendance database in a temporary directory."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "attendance.db"))
+    database.init_db()
+    yield database
+    database.close_connection()
+
+def session(user_id, date_str, time_in, time_out=None, camera_id="cam"):
+    """write_attendance_events() events for one session."""
+    def event(kind, time_str):
+        now = datetime.datetime.combine(datetime.date.fromisoformat(date_str), datetime.time.fromisoformat(time_str))
+        return (kind, user_id, f"user{user_id}", date_str, time_str, now, camera_id)
+    events = [event("in", time_in)]
+    if time_out:
+        events.append(event("out", time_out))
+    return events
+
+def face_crops(user_id, count=None):
+    """Grayscale face crops of one user from the repo's face_data samples."""
+    paths = sorted(glob.glob(os.path.join(REPO, "face_data", f"User.{user_id}.*.jpg")),
+                   key=lambda p: int(p.split(".")[-2]))
+    return [cv2.imread(p, cv2.IMREAD_GRAYSCALE) for p in paths[:count]]
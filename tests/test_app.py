@@ -0,0 +1,33 @@
+import pytest
+import app as web
+from conftest import session
+
+@pytest.fixture
+def client(db):
+    return web.app.test_client()
+
+def test_logs_are_paged_by_cursor(client, db):
+    events = []
+    for day in range(1, 4):
+        events += session(1, f"2026-10-0{day}", "09:00:00", "10:00:00")
+    db.write_attendance_events(events)
+    first = client.get("/api/logs?limit=2").get_json()
+    assert [r["date"] for r in first] == ["2026-10-03", "2026-10-02"]
+    rest = client.get("/api/logs", query_string={"limit": 2, "before": first[-1]["cursor"]}).get_json()
+    assert [r["date"] for r in rest] == ["2026-10-01"]
+
+@pytest.mark.parametrize("url", ["/api/logs?before=garbage", "/user/1?before=2026-10-01|09:00:00"])
+def test_invalid_cursor_is_a_bad_request(client, url):
+    assert client.get(url).status_code == 400
+
+def test_request_closes_its_connection(client, db):
+    client.get("/api/logs")
+    assert db._local.conn is None
+
+def test_streamed_report_reads_after_the_request(client, db):
+    db.write_attendance_events(session(1, "2026-10-01", "09:00:00", "10:30:00"))
+    response = client.get("/api/reports/daily?start=2026-10-01&end=2026-10-01&format=csv")
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith("date,user_id,name")
+    assert lines[1].startswith("2026-10-01,1,")
+    assert db._local.conn is None
@@ -0,0 +1,102 @@
+import datetime
+import pytest
+import attendance
+import main
+from conftest import session
+
+DAY = datetime.date(2026, 10, 5)
+
+def at(hour, minute=0, second=0):
+    return datetime.datetime.combine(DAY, datetime.time(hour, minute, second))
+
+@pytest.fixture
+def recorder(db):
+    recorder = attendance.AttendanceRecorder()
+    yield recorder
+    recorder.close()
+
+def test_transitions_toggle_after_cooldown(recorder):
+    assert recorder.transition(1, "Ann", "cam", at(9))[0] == "in"
+    assert recorder.transition(1, "Ann", "cam", at(9, 0, 30)) is None  # Within the cooldown
+    assert recorder.transition(1, "Ann", "cam", at(9, 5))[0] == "out"
+    assert recorder.transition(1, "Ann", "cam", at(9, 10))[0] == "in"
+    assert recorder.transition(2, "Bob", "cam", at(9, 10, 5))[0] == "in"  # Users are independent
+    # A new day starts checked out
+    assert recorder.transition(1, "Ann", "cam", at(9, 10) + datetime.timedelta(days=1))[0] == "in"
+
+def test_out_of_order_sighting_does_not_toggle(recorder):
+    assert recorder.transition(1, "Ann", "cam", at(10))[0] == "in"
+    assert recorder.transition(1, "Ann", "cam", at(8)) is None
+    assert recorder.transition(1, "Ann", "cam", at(11))[0] == "out"
+
+def test_mark_writes_through_the_queue(recorder, db):
+    assert recorder.mark(1, "Ann", "cam").startswith("Time In: ")
+    recorder.flush()
+    today = datetime.date.today().isoformat()
+    assert [r["camera_in"] for r in db.get_day_sessions(1, today)] == ["cam"]
+    # A new recorder picks up the open session
+    other = attendance.AttendanceRecorder()
+    try:
+        assert other.state[1][1] is True
+    finally:
+        other.close()
+
+def test_failed_write_is_retried(recorder, db, monkeypatch):
+    monkeypatch.setattr(attendance, "RETRY_SECONDS", 0.01)
+    write = db.write_attendance_events
+    failures = [2]
+    def flaky(batch):
+        if failures[0]:
+            failures[0] -= 1
+            raise db.sqlite3.OperationalError("database is locked")
+        return write(batch)
+    monkeypatch.setattr(db, "write_attendance_events", flaky)
+    recorder.mark(1, "Ann", "cam")
+    recorder.flush()
+    assert failures[0] == 0
+    assert len(db.get_day_sessions(1, datetime.date.today().isoformat())) == 1
+
+def test_dropped_batch_keeps_queued_state(recorder, db, monkeypatch):
+    monkeypatch.setattr(attendance, "WRITE_RETRIES", 1)
+    write = db.write_attendance_events
+    def failing_once(batch):
+        if batch[0][1] == 1:
+            recorder.mark(2, "Bob", "cam")  # Queued while the failing batch is written
+            raise db.sqlite3.OperationalError("disk I/O error")
+        return write(batch)
+    monkeypatch.setattr(db, "write_attendance_events", failing_once)
+    recorder.mark(1, "Ann", "cam")
+    recorder.flush()
+    # Reloaded once the queue drained: Ann's dropped time-in is gone, Bob's is kept
+    assert 1 not in recorder.state
+    assert recorder.state[2][1] is True
+    assert not recorder.stale
+
+def test_merge_transitions_places_sightings_by_time():
+    known = [(at(10), "live"), (at(11), "live")]
+    sightings = [(at(9, 30), "cctv"), (at(8), "cctv"), (at(10, 0, 30), "cctv")]
+    transitions, dropped = attendance.merge_transitions(known, sightings)
+    assert transitions == [(at(8), "cctv"), (at(9, 30), "cctv"), (at(10), "live"), (at(11), "live")]
+    assert dropped == [(at(10, 0, 30), "cctv")]
+    assert attendance.pair_sessions(transitions[:3]) == [((at(8), "cctv"), (at(9, 30), "cctv")), ((at(10), "live"), None)]
+
+def test_merge_sightings_before_live_sessions(db):
+    date_str = DAY.isoformat()
+    db.write_attendance_events(session(1, date_str, "10:00:00", "11:00:00", "live"))
+    sightings = [(at(8).timestamp(), 1, "cctv"), (at(9, 30).timestamp(), 1, "cctv"),
+                 (at(9, 30, 20).timestamp(), 1, "cctv"), (at(8).timestamp(), 7, "cctv")]
+    assert main.merge_sightings(sightings, {1: "user1"}) == 2
+    assert [(r["time_in"], r["time_out"], r["camera_in"]) for r in db.get_day_sessions(1, date_str)] == [
+        ("08:00:00", "09:30:00", "cctv"), ("10:00:00", "11:00:00", "live")]
+    summary = list(db.get_daily_summary(date_str, date_str))
+    assert [(r["sessions"], r["total_seconds"]) for r in summary] == [(2, 9000)]
+    assert [r["total_seconds"] for r in db.get_monthly_summary(date_str[:7], date_str[:7])] == [9000]
+    # Merging the same sightings again changes nothing
+    assert main.merge_sightings(sightings, {1: "user1"}) == 0
+
+def test_merge_sightings_skips_archived_days(db, capsys):
+    db.write_attendance_events(session(1, "2026-06-10", "09:00:00", "10:00:00"))
+    db.archive_closed_months(datetime.date(2026, 10, 17))
+    sighting = datetime.datetime(2026, 6, 10, 12).timestamp()
+    assert main.merge_sightings([(sighting, 1, "cctv")], {1: "user1"}) == 0
+    assert "archived" in capsys.readouterr().out
@@ -0,0 +1,54 @@
+import datetime
+import glob
+import json
+import os
+import shutil
+import time
+import pytest
+import attendance
+import camera_registry
+import sample_store
+import trainer
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_ID = 11
+
+def wait_for(check, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = check()
+        if result:
+            return result
+        time.sleep(0.2)
+    return check()
+
+@pytest.fixture
+def registry(db, tmp_path):
+    # One enrolled user, shown by two synthetic cameras; only "north" recognizes
+    os.makedirs("face_data")
+    for path in glob.glob(os.path.join(REPO, "face_data", f"User.{USER_ID}.*.jpg")):
+        shutil.copy(path, "face_data")
+    sample_store.migrate("face_data", delete=True)
+    assert trainer.train_full("face_data", trainer.MODEL_FILE) is not None
+    db.add_user(USER_ID, "Ann")
+    with open("cameras.json", "w") as f:
+        json.dump({"cameras": [{"id": "north", "source": "synthetic:1"},
+                               {"id": "south", "source": "synthetic:1"}]}, f)
+    registry = camera_registry.CameraRegistry("cameras.json")
+    yield registry
+    registry.close()
+    attendance.shutdown()
+
+def test_cameras_report_stats_and_attendance_by_id(registry, db):
+    assert registry.ids() == ["north", "south"]
+    assert registry.get().camera_id == "north"
+    assert registry.get("lobby") is None
+    assert wait_for(lambda: registry.get("north").start_recognition())
+    today = datetime.date.today().isoformat()
+    rows = wait_for(lambda: db.get_day_sessions(USER_ID, today))
+    assert rows and rows[0]["camera_in"] == "north"
+    north, south = registry.get("north").get_stats(), registry.get("south").get_stats()
+    assert (north["camera_id"], north["mode"]) == ("north", "recognize")
+    assert (south["camera_id"], south["mode"]) == ("south", "idle")
+    assert north["frames"] > 0 and south["frames"] > 0
+    assert [camera_id for camera_id, _ in registry.segments()] == ["north", "south"]
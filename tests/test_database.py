@@ -0,0 +1,145 @@
+import datetime
+import os
+import sqlite3
+import pytest
+import database
+from conftest import session
+
+def all_pages(fetch, limit):
+    rows, cursor = [], None
+    while True:
+        page = fetch(limit, cursor)
+        if not page:
+            return rows
+        rows += page
+        cursor = page[-1]["cursor"]
+
+def test_migrate_legacy_database(tmp_path, monkeypatch):
+    path = tmp_path / "attendance.db"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE daily_attendance (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, name TEXT, date TEXT,
+            time_in TEXT, time_out TEXT, last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE attendance (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, name TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP, date TEXT);
+        INSERT INTO users (id, name) VALUES (1, 'Ann'), (2, 'Bob');
+        INSERT INTO daily_attendance (user_id, name, date, time_in, time_out) VALUES (1, 'Ann', '2026-10-01', '09:00:00', '12:00:00');
+        INSERT INTO attendance (user_id, name, timestamp, date) VALUES
+            (2, 'Bob', '2026-10-01 08:00:00', '2026-10-01'),
+            (2, 'Bob', '2026-10-01 10:30:00', '2026-10-01'),
+            (1, 'Ann', '2026-10-01 07:00:00', '2026-10-01');
+    """)
+    conn.close()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(database, "DB_NAME", str(path))
+    try:
+        database.init_db()
+        conn = database.get_connection()
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(database.MIGRATIONS)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'attendance'").fetchall()
+        # Bob's sightings became one session; Ann already had one that day and keeps only it
+        sessions = [tuple(r) for r in conn.execute(
+            "SELECT user_id, time_in, time_out, camera_in FROM daily_attendance ORDER BY user_id")]
+        assert sessions == [(1, "09:00:00", "12:00:00", None), (2, "08:00:00", "10:30:00", None)]
+        daily = list(database.get_daily_summary("2026-10-01", "2026-10-01"))
+        assert [(r["user_id"], r["sessions"], r["total_seconds"]) for r in daily] == [(1, 1, 10800), (2, 1, 9000)]
+        monthly = list(database.get_monthly_summary("2026-10", "2026-10"))
+        assert [(r["user_id"], r["days"], r["total_seconds"]) for r in monthly] == [(1, 1, 10800), (2, 1, 9000)]
+        assert database.users_version() == 1
+        database.init_db()  # Already current: nothing to do
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(database.MIGRATIONS)
+    finally:
+        database.close_connection()
+
+def test_failed_migration_is_rolled_back(db, monkeypatch):
+    monkeypatch.setattr(database, "MIGRATIONS", database.MIGRATIONS + [
+        ["CREATE TABLE half_done (x)", "ALTER TABLE daily_attendance ADD COLUMN camera_in TEXT"],
+    ])
+    conn = db.get_connection()
+    with pytest.raises(sqlite3.OperationalError):
+        db.migrate(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(database.MIGRATIONS) - 1
+    assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'half_done'").fetchall()
+
+def test_keyset_pagination(db):
+    events = []
+    for day in range(1, 6):
+        for user_id in (1, 2, 3):
+            events += session(user_id, f"2026-10-0{day}", "09:00:00", "10:00:00")
+    db.write_attendance_events(events)
+    rows = all_pages(db.get_attendance_logs, 4)
+    assert len(rows) == 15
+    keys = [(r["date"], r["time_in"], r["cursor"]) for r in rows]
+    assert [k[:2] for k in keys] == sorted((k[:2] for k in keys), reverse=True)
+    assert len(set(r["cursor"] for r in rows)) == 15
+    user_rows = all_pages(lambda limit, before: db.get_user_attendance(2, limit, before), 2)
+    assert [r["date"] for r in user_rows] == [f"2026-10-0{day}" for day in range(5, 0, -1)]
+    assert db.count_user_sessions(2) == 5
+
+@pytest.mark.parametrize("cursor", ["garbage", "2026-10-01|09:00:00|x", "notadate|09:00:00|3", "a|b"])
+def test_invalid_cursor_is_rejected(db, cursor):
+    assert db.parse_cursor(cursor) is None
+    with pytest.raises(ValueError):
+        db.get_attendance_logs(10, cursor)
+
+def test_summaries_follow_sessions(db):
+    db.write_attendance_events(session(1, "2026-09-30", "09:00:00", "10:00:00")
+                               + session(1, "2026-10-01", "09:00:00", "09:30:00")
+                               + session(1, "2026-10-01", "13:00:00", "14:00:00")
+                               + session(2, "2026-10-01", "08:00:00")  # Still open: not counted
+                               + session(2, "2026-10-02", "08:00:00", "16:00:00"))
+    daily = list(db.get_daily_summary("2026-10-01", "2026-10-31"))
+    assert [(r["date"], r["user_id"], r["sessions"], r["total_seconds"], r["first_in"], r["last_out"]) for r in daily] == [
+        ("2026-10-01", 1, 2, 5400, "09:00:00", "14:00:00"),
+        ("2026-10-02", 2, 1, 28800, "08:00:00", "16:00:00"),
+    ]
+    assert [r["user_id"] for r in db.get_daily_summary("2026-09-01", "2026-10-31", user_id=1)] == [1, 1]
+    monthly = list(db.get_monthly_summary("2026-09", "2026-10"))
+    assert [(r["month"], r["user_id"], r["days"], r["sessions"], r["total_seconds"]) for r in monthly] == [
+        ("2026-09", 1, 1, 1, 3600),
+        ("2026-10", 1, 1, 2, 5400),
+        ("2026-10", 2, 1, 1, 28800),
+    ]
+
+def test_archive_keeps_reads_unchanged(db):
+    events = []
+    for month in ("2026-06", "2026-07", "2026-08", "2026-09", "2026-10"):
+        for day in ("03", "17"):
+            for user_id in (1, 2):
+                events += session(user_id, f"{month}-{day}", "09:00:00", "11:00:00")
+    db.write_attendance_events(events)
+
+    def snapshot():
+        return (all_pages(db.get_attendance_logs, 3),
+                all_pages(lambda limit, before: db.get_user_attendance(1, limit, before), 4),
+                db.count_user_sessions(1),
+                list(db.get_daily_summary("2026-01-01", "2026-12-31")),
+                list(db.get_monthly_summary("2026-01", "2026-12")))
+    before = snapshot()
+    moved = db.archive_closed_months(datetime.date(2026, 10, 17))
+    assert moved == {"2026-06": 4, "2026-07": 4, "2026-08": 4}
+    assert db.archived_months() == ["2026-06", "2026-07", "2026-08"]
+    assert os.path.exists(db.archive_path("2026-07"))
+    assert db.get_connection().execute("SELECT COUNT(*) FROM daily_attendance").fetchone()[0] == 8
+    assert snapshot() == before
+    # Pages that start inside an archive
+    logs = before[0]
+    assert db.get_attendance_logs(3, logs[10]["cursor"]) == logs[11:14]
+    assert [r["archived"] for r in db.get_day_sessions(1, "2026-07-03")] == [True]
+
+def test_archive_attach_is_bounded(db, monkeypatch):
+    monkeypatch.setattr(database, "MAX_ATTACHED", 2)
+    events = []
+    for month in range(1, 7):
+        events += session(1, f"2026-{month:02d}-05", "09:00:00", "10:00:00")
+    db.write_attendance_events(events)
+    db.archive_closed_months(datetime.date(2026, 10, 17))
+    assert len(db.get_user_attendance(1, 10)) == 6
+    assert len(list(db.get_daily_summary("2026-01-01", "2026-12-31"))) == 6
+    assert len(database._local.attached) <= 2
+
+def test_out_without_session_is_reported(db, capsys):
+    assert db.write_attendance_events(session(1, "2026-10-01", "09:00:00", "10:00:00")[1:]) == []
+    assert "no session to close" in capsys.readouterr().out
@@ -0,0 +1,45 @@
+import cv2
+import pytest
+import detectors
+import frame_sources
+from conftest import face_crops
+
+@pytest.fixture
+def frames():
+    """Labelled grayscale frames with one or two faces each."""
+    crops = face_crops(11, 20) + face_crops(12, 20)
+    frames = []
+    for width, height, faces in [(640, 480, 1), (1280, 720, 2)]:
+        source = frame_sources.SyntheticSource(crops, width, height, faces)
+        for i in range(3):
+            source.index = i * 10
+            _, image = source.read()
+            frames.append((cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), source.face_boxes))
+    return detectors.prepare(frames, 0.5)
+
+def test_create_detector_reads_config_and_overrides(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    detector = detectors.create_detector()
+    assert isinstance(detector, detectors.CascadeDetector)
+    assert (detector.scale_factor, detector.min_neighbors) == (1.3, 5)
+    detectors.save_config(dict(detectors.DEFAULTS, scale_factor=1.1, min_neighbors=3))
+    assert detectors.create_detector().scale_factor == 1.1
+    detector = detectors.create_detector({"min_neighbors": 6, "max_size": 0.8})
+    assert (detector.scale_factor, detector.min_neighbors, detector.max_size) == (1.1, 6, 0.8)
+    assert isinstance(detectors.create_detector("haar_alt2"), detectors.CascadeDetector)
+    with pytest.raises(ValueError):
+        detectors.create_detector("yolo")
+
+def test_missing_model_falls_back_to_haar(monkeypatch):
+    monkeypatch.setitem(detectors.MODEL_FILES, "dnn", ["missing.prototxt", "missing.caffemodel"])
+    assert isinstance(detectors.create_detector("dnn"), detectors.CascadeDetector)
+
+def test_calibrate_picks_a_setting_that_reaches_the_target(frames, monkeypatch):
+    # The default scale step misses some of these faces; a finer one finds them all
+    monkeypatch.setitem(detectors.GRID, "cascade", {"scale_factor": [1.2, 1.3], "min_neighbors": [5],
+                                                     "min_size": [0.15], "max_size": [0]})
+    (best, result), results = detectors.calibrate(frames, backends=["haar"])
+    assert [(p["backend"], p["scale_factor"]) for p, _ in results] == [("haar", 1.2), ("haar", 1.3)]
+    assert results[1][1]["recall"] < detectors.TARGET_RECALL
+    assert best["scale_factor"] == 1.2 and result["recall"] >= detectors.TARGET_RECALL
+    assert result["precision"] == 1.0
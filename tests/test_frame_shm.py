@@ -0,0 +1,43 @@
+import os
+import pytest
+import frame_shm
+
+@pytest.fixture
+def shm():
+    shm = frame_shm.create(f"facecam_test_{os.getpid()}", slot_bytes=1024)
+    yield shm
+    shm.close()
+    shm.unlink()
+
+def test_round_trip_returns_newest_frame(shm):
+    writer, reader = frame_shm.FrameWriter(shm), frame_shm.FrameReader(shm)
+    assert reader.read() == (0, None, [])
+    writer.write(b"jpeg-1", [{"id": 1}])
+    assert reader.read() == (1, b"jpeg-1", [{"id": 1}])
+    writer.write(b"jpeg-2", [])
+    writer.write(b"jpeg-3", [{"id": 3}])
+    seq, jpeg, results = reader.read()
+    assert (seq, jpeg, results) == (3, b"jpeg-3", [{"id": 3}])
+    writer.write(b"jpeg-4", [])
+    writer.write(b"jpeg-5", [])  # Reuses frame 3's slot
+    assert jpeg == b"jpeg-3"  # The frame handed out is a copy
+
+def test_oversized_frame_is_skipped(shm):
+    writer, reader = frame_shm.FrameWriter(shm), frame_shm.FrameReader(shm)
+    writer.write(b"small", [])
+    writer.write(b"x" * 2048, [])
+    assert reader.read() == (1, b"small", [])
+
+def test_slot_being_written_is_not_read(shm):
+    writer, reader = frame_shm.FrameWriter(shm), frame_shm.FrameReader(shm)
+    writer.write(b"jpeg-1", [])
+    # The header already says frame 2 while its slot is still invalidated
+    frame_shm.SLOT_HEADER.pack_into(shm.buf, frame_shm.HEADER.size, 0, 0, 0)
+    frame_shm.struct.pack_into("<Q", shm.buf, 0, 2)
+    assert reader.read() == (2, None, [])
+
+def test_reader_touch_asks_for_frames(shm):
+    writer, reader = frame_shm.FrameWriter(shm), frame_shm.FrameReader(shm)
+    assert not writer.wanted()
+    reader.touch()
+    assert writer.wanted()
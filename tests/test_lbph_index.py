@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+import lbph_index
+
+@pytest.fixture
+def faces():
+    rng = np.random.default_rng(0)
+    return (rng.random((12, 100, 100)) * 255).astype(np.uint8), np.repeat([3, 7, 11], 4)
+
+def test_save_load_round_trip(tmp_path, faces):
+    images, labels = faces
+    index = lbph_index.LBPHIndex()
+    index.train(images, labels)
+    path = str(tmp_path / "trainer.lbph")
+    index.write(path)
+    loaded = lbph_index.LBPHIndex()
+    loaded.read(path, verify=True)
+    assert (loaded.grid_x, loaded.grid_y) == (index.grid_x, index.grid_y)
+    np.testing.assert_array_equal(loaded.labels, index.labels)
+    np.testing.assert_allclose(loaded.features, index.features)
+    assert loaded.predict_batch(images) == index.predict_batch(images)
+    assert [m[0][0] for m in loaded.predict_batch(images)] == list(labels)
+    assert sorted(int(u) for u in loaded.user_ids) == [3, 7, 11]
+
+def test_damaged_file_is_rejected(tmp_path, faces):
+    index = lbph_index.LBPHIndex()
+    index.train(*faces)
+    path = tmp_path / "trainer.lbph"
+    index.write(str(path))
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        lbph_index.LBPHIndex().read(str(path), verify=True)
+
+def test_empty_index_refuses_to_predict(faces):
+    with pytest.raises(ValueError):
+        lbph_index.LBPHIndex().predict_batch(faces[0][:1])
+
+def test_representative_rows_cover_each_cluster():
+    rng = np.random.default_rng(1)
+    centres = np.eye(3, 16)
+    rows = np.repeat(centres, [6, 3, 5], axis=0) + rng.normal(0, 0.05, (14, 16))
+    rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+    picks = lbph_index.representative_rows(rows, 3)
+    assert sorted(np.argmax(rows[picks] @ centres.T, axis=1)) == [0, 1, 2]
+    np.testing.assert_array_equal(picks, lbph_index.representative_rows(rows, 3))
+    np.testing.assert_array_equal(lbph_index.representative_rows(rows[:2], 3), [0, 1])
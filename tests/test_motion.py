@@ -0,0 +1,34 @@
+import numpy as np
+from motion import MotionGate
+
+def frame(square_at=None):
+    image = np.full((480, 640, 3), 100, dtype=np.uint8)
+    if square_at is not None:
+        x, y = square_at
+        image[y:y + 80, x:x + 80] = 230
+    return image
+
+def test_static_frames_are_skipped():
+    gate = MotionGate()
+    assert gate.check(frame()) is True  # Nothing to compare with yet
+    assert gate.check(frame()) is False
+    assert gate.check(frame()) is False
+    assert (gate.checked, gate.skipped) == (3, 2)
+
+def test_motion_wakes_the_gate():
+    gate = MotionGate()
+    gate.check(frame((50, 50)))
+    assert gate.check(frame((50, 50))) is False
+    assert gate.check(frame((300, 200))) is True
+    assert gate.check(frame((300, 200))) is False  # Still again
+
+def test_motion_outside_the_roi_is_ignored():
+    gate = MotionGate(roi=(0.5, 0.0, 0.5, 1.0))  # Right half only
+    gate.check(frame((20, 50)))
+    assert gate.check(frame((20, 300))) is False
+    assert gate.check(frame((500, 300))) is True
+
+def test_new_frame_shape_counts_as_motion():
+    gate = MotionGate()
+    gate.check(frame())
+    assert gate.check(np.full((360, 640, 3), 100, dtype=np.uint8)) is True
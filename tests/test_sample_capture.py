@@ -0,0 +1,62 @@
+import time
+import cv2
+import pytest
+import sample_capture
+import sample_store
+from conftest import face_crops
+
+@pytest.fixture
+def store(tmp_path):
+    return sample_store.SampleStore(str(tmp_path))
+
+def handled(collector):
+    return collector.saved + sum(collector.rejected.values())
+
+def offer(collector, crop):
+    """Offer one crop as a whole frame with one face and wait for a writer to handle it."""
+    before = handled(collector)
+    collector.offer(crop, [(0, 0, crop.shape[1], crop.shape[0])])
+    deadline = time.monotonic() + 5
+    while handled(collector) == before and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def test_blurry_and_duplicate_crops_are_dropped(store):
+    sharp = max(face_crops(11), key=lambda c: sample_capture.sharpness(sample_store.normalize(c)))
+    collector = sample_capture.SampleCollector(store, 11, target=10, writers=1)
+    try:
+        offer(collector, sharp)
+        assert collector.saved == 1 and collector.hint() is None
+        offer(collector, sharp)
+        assert collector.rejected["duplicate"] == 1 and collector.hint() == "Move your head slightly"
+        offer(collector, cv2.GaussianBlur(sharp, (15, 15), 8))
+        assert collector.rejected["blurry"] == 1 and collector.hint() == "Hold still"
+        collector.offer(sharp, [(0, 0, 50, 50), (50, 50, 50, 50)])
+        assert collector.hint() == "Only one face in view, please"
+        assert store.count(11) == 1
+    finally:
+        collector.close(wait=True)
+
+def test_perceptual_hash_tells_faces_apart():
+    a, b = face_crops(11, 1)[0], face_crops(12, 1)[0]
+    ha, hb = sample_capture.perceptual_hash(a), sample_capture.perceptual_hash(b)
+    assert ha == sample_capture.perceptual_hash(a.copy())
+    assert sample_capture.hash_distance(ha, hb) >= sample_capture.MIN_HASH_DISTANCE
+
+def test_registration_ends_when_samples_stall(store, monkeypatch):
+    monkeypatch.setattr(sample_capture, "MIN_SAMPLES", 2)
+    monkeypatch.setattr(sample_capture, "STALL_SECONDS", 0.2)
+    crops = [face_crops(11, 1)[0], face_crops(12, 1)[0], face_crops(123, 1)[0]]
+    collector = sample_capture.SampleCollector(store, 11, target=10, writers=1)
+    try:
+        offer(collector, crops[0])
+        time.sleep(0.3)
+        assert not collector.done()  # Fewer than MIN_SAMPLES never stall
+        for crop in crops[1:]:
+            offer(collector, crop)
+        assert collector.saved == 3 and not collector.done()
+        time.sleep(0.3)
+        assert collector.stalled() and collector.done()
+        collector.offer(crops[0], [(0, 0, 50, 50)])
+        assert collector.queue.empty()  # Nothing is queued once done
+    finally:
+        collector.close(wait=True)
@@ -0,0 +1,54 @@
+import os
+import cv2
+import numpy as np
+
+import sample_store
+from sample_store import SampleStore, SAMPLE_SIZE
+
+def face(value, size=SAMPLE_SIZE):
+    return np.full((size, size), value, dtype=np.uint8)
+
+def write_legacy(data_dir, user_id, n, value):
+    path = os.path.join(data_dir, f"User.{user_id}.{n}.jpg")
+    cv2.imwrite(path, face(value))
+    return path
+
+def test_append_normalizes_and_reads_back(tmp_path):
+    store = SampleStore(str(tmp_path))
+    store.append(1, face(10, size=50))
+    store.append_many([2, 2], [face(20), face(30)])
+    faces, labels = store.samples()
+    assert faces.shape == (3, SAMPLE_SIZE, SAMPLE_SIZE)
+    assert labels.tolist() == [1, 2, 2]
+    assert store.count() == 3 and store.count(2) == 2
+    faces, labels = store.samples(2)
+    assert [int(f[0, 0]) for f in faces] == [20, 30]
+
+def test_remove_user_then_compact(tmp_path):
+    store = SampleStore(str(tmp_path))
+    store.append_many([1, 2, 1, 3], [face(v) for v in (1, 2, 3, 4)])
+    assert store.remove_user(1) == 2
+    assert store.remove_user(9) == 0
+    assert store.user_ids() == [2, 3]
+    size = os.path.getsize(store.samples_file)
+    assert store.compact() == 2
+    assert os.path.getsize(store.samples_file) == size // 2
+    faces, labels = store.samples()
+    assert labels.tolist() == [2, 3]
+    assert [int(f[0, 0]) for f in faces] == [2, 4]
+
+def test_migrate_imports_new_users_only(tmp_path):
+    data_dir = str(tmp_path)
+    store = SampleStore(data_dir)
+    store.append(1, face(200))  # Re-registered since the JPEGs were written
+    old = write_legacy(data_dir, 1, 1, 50)
+    new = [write_legacy(data_dir, 2, n, 60) for n in (1, 2)]
+    broken = os.path.join(data_dir, "User.3.1.jpg")
+    with open(broken, "w") as f:
+        f.write("not a jpeg")
+    assert sample_store.migrate(data_dir, delete=True) == 2
+    assert store.count(1) == 1 and store.count(2) == 2
+    assert not any(os.path.exists(p) for p in new)
+    assert os.path.exists(old) and os.path.exists(broken)
+    assert sample_store.unimported_paths(store, sample_store.legacy_paths(data_dir)) == [broken]
+    assert sample_store.migrate(data_dir) == 0
@@ -0,0 +1,41 @@
+import tracker
+
+def make_track():
+    return tracker.Track(1, (0, 0, 10, 10), None)
+
+def test_identity_needs_a_majority_of_votes():
+    track = make_track()
+    track.add_vote(5, 30.0)
+    track.add_vote(None, 90.0)
+    assert not track.confirmed
+    track.add_vote(5, 40.0)
+    assert not track.confirmed
+    track.add_vote(5, 20.0)
+    assert track.confirmed and track.label == 5
+    assert track.confidence == 30.0  # Mean of the winning votes
+
+def test_unknown_can_win_the_vote():
+    track = make_track()
+    for _ in range(tracker.VOTE_MIN):
+        track.add_vote(None, 80.0)
+    assert track.confirmed and track.label is None
+
+def test_rechecks_can_change_the_identity():
+    track = make_track()
+    for _ in range(tracker.VOTE_MIN):
+        track.add_vote(5, 30.0)
+    track.attended = True
+    assert not track.needs_predict()
+    track.age += tracker.RECHECK_INTERVAL
+    assert track.needs_predict()
+    for _ in range(tracker.VOTE_MIN):
+        track.add_vote(6, 30.0)
+    assert track.label == 6 and track.confirmed
+    assert not track.attended  # A new identity is marked again
+
+def test_old_votes_fall_out_of_the_window():
+    track = make_track()
+    for label in [5, 5, 5] + [6] * tracker.VOTE_WINDOW:
+        track.add_vote(label, 30.0)
+    assert track.label == 6
+    assert all(label == 6 for label, _ in track.votes)
@@ -0,0 +1,61 @@
+import os
+import time
+import pytest
+import sample_store
+import trainer
+from conftest import face_crops
+
+def wait_until_finished(background, version, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = background.get_status()
+        if status["state"] == "error" or (status["state"] == "done" and status["version"] == version):
+            return status
+        time.sleep(0.1)
+    pytest.fail(f"Training did not finish: {background.get_status()}")
+
+def test_trim_samples_keeps_the_budget(tmp_path):
+    data_dir = str(tmp_path)
+    store = sample_store.SampleStore(data_dir)
+    store.append_many([11] * 30 + [12] * 10, face_crops(11, 30) + face_crops(12, 10))
+    assert trainer.trim_samples(data_dir, [12], budget=20) == 0
+    assert trainer.trim_samples(data_dir, budget=0) == 0
+    assert trainer.trim_samples(data_dir, budget=20) == 10
+    assert (store.count(11), store.count(12)) == (20, 10)
+    store.compact()
+    assert trainer.trim_samples(data_dir, [11], budget=8) == 12
+    assert (store.count(11), store.count(12)) == (8, 10)
+
+def test_background_trainer_enrolls_and_promotes(tmp_path):
+    data_dir = str(tmp_path / "face_data")
+    model_file = str(tmp_path / trainer.MODEL_FILE)
+    store = sample_store.SampleStore(data_dir)
+    ready = []
+    background = trainer.BackgroundTrainer(data_dir, model_file, on_model_ready=lambda r, v: ready.append((r, v)))
+
+    store.append_many([11] * 10, face_crops(11, 10))
+    background.submit(11)
+    status = wait_until_finished(background, 1)
+    assert status["state"] == "done" and status["user_id"] == 11
+    assert os.path.exists(model_file)
+    assert not os.path.exists(trainer.versioned_path(model_file, 1))
+    assert [v for _, v in ready] == [1] and trainer.model_has_user(ready[0][0], 11)
+
+    store.append_many([12] * 10, face_crops(12, 10))
+    background.submit(12)
+    wait_until_finished(background, 2)
+    recognizer = trainer.create_recognizer()
+    recognizer.read(model_file)
+    assert trainer.model_has_user(recognizer, 11) and trainer.model_has_user(recognizer, 12)
+    assert trainer.predict_faces(recognizer, face_crops(12, 1))[0][0] == 12
+
+def test_failed_job_keeps_the_model(tmp_path):
+    data_dir = str(tmp_path / "face_data")
+    model_file = str(tmp_path / trainer.MODEL_FILE)
+    ready = []
+    background = trainer.BackgroundTrainer(data_dir, model_file, on_model_ready=lambda r, v: ready.append(v))
+    background.submit(99)  # No samples
+    status = wait_until_finished(background, 1)
+    assert status["state"] == "error" and status["version"] == 0
+    assert not ready and not os.path.exists(model_file)
+    assert not os.path.exists(trainer.versioned_path(model_file, 1))
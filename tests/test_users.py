@@ -0,0 +1,41 @@
+import json
+import users
+
+def write_names(names):
+    with open(users.NAMES_FILE, "w") as f:
+        json.dump({str(k): v for k, v in names.items()}, f)
+
+def test_names_file_is_imported_once(db):
+    db.add_user(1, "Ann")
+    write_names({1: "Old Ann", 2: "Bob"})
+    directory = users.UserDirectory()
+    assert directory.all() == {1: "Ann", 2: "Bob"}  # The database wins over names.json
+    write_names({1: "Ann", 2: "Bob", 3: "Cat"})
+    assert users.UserDirectory().all() == {1: "Ann", 2: "Bob"}
+
+def test_changes_reach_other_directories_by_version(db, monkeypatch):
+    monkeypatch.setattr(users, "CHECK_SECONDS", 0)
+    web, camera = users.UserDirectory(), users.UserDirectory()
+    assert camera.all() == {}
+    version = db.users_version()
+    web.add(5, "Eve")
+    assert db.users_version() == version + 1
+    assert camera.get(5) == "Eve"
+    web.add(5, "Eva")
+    assert camera.get(5) == "Eva"
+
+def test_refresh_is_throttled(db, monkeypatch):
+    monkeypatch.setattr(users, "CHECK_SECONDS", 3600)
+    camera = users.UserDirectory()
+    assert camera.all() == {}
+    db.add_user(5, "Eve")
+    assert camera.get(5) is None  # Not checked again yet
+    camera.refresh(force=True)
+    assert camera.get(5) == "Eve"
+
+def test_export_writes_names_file(db):
+    directory = users.UserDirectory()
+    directory.add(7, "Kim")
+    assert directory.export() == 1
+    with open(users.NAMES_FILE) as f:
+        assert json.load(f) == {"7": "Kim"}
@@ -0,0 +1,153 @@
+import cv2
+import itertools
+import metrics
+from collections import Counter, deque
+
+DETECT_INTERVAL = 5   # Run the face detector every N frames
+DETECT_SCALE = 0.5    # Detect and track on a copy of the frame resized by this factor
+MIN_MATCH_SCORE = 0.6 # Template match score below which a track counts as lost
+SEARCH_MARGIN = 0.5   # Search window around the last box, as a fraction of its size
+MATCH_IOU = 0.3       # Overlap needed to keep a track's ID when re-detecting
+
+VOTE_WINDOW = 5       # Recent predictions kept per track
+VOTE_MIN = 3          # Votes an identity needs within the window to be confirmed
+RECHECK_INTERVAL = 15 # Frames between predictions once a track's identity is confirmed
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+class Track:
+    def __init__(self, track_id, box, template):
+        self.id = track_id
+        self.box = box            # (x, y, w, h) in the downscaled frame
+        self.template = template
+        self.score = 1.0
+        self.age = 0              # Frames since the track was created
+
+        # Identity voting: label is None for "Unknown"
+        self.votes = deque(maxlen=VOTE_WINDOW)
+        self.label = None
+        self.confidence = None
+        self.confirmed = False
+        self.last_predict = None
+        self.attended = False     # Attendance is marked once per track
+
+    def needs_predict(self):
+        if not self.confirmed or self.last_predict is None:
+            return True
+        return self.age - self.last_predict >= RECHECK_INTERVAL
+
+    def add_vote(self, label, confidence):
+        """Record one prediction (label None if it was below threshold).
+
+        The identity is confirmed once it holds VOTE_MIN of the last
+        VOTE_WINDOW votes, and dropped again if periodic re-checks stop
+        agreeing with it.
+        """
+        self.votes.append((label, confidence))
+        self.last_predict = self.age
+        leader, count = Counter(v[0] for v in self.votes).most_common(1)[0]
+        if count >= VOTE_MIN:
+            if leader != self.label:
+                self.attended = False
+            self.label = leader
+            self.confidence = sum(c for l, c in self.votes if l == leader) / count
+            self.confirmed = True
+        else:
+            self.confirmed = False
+
+class FaceTracker:
+    """Finds faces with sparse detection and follows them in between.
+
+    The detector runs every detect_interval frames (or as soon as a track is
+    lost) on a frame downscaled by detect_scale; between detections each face
+    is followed by normalized template matching in a small search window.
+    Boxes are returned at full resolution. detect_interval=1, detect_scale=1.0
+    is equivalent to running the detector on every full frame. detector is
+    one of the detectors module's backends.
+    """
+    def __init__(self, detector, detect_interval=DETECT_INTERVAL, detect_scale=DETECT_SCALE,
+                 min_score=MIN_MATCH_SCORE):
+        self.detector = detector
+        self.detect_interval = max(1, int(detect_interval))
+        self.detect_scale = float(detect_scale)
+        self.min_score = min_score
+        self.tracks = []
+        self.frame_index = 0
+        self.force_detect = True
+        self.ids = itertools.count(1)
+
+    def reset(self):
+        self.tracks = []
+        self.force_detect = True
+
+    def _shrink(self, gray):
+        if self.detect_scale == 1.0:
+            return gray
+        return cv2.resize(gray, None, fx=self.detect_scale, fy=self.detect_scale, interpolation=cv2.INTER_AREA)
+
+    def _detect(self, small):
+        t = metrics.clock()
+        boxes = self.detector.detect(small)
+        metrics.lap("detect", t)
+        tracks = []
+        unmatched = list(self.tracks)
+        for box in boxes:
+            best = max(unmatched, key=lambda t: iou(t.box, box), default=None)
+            x, y, w, h = box
+            template = small[y:y+h, x:x+w].copy()
+            if best is not None and iou(best.box, box) >= MATCH_IOU:
+                unmatched.remove(best)
+                best.box, best.template, best.score = box, template, 1.0
+                tracks.append(best)
+            else:
+                tracks.append(Track(next(self.ids), box, template))
+        self.tracks = tracks
+
+    def _follow(self, small):
+        height, width = small.shape[:2]
+        kept = []
+        for track in self.tracks:
+            x, y, w, h = track.box
+            mx, my = int(w * SEARCH_MARGIN), int(h * SEARCH_MARGIN)
+            x0, y0 = max(0, x - mx), max(0, y - my)
+            x1, y1 = min(width, x + w + mx), min(height, y + h + my)
+            window = small[y0:y1, x0:x1]
+            if window.shape[0] < h or window.shape[1] < w:
+                self.force_detect = True
+                continue
+            scores = cv2.matchTemplate(window, track.template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, loc = cv2.minMaxLoc(scores)
+            if score < self.min_score:
+                self.force_detect = True  # Lost: re-detect on the next frame
+                continue
+            track.box = (x0 + loc[0], y0 + loc[1], w, h)
+            track.score = score
+            kept.append(track)
+        self.tracks = kept
+
+    def update(self, gray, detect=False):
+        """Advance by one frame and return [(track, (x, y, w, h))] at full resolution.
+
+        detect=True forces a detector pass on this frame.
+        """
+        small = self._shrink(gray)
+        if detect or self.force_detect or self.frame_index % self.detect_interval == 0:
+            self.force_detect = False
+            self._detect(small)
+        else:
+            self._follow(small)
+        self.frame_index += 1
+
+        results = []
+        for track in self.tracks:
+            track.age += 1
+            x, y, w, h = (int(round(v / self.detect_scale)) for v in track.box)
+            results.append((track, (x, y, w, h)))
+        return results
@@ -0,0 +1,358 @@
+import cv2
+import os
+import sys
+import queue
+import threading
+import time
+import multiprocessing
+import numpy as np
+import sample_store
+import lbph_index
+import metrics
+
+DATA_DIR = "face_data"
+# "numpy" uses the batched LBPHIndex, "opencv" the original cv2.face.LBPHFaceRecognizer
+RECOGNIZER_BACKEND = "numpy"
+MODEL_FILES = {"numpy": "trainer.lbph", "opencv": "trainer.yml"}
+MODEL_FILE = MODEL_FILES[RECOGNIZER_BACKEND]
+LEGACY_MODEL_FILE = "trainer.npz"  # NumPy models before the binary format
+# Samples kept per user (0 keeps all). Predict cost and model size grow with
+# the number of samples, so this bounds them by the number of users.
+SAMPLE_BUDGET = 20
+
+def create_recognizer():
+    if RECOGNIZER_BACKEND == "numpy":
+        return lbph_index.LBPHIndex()
+    return cv2.face.LBPHFaceRecognizer_create()
+
+def predict_faces(recognizer, faces):
+    """Return one (label, confidence) per face, batched when the backend supports it."""
+    if not faces:
+        return []
+    t = metrics.clock()
+    if hasattr(recognizer, "predict_batch"):
+        results = [matches[0] for matches in recognizer.predict_batch(faces)]
+    else:
+        results = [recognizer.predict(face) for face in faces]
+    metrics.lap("predict", t)
+    return results
+
+def versioned_path(model_file, version):
+    root, ext = os.path.splitext(model_file)
+    return f"{root}.v{version}{ext}"
+
+def load_samples(data_dir=DATA_DIR, user_id=None, progress=None):
+    if progress:
+        progress("loading", 0.0)
+    store = sample_store.SampleStore(data_dir)
+    faces, ids = store.samples(user_id)
+    legacy = sample_store.legacy_paths(data_dir)
+    if legacy:
+        pending = sample_store.unimported_paths(store, legacy)
+        if pending:
+            print(f"[WARN] {len(pending)} User.*.jpg files in {data_dir} belong to users with no samples in the store "
+                  f"and are not trained. Run 'python sample_store.py --migrate' to import them.")
+        else:
+            print(f"[WARN] {len(legacy)} User.*.jpg files are left in {data_dir}; their users are already in the store.")
+    return list(faces), ids
+
+def remove_user_samples(user_id, data_dir=DATA_DIR):
+    """Drop every stored sample of a user, e.g. before they re-register."""
+    return sample_store.SampleStore(data_dir).remove_user(user_id)
+
+def trim_samples(data_dir=DATA_DIR, user_ids=None, budget=SAMPLE_BUDGET):
+    """Keep at most budget representative samples of each user in the store
+    (of every user if user_ids is None). Returns the number removed."""
+    if not budget:
+        return 0
+    store = sample_store.SampleStore(data_dir)
+    with store.lock:  # Slots stay valid until they are removed (no compact() in between)
+        index = store.index()
+        removed = []
+        for user_id in (index if user_ids is None else user_ids):
+            slots = index.get(int(user_id))
+            if slots is None or len(slots) <= budget:
+                continue
+            # Cluster the user's LBP histograms and keep one sample per cluster
+            features = lbph_index.LBPHIndex().histograms(np.asarray(store.faces_at(slots)))
+            keep = lbph_index.representative_rows(features, budget)
+            removed.append(np.delete(slots, keep))
+        if not removed:
+            return 0
+        return store.remove_slots(np.concatenate(removed))
+
+def model_has_user(recognizer, user_id):
+    if recognizer.empty():
+        return False
+    return int(user_id) in recognizer.getLabels()
+
+def train_full(data_dir=DATA_DIR, model_file=MODEL_FILE, progress=None, budget=SAMPLE_BUDGET):
+    """Rebuild the model from every sample on disk. Returns the recognizer or None."""
+    print("\n[INFO] Rebuilding model from all samples. Please wait...")
+    trimmed = trim_samples(data_dir, None, budget)
+    if trimmed:
+        print(f"[INFO] Dropped {trimmed} samples over the budget of {budget} per user.")
+    faceSamples, ids = load_samples(data_dir, None, progress)
+    if not len(ids):
+        print("[ERROR] No valid training samples found.")
+        return None
+
+    recognizer = create_recognizer()
+    if progress:
+        progress("training", 0.6)
+    try:
+        recognizer.train(faceSamples, ids)
+    except Exception as e:
+        print(f"[ERROR] Training failed: {e}")
+        return None
+    if progress:
+        progress("writing", 0.9)
+    recognizer.write(model_file)
+    print(f"[INFO] Success! {len(np.unique(ids))} faces trained.")
+    return recognizer
+
+def enroll_user(user_id, recognizer=None, data_dir=DATA_DIR, model_file=MODEL_FILE,
+                output_file=None, progress=None, budget=SAMPLE_BUDGET):
+    """Add one user's samples to the model without re-reading everyone else's.
+
+    If the model already knows this ID (a re-registration) its old histograms
+    are dropped first; OpenCV's LBPH cannot forget histograms, so with that
+    backend we fall back to a full rebuild from the samples on disk.
+    Only the user's budget most representative samples are kept.
+    The result is written to output_file (default: model_file).
+    Returns the updated recognizer or None.
+    """
+    user_id = int(user_id)
+    output_file = output_file or model_file
+    if recognizer is None:
+        recognizer = create_recognizer()
+        if os.path.exists(model_file):
+            recognizer.read(model_file)
+
+    if model_has_user(recognizer, user_id):
+        if not hasattr(recognizer, "remove"):
+            print(f"[INFO] User {user_id} re-registered, rebuilding model.")
+            return train_full(data_dir, output_file, progress, budget)
+        recognizer.remove(user_id)
+
+    trim_samples(data_dir, [user_id], budget)
+    faceSamples, ids = load_samples(data_dir, user_id, progress)
+    if not len(ids):
+        print(f"[ERROR] No samples found for user {user_id}.")
+        return None
+
+    print(f"\n[INFO] Adding {len(ids)} samples for user {user_id} to the model...")
+    if progress:
+        progress("training", 0.6)
+    try:
+        recognizer.update(faceSamples, ids)
+    except Exception as e:
+        print(f"[ERROR] Training failed: {e}")
+        return None
+    if progress:
+        progress("writing", 0.9)
+    recognizer.write(output_file)
+    print("[INFO] Enrollment complete.")
+    return recognizer
+
+def _train_worker(user_id, data_dir, model_file, output_file, updates):
+    # Runs in a child process so training never competes with the frame loop for the GIL
+    def progress(stage, fraction):
+        updates.put(("progress", stage, fraction))
+    try:
+        if user_id is None:
+            recognizer = train_full(data_dir, output_file, progress)
+        else:
+            recognizer = enroll_user(user_id, None, data_dir, model_file, output_file, progress)
+        if recognizer is None:
+            updates.put(("error", "Training failed"))
+        else:
+            updates.put(("done", output_file))
+    except Exception as e:
+        updates.put(("error", str(e)))
+
+class BackgroundTrainer:
+    """Runs training jobs one at a time in a worker process.
+
+    Each job writes a versioned model file; once it is loaded, on_model_ready
+    is called with the new recognizer and the file is promoted to model_file.
+    """
+    def __init__(self, data_dir=DATA_DIR, model_file=MODEL_FILE, on_model_ready=None):
+        self.data_dir = data_dir
+        self.model_file = model_file
+        self.on_model_ready = on_model_ready
+        self.jobs = queue.Queue()
+        self.version = 0
+        self.status_lock = threading.Lock()
+        self.status = {"state": "idle", "stage": None, "progress": 0.0,
+                       "user_id": None, "version": 0, "pending": 0, "finished_at": None, "message": ""}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, user_id=None):
+        """Queue enrollment of user_id, or a full rebuild when user_id is None."""
+        self.jobs.put(user_id)
+        self._set(pending=self.jobs.qsize())
+
+    def get_status(self):
+        with self.status_lock:
+            return dict(self.status)
+
+    def _set(self, **fields):
+        with self.status_lock:
+            self.status.update(fields)
+
+    def _run(self):
+        while True:
+            user_id = self.jobs.get()
+            self.version += 1
+            output_file = versioned_path(self.model_file, self.version)
+            self._set(state="running", stage="starting", progress=0.0, user_id=user_id,
+                      pending=self.jobs.qsize(), message="")
+            started = time.time()
+            try:
+                result = self._run_job(user_id, output_file)
+                if result[0] == "done":
+                    recognizer = create_recognizer()
+                    if isinstance(recognizer, lbph_index.LBPHIndex):
+                        recognizer.read(output_file, verify=True)  # Never promote a damaged file
+                    else:
+                        recognizer.read(output_file)
+                    os.replace(output_file, self.model_file)
+                    if self.on_model_ready:
+                        self.on_model_ready(recognizer, self.version)
+                    self._set(state="done", stage=None, progress=1.0, version=self.version,
+                              finished_at=time.time(), message="Training complete")
+                    metrics.observe("training_seconds", time.time() - started, metrics.TRAINING_BUCKETS)
+                else:
+                    self._set(state="error", stage=None, message=result[1])
+            except Exception as e:
+                self._set(state="error", stage=None, message=str(e))
+            finally:
+                if os.path.exists(output_file):
+                    os.remove(output_file)
+
+    def _run_job(self, user_id, output_file):
+        # Spawn, not fork: forking this multi-threaded process (camera, web
+        # and writer threads) can copy locks held by other threads
+        ctx = multiprocessing.get_context("spawn")
+        updates = ctx.Queue()
+        proc = ctx.Process(target=_train_worker, daemon=True,
+                           args=(user_id, self.data_dir, self.model_file, output_file, updates))
+        proc.start()
+        try:
+            while True:
+                try:
+                    msg = updates.get(timeout=0.5)
+                except queue.Empty:
+                    if proc.is_alive():
+                        continue
+                    # Worker exited; pick up anything it sent just before dying
+                    try:
+                        msg = updates.get(timeout=0.5)
+                    except queue.Empty:
+                        return ("error", f"Training process exited with code {proc.exitcode}")
+                if msg[0] == "progress":
+                    self._set(stage=msg[1], progress=msg[2])
+                else:
+                    return msg
+        finally:
+            proc.join()
+
+def compact(data_dir=DATA_DIR, model_file=MODEL_FILE, budget=SAMPLE_BUDGET):
+    """Maintenance: trim every user to the budget, reclaim the space of
+    removed samples and rebuild the model."""
+    store = sample_store.SampleStore(data_dir)
+    before = len(store.labels())
+    trimmed = trim_samples(data_dir, None, budget)
+    kept = store.compact()
+    print(f"[INFO] Store compacted: {before} slots -> {kept} samples ({trimmed} over the budget of {budget} per user).")
+    return train_full(data_dir, model_file, budget=budget)
+
+def opencv_to_index(recognizer):
+    """An LBPHIndex from a trained cv2.face LBPH recognizer.
+
+    OpenCV keeps a 256-bin histogram per cell; the bins of each cell are
+    folded into the uniform patterns of lbph_index. OpenCV interpolates the
+    diagonal neighbours where lbph_index uses the pixels themselves, so
+    converted histograms are close to, but not the same as, retrained ones.
+    """
+    if recognizer.getRadius() != 1 or recognizer.getNeighbors() != 8:
+        raise ValueError("Only LBPH models with radius 1 and 8 neighbours can be converted")
+    grid_x, grid_y = recognizer.getGridX(), recognizer.getGridY()
+    cells = grid_x * grid_y
+    # OpenCV's bit n samples the neighbour at angle 2*pi*n/8 counter-clockwise from the
+    # right; lbph_index numbers them clockwise from the top left (NEIGHBOURS).
+    bins = np.zeros((256, lbph_index.NUM_BINS), dtype=np.float32)
+    for code in range(256):
+        ours = sum(1 << ((3 - n) % 8) for n in range(8) if code >> n & 1)
+        bins[code, lbph_index.UNIFORM_TABLE[ours]] = 1
+    hists = np.stack([h.ravel() for h in recognizer.getHistograms()]).astype(np.float32)
+    features = np.sqrt(np.maximum(hists.reshape(len(hists), cells, 256) @ bins, 0) / cells)
+    features = features.reshape(len(hists), cells * lbph_index.NUM_BINS)
+    features /= np.maximum(np.linalg.norm(features, axis=1, keepdims=True), 1e-12)
+    index = lbph_index.LBPHIndex(grid_x, grid_y)
+    index._set(features, recognizer.getLabels().ravel().astype(np.int32))
+    return index
+
+def convert(src, dst, data_dir=DATA_DIR):
+    """Convert between trainer.yml (OpenCV) and the binary .lbph/.npz formats.
+
+    Uniform-pattern histograms cannot be turned back into OpenCV's, so a
+    .yml is retrained from the stored samples of the users in src.
+    """
+    if src.endswith((".yml", ".yaml", ".xml")):
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.read(src)
+        recognizer = opencv_to_index(recognizer)
+    else:
+        recognizer = lbph_index.LBPHIndex()
+        recognizer.read(src, verify=True)
+    if dst.endswith((".yml", ".yaml", ".xml")):
+        user_ids = set(int(u) for u in recognizer.user_ids)
+        faces, ids = load_samples(data_dir)
+        keep = [i for i, label in enumerate(ids) if int(label) in user_ids]
+        if not keep:
+            raise ValueError(f"No samples in {data_dir} for the users in {src}")
+        opencv = cv2.face.LBPHFaceRecognizer_create(1, 8, recognizer.grid_x, recognizer.grid_y)
+        opencv.train([faces[i] for i in keep], np.asarray(ids)[keep])
+        opencv.write(dst)
+    else:
+        recognizer.write(dst)
+    print(f"[INFO] Converted {src} -> {dst} ({len(recognizer.user_ids)} users, {len(recognizer.labels)} histograms).")
+
+def upgrade_model(model_file=MODEL_FILE):
+    """Convert the model of an older version (trainer.npz, or OpenCV's
+    trainer.yml) to model_file, once. Raises if a model exists but cannot be
+    converted, rather than starting without one."""
+    if RECOGNIZER_BACKEND != "numpy" or os.path.exists(model_file):
+        return
+    for legacy in (LEGACY_MODEL_FILE, MODEL_FILES["opencv"]):
+        if not os.path.exists(legacy):
+            continue
+        print(f"[INFO] Converting {legacy} to {model_file}...")
+        try:
+            convert(legacy, model_file)
+        except (AttributeError, cv2.error, ValueError) as e:
+            raise RuntimeError(f"Cannot convert {legacy} to {model_file} ({e}); "
+                               f"run 'python trainer.py --rebuild' to train it from the samples") from e
+        if legacy.endswith(".yml"):
+            print("[INFO] Converted models differ slightly from retrained ones; run 'python trainer.py --rebuild' "
+                  "when the samples are available.")
+        return
+
+if __name__ == "__main__":
+    budget = SAMPLE_BUDGET
+    if "--budget" in sys.argv:
+        budget = int(sys.argv[sys.argv.index("--budget") + 1])
+    if "--rebuild" in sys.argv:
+        train_full(budget=budget)
+    elif "--compact" in sys.argv:
+        compact(budget=budget)
+    elif "--convert" in sys.argv and len(sys.argv) >= sys.argv.index("--convert") + 3:
+        i = sys.argv.index("--convert")
+        convert(sys.argv[i + 1], sys.argv[i + 2])
+    else:
+        print("Usage: python trainer.py --rebuild [--budget N]")
+        print("       python trainer.py --compact [--budget N]   # trim, compact face_data/ and rebuild")
+        print("       python trainer.py --convert SRC DST        # between trainer.yml, .npz and .lbph")
@@ -0,0 +1,93 @@
+import json
+import os
+import sys
+import threading
+import time
+import database
+
+NAMES_FILE = "names.json"
+CHECK_SECONDS = 1.0  # How often a directory asks the database whether users changed
+
+class UserDirectory:
+    """Every user's name, cached in memory.
+
+    The users table is the source of truth. Each change bumps a version
+    counter in the same transaction, so every process (web, cameras, camera
+    server) notices changes made by the others with one small query at most
+    every CHECK_SECONDS and only then reloads the table. names.json is no
+    longer read, except once to import users the database does not have;
+    export() writes it for tools that still want it.
+    """
+    def __init__(self, names_file=NAMES_FILE):
+        self.names_file = names_file
+        self.lock = threading.Lock()
+        self.users = {}
+        self.version = None
+        self.checked_at = 0.0
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.checked_at < CHECK_SECONDS:
+            return
+        self.checked_at = now
+        if self.version is None and os.path.exists(self.names_file) and not database.get_meta("names_imported"):
+            self._import_names_file()
+        version = database.users_version()
+        if version != self.version:
+            users = database.get_all_users()
+            with self.lock:
+                self.users, self.version = users, version
+
+    def _import_names_file(self):
+        try:
+            with open(self.names_file, 'r') as f:
+                names = {int(k): v for k, v in json.load(f).items()}
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Could not import {self.names_file}: {e}")
+            return
+        added = database.import_users(names)
+        if added:
+            print(f"[INFO] Imported {added} users from {self.names_file} into the database.")
+
+    def all(self):
+        """{user_id: name}; shared, so callers must not modify it."""
+        self.refresh()
+        return self.users
+
+    def get(self, user_id, default=None):
+        self.refresh()
+        return self.users.get(user_id, default)
+
+    def add(self, user_id, name):
+        """Create or rename a user."""
+        database.add_user(int(user_id), name)
+        self.refresh(force=True)
+
+    def export(self, path=None):
+        """Write {id: name} to names.json (or path) atomically."""
+        path = path or self.names_file
+        self.refresh(force=True)
+        tmp_file = path + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({str(k): v for k, v in self.users.items()}, f)
+        os.replace(tmp_file, path)
+        return len(self.users)
+
+directory = None
+directory_lock = threading.Lock()
+
+def get_directory():
+    """Process-wide user directory."""
+    global directory
+    with directory_lock:
+        if directory is None:
+            directory = UserDirectory()
+        return directory
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "--export":
+        database.init_db()
+        path = sys.argv[2] if len(sys.argv) >= 3 else NAMES_FILE
+        print(f"[INFO] Exported {get_directory().export(path)} users to {path}.")
+    else:
+        print("Usage: python users.py --export [names.json]")